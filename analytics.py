@@ -0,0 +1,600 @@
+import heapq
+import math
+from collections import Counter
+from operator import itemgetter
+
+try:
+    import numpy as np
+except ImportError:
+    # Optional: the pure-Python paths below produce the same results
+    np = None
+
+# Lower bound of each severity bucket; 'low' covers any positive score below 4.0
+SEVERITY_THRESHOLDS = (
+    ('critical', 9.0),  # 9.0-10.0
+    ('high', 7.0),      # 7.0-8.9
+    ('medium', 4.0),    # 4.0-6.9
+)
+
+TOP_VULNERABILITIES = 10
+
+# Entries in each top-K list of the statistics section
+STATISTICS_TOP = 10
+
+# Score percentiles reported, and the histogram's bins of one point over 0-10
+PERCENTILES = (50, 90, 99)
+HISTOGRAM_BINS = 10
+
+# Id meaning "no value" in columnar reports (columnar.NONE)
+NO_VALUE = 0xFFFFFFFF
+
+
+def parse_score(score):
+    """Convert a vulners score string to a float, treating N/A and junk as 0"""
+    if score == 'N/A':
+        return 0.0
+    try:
+        return float(score)
+    except ValueError:
+        return 0.0
+
+
+def severity_of(score_float):
+    """Get the severity bucket for a score, or None for unscored findings"""
+    for severity, threshold in SEVERITY_THRESHOLDS:
+        if score_float >= threshold:
+            return severity
+    if score_float > 0:
+        return 'low'
+    return None
+
+
+def compute_vulnerability_analytics(report_data):
+    """
+    Compute vulnerability analytics from a parsed report in a single pass.
+
+    Each distinct score string is converted once, every finding is kept as
+    one compact tuple in at most one severity bucket, and the most common
+    CVEs come from a counter and a heap instead of repeated scans over all
+    findings.
+    """
+    critical, high, medium, low = [], [], [], []
+    vulnerability_counts = Counter()
+    first_scores = {}
+    score_floats = {}
+    vulnerabilities_by_host = []
+    total = 0
+
+    # Per finding: score, CVE, host and service codes for the statistics
+    scores, cve_codes, host_codes, service_codes = [], [], [], []
+    cve_index, service_index = {}, {}
+    host_labels = []
+
+    (_, critical_min), (_, high_min), (_, medium_min) = SEVERITY_THRESHOLDS
+
+    for host in report_data['hosts']:
+        host_addr = host['addresses'][0]['addr'] if host['addresses'] else 'Unknown'
+        host_code = len(host_labels)
+        host_labels.append(host_addr)
+        host_vulns = []
+
+        for port in host['ports']:
+            portid = port['portid']
+            service = port['service'].get('name', '')
+            service_code = service_index.setdefault(service, len(service_index))
+
+            for vuln in port['vulnerabilities']:
+                vuln_id = vuln['id']
+                score = vuln['score']
+
+                score_float = score_floats.get(score)
+                if score_float is None:
+                    score_float = score_floats[score] = parse_score(score)
+
+                # Findings are (score_float, id, score, host, port, service) tuples
+                if score_float >= critical_min:
+                    critical.append((score_float, vuln_id, score, host_addr, portid, service))
+                elif score_float >= high_min:
+                    high.append((score_float, vuln_id, score, host_addr, portid, service))
+                elif score_float >= medium_min:
+                    medium.append((score_float, vuln_id, score, host_addr, portid, service))
+                elif score_float > 0:
+                    low.append((score_float, vuln_id, score, host_addr, portid, service))
+
+                host_vulns.append({
+                    'id': vuln_id,
+                    'score': score,
+                    'port': portid,
+                    'service': service
+                })
+
+                if vuln_id not in first_scores:
+                    first_scores[vuln_id] = score
+                vulnerability_counts[vuln_id] += 1
+
+                scores.append(score_float)
+                cve_codes.append(cve_index.setdefault(vuln_id, len(cve_index)))
+                host_codes.append(host_code)
+                service_codes.append(service_code)
+
+        total += len(host_vulns)
+        if host_vulns:
+            vulnerabilities_by_host.append({
+                'host': host_addr,
+                'vulnerability_count': len(host_vulns),
+                'vulnerabilities': host_vulns
+            })
+
+    # Most common CVEs; nlargest keeps first-seen order between equal counts
+    top_vulnerabilities = [
+        {'id': vuln_id, 'count': count, 'score': first_scores[vuln_id]}
+        for vuln_id, count in heapq.nlargest(
+            TOP_VULNERABILITIES, vulnerability_counts.items(), key=itemgetter(1))
+    ]
+
+    # Highest score first within each bucket (stable, so ties keep report order)
+    by_score = itemgetter(0)
+    vulnerabilities_by_severity = {}
+    for severity, findings in (('critical', critical), ('high', high),
+                               ('medium', medium), ('low', low)):
+        findings.sort(key=by_score, reverse=True)
+        vulnerabilities_by_severity[severity] = [
+            {'id': vuln_id, 'score': score, 'host': host_addr, 'port': portid, 'service': service}
+            for _, vuln_id, score, host_addr, portid, service in findings
+        ]
+
+    return {
+        'total_vulnerabilities': total,
+        'hosts_with_vulnerabilities': len(vulnerabilities_by_host),
+        'critical_count': len(critical),
+        'high_count': len(high),
+        'medium_count': len(medium),
+        'low_count': len(low),
+        'vulnerabilities_by_host': vulnerabilities_by_host,
+        'top_vulnerabilities': top_vulnerabilities,
+        'vulnerabilities_by_severity': vulnerabilities_by_severity,
+        'statistics': compute_statistics(
+            scores, (cve_codes, list(cve_index).__getitem__), (host_codes, host_labels.__getitem__),
+            (service_codes, list(service_index).__getitem__))
+    }
+
+
+def compute_columnar_analytics(report):
+    """
+    Compute the same analytics as compute_vulnerability_analytics straight
+    from the arrays of a columnar.ColumnarReport, vectorized with NumPy when
+    it is installed
+    """
+    if np is not None:
+        return _columnar_analytics_numpy(report)
+    return _columnar_analytics_python(report)
+
+
+def _columnar_analytics_python(report):
+    """
+    Pure-Python columnar analytics, without rebuilding the host dicts.
+    Findings are ids into the report's table of distinct (CVE, score)
+    pairs, so each pair is decoded once and the per-finding work is a
+    table lookup.
+    """
+    string = report.string
+    address = report.address
+    address_offsets = report.host_address_offsets
+    port_offsets = report.host_port_offsets
+    port_number = report.port_number
+    service_name = report.service_name
+    vuln_offsets = report.port_vuln_offsets
+    vulns = report.vuln
+
+    # (score_float, id, score) per distinct pair
+    cves = [(score_float, string(vuln_id), string(score))
+            for vuln_id, score_float, score in zip(report.cve_id, report.cve_score, report.cve_score_text)]
+
+    pair_cves = list(report.cve_id)
+    empty = _empty_string_id(report)
+
+    critical, high, medium, low = [], [], [], []
+    vulnerabilities_by_host = []
+    total = 0
+
+    # Per finding: score, CVE, host and service codes for the statistics
+    scores, cve_codes, host_codes, service_codes = [], [], [], []
+    host_labels = {}
+
+    (_, critical_min), (_, high_min), (_, medium_min) = SEVERITY_THRESHOLDS
+
+    for h in range(len(report)):
+        p0, p1 = port_offsets[h], port_offsets[h + 1]
+        if vuln_offsets[p0] == vuln_offsets[p1]:
+            continue
+
+        a0 = address_offsets[h]
+        host_addr = string(address[a0]) if a0 < address_offsets[h + 1] else 'Unknown'
+        host_labels[h] = host_addr
+        host_vulns = []
+
+        for p in range(p0, p1):
+            v0, v1 = vuln_offsets[p], vuln_offsets[p + 1]
+            if v0 == v1:
+                continue
+            number = port_number[p]
+            portid = str(number) if number != NO_VALUE else ''
+            service = string(service_name[p])
+            service_code = service_name[p] if service_name[p] != NO_VALUE else empty
+
+            for cve in vulns[v0:v1]:
+                score_float, vuln_id, score = cves[cve]
+                scores.append(score_float)
+                cve_codes.append(pair_cves[cve])
+                host_codes.append(h)
+                service_codes.append(service_code)
+
+                # Findings are (score_float, id, score, host, port, service) tuples
+                if score_float >= critical_min:
+                    critical.append((score_float, vuln_id, score, host_addr, portid, service))
+                elif score_float >= high_min:
+                    high.append((score_float, vuln_id, score, host_addr, portid, service))
+                elif score_float >= medium_min:
+                    medium.append((score_float, vuln_id, score, host_addr, portid, service))
+                elif score_float > 0:
+                    low.append((score_float, vuln_id, score, host_addr, portid, service))
+
+                host_vulns.append({
+                    'id': vuln_id,
+                    'score': score,
+                    'port': portid,
+                    'service': service
+                })
+
+        total += len(host_vulns)
+        vulnerabilities_by_host.append({
+            'host': host_addr,
+            'vulnerability_count': len(host_vulns),
+            'vulnerabilities': host_vulns
+        })
+
+    # Count pairs, then fold them into CVEs; both counters are in first-seen order
+    vulnerability_counts = Counter()
+    first_scores = {}
+    for cve, count in Counter(vulns).items():
+        _, vuln_id, score = cves[cve]
+        vulnerability_counts[vuln_id] += count
+        if vuln_id not in first_scores:
+            first_scores[vuln_id] = score
+
+    top_vulnerabilities = [
+        {'id': vuln_id, 'count': count, 'score': first_scores[vuln_id]}
+        for vuln_id, count in heapq.nlargest(
+            TOP_VULNERABILITIES, vulnerability_counts.items(), key=itemgetter(1))
+    ]
+
+    by_score = itemgetter(0)
+    vulnerabilities_by_severity = {}
+    for severity, findings in (('critical', critical), ('high', high),
+                               ('medium', medium), ('low', low)):
+        findings.sort(key=by_score, reverse=True)
+        vulnerabilities_by_severity[severity] = [
+            {'id': vuln_id, 'score': score, 'host': host_addr, 'port': portid, 'service': service}
+            for _, vuln_id, score, host_addr, portid, service in findings
+        ]
+
+    return {
+        'total_vulnerabilities': total,
+        'hosts_with_vulnerabilities': len(vulnerabilities_by_host),
+        'critical_count': len(critical),
+        'high_count': len(high),
+        'medium_count': len(medium),
+        'low_count': len(low),
+        'vulnerabilities_by_host': vulnerabilities_by_host,
+        'top_vulnerabilities': top_vulnerabilities,
+        'vulnerabilities_by_severity': vulnerabilities_by_severity,
+        'statistics': compute_statistics(scores, (cve_codes, string), (host_codes, host_labels.__getitem__),
+                                         (service_codes, string))
+    }
+
+
+def _empty_string_id(report):
+    """
+    Get the string id of '' in a columnar report, so ports without a
+    service group with ports whose service has no name, as they do in the
+    parsed report. NO_VALUE if the report has no empty string.
+    """
+    offsets = report.string_offsets
+    if np is not None:
+        empty = np.flatnonzero(np.diff(np.frombuffer(offsets, dtype=np.uintc)) == 0)
+        return int(empty[0]) if len(empty) else NO_VALUE
+    return next((i for i in range(len(offsets) - 1) if offsets[i] == offsets[i + 1]), NO_VALUE)
+
+
+def _columnar_arrays(report):
+    """
+    View the finding columns of a columnar report as NumPy arrays (no copy)
+    and expand them to one entry per finding: score, (CVE, score) pair,
+    port and host
+    """
+    vulns = np.frombuffer(report.vuln, dtype=np.uintc)
+    port_offsets = np.frombuffer(report.host_port_offsets, dtype=np.uintc).astype(np.intp)
+    vuln_offsets = np.frombuffer(report.port_vuln_offsets, dtype=np.uintc).astype(np.intp)
+
+    ports = np.repeat(np.arange(len(vuln_offsets) - 1), np.diff(vuln_offsets))
+    hosts = np.repeat(np.arange(len(port_offsets) - 1), np.diff(port_offsets))[ports]
+    scores = np.frombuffer(report.cve_score, dtype=np.float64)[vulns]
+    return scores, vulns, ports, hosts, port_offsets, vuln_offsets
+
+
+def _columnar_analytics_numpy(report):
+    """
+    Columnar analytics with the per-finding work done by NumPy: severity
+    bucketing is one stable sort of the score array cut at the thresholds,
+    and counting and grouping use unique/bincount. Only the findings that
+    end up in the result are turned into dicts.
+    """
+    string = report.string
+    scores, vulns, ports, hosts, port_offsets, vuln_offsets = _columnar_arrays(report)
+
+    # Labels of pairs, ports and hosts, decoded once each
+    pair_ids = [string(vuln_id) for vuln_id in report.cve_id]
+    pair_scores = [string(score) for score in report.cve_score_text]
+    port_labels = [str(number) if number != NO_VALUE else '' for number in report.port_number]
+    service_labels = [string(name) for name in report.service_name]
+    address, address_offsets = report.address, report.host_address_offsets
+    host_labels = [string(address[address_offsets[h]]) if address_offsets[h] < address_offsets[h + 1]
+                   else 'Unknown' for h in range(len(report))]
+
+    vuln_list, port_list = vulns.tolist(), ports.tolist()
+    host_vulns = [
+        {'id': pair_ids[cve], 'score': pair_scores[cve], 'port': port_labels[p], 'service': service_labels[p]}
+        for cve, p in zip(vuln_list, port_list)
+    ]
+
+    # Findings of host h are host_vulns[host_starts[h]:host_starts[h + 1]]
+    host_starts = vuln_offsets[port_offsets].tolist()
+    vulnerabilities_by_host = [
+        {'host': host_labels[h], 'vulnerability_count': end - start,
+         'vulnerabilities': host_vulns[start:end]}
+        for h, (start, end) in enumerate(zip(host_starts, host_starts[1:])) if end > start
+    ]
+
+    # Highest score first, report order between equal scores; each bucket is then a slice
+    (_, critical_min), (_, high_min), (_, medium_min) = SEVERITY_THRESHOLDS
+    order = np.argsort(-scores, kind='stable')
+    bounds = np.cumsum([0, np.count_nonzero(scores >= critical_min),
+                        np.count_nonzero((scores >= high_min) & (scores < critical_min)),
+                        np.count_nonzero((scores >= medium_min) & (scores < high_min)),
+                        np.count_nonzero((scores > 0) & (scores < medium_min))]).tolist()
+    host_list = hosts.tolist()
+    vulnerabilities_by_severity = {}
+    for index, severity in enumerate(('critical', 'high', 'medium', 'low')):
+        vulnerabilities_by_severity[severity] = [
+            {'id': pair_ids[vuln_list[i]], 'score': pair_scores[vuln_list[i]], 'host': host_labels[host_list[i]],
+             'port': port_labels[port_list[i]], 'service': service_labels[port_list[i]]}
+            for i in order[bounds[index]:bounds[index + 1]].tolist()
+        ]
+
+    # Most common CVEs, first-seen order between equal counts
+    cve_codes = np.frombuffer(report.cve_id, dtype=np.uintc)[vulns]
+    codes, first, counts = np.unique(cve_codes, return_index=True, return_counts=True)
+    top = np.lexsort((first, -counts))[:TOP_VULNERABILITIES]
+    top_vulnerabilities = [
+        {'id': string(int(codes[i])), 'count': int(counts[i]), 'score': pair_scores[vuln_list[first[i]]]}
+        for i in top.tolist()
+    ]
+
+    service_codes = np.frombuffer(report.service_name, dtype=np.uintc)[ports]
+    service_codes = np.where(service_codes == NO_VALUE, _empty_string_id(report), service_codes)
+
+    return {
+        'total_vulnerabilities': len(host_vulns),
+        'hosts_with_vulnerabilities': len(vulnerabilities_by_host),
+        'critical_count': bounds[1] - bounds[0],
+        'high_count': bounds[2] - bounds[1],
+        'medium_count': bounds[3] - bounds[2],
+        'low_count': bounds[4] - bounds[3],
+        'vulnerabilities_by_host': vulnerabilities_by_host,
+        'top_vulnerabilities': top_vulnerabilities,
+        'vulnerabilities_by_severity': vulnerabilities_by_severity,
+        'statistics': compute_statistics(scores, (cve_codes, string), (hosts, host_labels.__getitem__),
+                                         (service_codes, string))
+    }
+
+
+def compute_statistics(scores, cves, hosts, services):
+    """
+    Compute score statistics over a set of findings: histogram,
+    percentiles and mean of the scored findings, and top-K hosts and
+    services by finding count and CVEs by score.
+
+    scores has one float per finding; cves, hosts and services are each
+    (codes, label) with one integer code per finding and a function giving
+    the text of a code. Vectorized with NumPy when it is installed; the
+    pure-Python fallback returns the same dict.
+    """
+    if np is not None:
+        return _statistics_numpy(scores, cves, hosts, services)
+    return _statistics_python(scores, cves, hosts, services)
+
+
+def _statistics_result(scored_count, unscored_count, mean, percentiles, histogram,
+                       top_hosts, top_services, top_by_score):
+    """Assemble the statistics dict from plain Python values"""
+    return {
+        'scored_findings': scored_count,
+        'unscored_findings': unscored_count,
+        'mean_score': round(mean, 2) if mean is not None else None,
+        'percentiles': {f"p{q}": round(value, 2) if value is not None else None
+                        for q, value in zip(PERCENTILES, percentiles)},
+        'score_histogram': [{'range': f"{i}-{i + 1}", 'count': count} for i, count in enumerate(histogram)],
+        'top_hosts': top_hosts,
+        'top_services': top_services,
+        'top_by_score': top_by_score
+    }
+
+
+def _group_entry(key, label, count, max_score, scored_sum, scored_count):
+    """One row of a top-K list"""
+    return {
+        key: label,
+        'count': count,
+        'max_score': max_score if max_score != -math.inf else None,
+        'mean_score': round(scored_sum / scored_count, 2) if scored_count else None
+    }
+
+
+def _statistics_numpy(scores, cves, hosts, services):
+    """compute_statistics with NumPy"""
+    scores = np.asarray(scores, dtype=np.float64)
+    scored = scores[scores > 0]
+
+    histogram = np.histogram(scored, bins=HISTOGRAM_BINS, range=(0, 10))[0]
+    if scored.size:
+        mean = float(scored.sum()) / scored.size
+        percentiles = [float(value) for value in np.percentile(scored, PERCENTILES)]
+    else:
+        mean, percentiles = None, [None] * len(PERCENTILES)
+
+    positive = scores > 0
+    weights = np.where(positive, scores, 0.0)
+
+    def groups(codes):
+        codes = np.asarray(codes, dtype=np.int64)
+        keys, first, inverse = np.unique(codes, return_index=True, return_inverse=True)
+        counts = np.bincount(inverse, minlength=len(keys))
+        maxes = np.full(len(keys), -np.inf)
+        np.fmax.at(maxes, inverse, scores)
+        sums = np.bincount(inverse, weights=weights, minlength=len(keys))
+        scored_counts = np.bincount(inverse, weights=positive, minlength=len(keys))
+        return keys, first, counts, maxes, sums, scored_counts
+
+    def top(codes, label, key, by_score=False):
+        keys, first, counts, maxes, sums, scored_counts = groups(codes)
+        if by_score:
+            order = np.lexsort((first, -counts, -maxes))
+        else:
+            order = np.lexsort((first, -maxes, -counts))
+        return [_group_entry(key, label(int(keys[i])), int(counts[i]), float(maxes[i]),
+                             float(sums[i]), int(scored_counts[i]))
+                for i in order[:STATISTICS_TOP].tolist()]
+
+    top_by_score = [
+        {'id': entry['id'], 'max_score': entry['max_score'], 'count': entry['count']}
+        for entry in top(cves[0], cves[1], 'id', by_score=True)
+    ]
+    return _statistics_result(int(scored.size), int(scores.size - scored.size), mean, percentiles,
+                              histogram.tolist(), top(hosts[0], hosts[1], 'host'),
+                              top(services[0], services[1], 'service'), top_by_score)
+
+
+def _percentile(sorted_values, q):
+    """Linear interpolation percentile, as numpy.percentile computes it by default"""
+    position = (len(sorted_values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    fraction = position - lower
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * fraction
+
+
+def _statistics_python(scores, cves, hosts, services):
+    """compute_statistics without NumPy"""
+    scored = sorted(score for score in scores if score > 0)
+
+    histogram = [0] * HISTOGRAM_BINS
+    for score in scored:
+        if score <= 10:
+            histogram[min(int(score * HISTOGRAM_BINS / 10), HISTOGRAM_BINS - 1)] += 1
+    if scored:
+        mean = math.fsum(scored) / len(scored)
+        percentiles = [_percentile(scored, q) for q in PERCENTILES]
+    else:
+        mean, percentiles = None, [None] * len(PERCENTILES)
+
+    def top(codes, label, key, by_score=False):
+        # code -> [count, max score, sum of positive scores, positive count], in first-seen order
+        groups = {}
+        for code, score in zip(codes, scores):
+            group = groups.get(code)
+            if group is None:
+                group = groups[code] = [0, -math.inf, 0.0, 0]
+            group[0] += 1
+            if score > group[1]:
+                group[1] = score
+            if score > 0:
+                group[2] += score
+                group[3] += 1
+        # Stable sort, so first-seen order breaks ties
+        rank = (lambda item: (-item[1][1], -item[1][0])) if by_score else (lambda item: (-item[1][0], -item[1][1]))
+        return [_group_entry(key, label(code), *group)
+                for code, group in sorted(groups.items(), key=rank)[:STATISTICS_TOP]]
+
+    top_by_score = [
+        {'id': entry['id'], 'max_score': entry['max_score'], 'count': entry['count']}
+        for entry in top(cves[0], cves[1], 'id', by_score=True)
+    ]
+    return _statistics_result(len(scored), len(scores) - len(scored), mean, percentiles, histogram,
+                              top(hosts[0], hosts[1], 'host'), top(services[0], services[1], 'service'),
+                              top_by_score)
+
+
+def finding_scores(report):
+    """
+    Get the score of every finding of a columnar report: a NumPy array read
+    from the memory map when NumPy is installed, otherwise a list
+    """
+    if np is not None:
+        return np.frombuffer(report.cve_score, dtype=np.float64)[np.frombuffer(report.vuln, dtype=np.uintc)]
+    cve_score = report.cve_score
+    return [cve_score[cve] for cve in report.vuln]
+
+
+def summarize_scores(scores):
+    """Severity counts, mean and 90th percentile of one set of finding scores"""
+    (_, critical_min), (_, high_min), (_, medium_min) = SEVERITY_THRESHOLDS
+    if np is not None:
+        scores = np.asarray(scores, dtype=np.float64)
+        critical = int(np.count_nonzero(scores >= critical_min))
+        high = int(np.count_nonzero((scores >= high_min) & (scores < critical_min)))
+        medium = int(np.count_nonzero((scores >= medium_min) & (scores < high_min)))
+        low = int(np.count_nonzero((scores > 0) & (scores < medium_min)))
+        scored = scores[scores > 0]
+        mean = float(scored.sum()) / scored.size if scored.size else None
+        p90 = float(np.percentile(scored, 90)) if scored.size else None
+    else:
+        critical = high = medium = low = 0
+        for score in scores:
+            if score >= critical_min:
+                critical += 1
+            elif score >= high_min:
+                high += 1
+            elif score >= medium_min:
+                medium += 1
+            elif score > 0:
+                low += 1
+        scored = sorted(score for score in scores if score > 0)
+        mean = math.fsum(scored) / len(scored) if scored else None
+        p90 = _percentile(scored, 90) if scored else None
+
+    return {
+        'total': len(scores),
+        'critical': critical,
+        'high': high,
+        'medium': medium,
+        'low': low,
+        'mean_score': round(mean, 2) if mean is not None else None,
+        'p90': round(p90, 2) if p90 is not None else None
+    }
+
+
+def compute_trends(points):
+    """
+    Summarize findings over a window of scans. points is a list of
+    (label dict, finding scores) in time order; each label dict is returned
+    with the summary of its scores added, and the whole window is
+    summarized over all findings together (concatenated, so this stays a
+    few array passes for millions of findings).
+    """
+    scans = [dict(label, **summarize_scores(scores)) for label, scores in points]
+    if np is not None:
+        everything = np.concatenate([np.asarray(scores, dtype=np.float64) for _, scores in points]) \
+            if points else np.empty(0)
+    else:
+        everything = [score for _, scores in points for score in scores]
+    return {'scans': scans, 'window': summarize_scores(everything)}
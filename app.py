@@ -1,7 +1,14 @@
 import os
+import json
+import time
 import logging
-from datetime import datetime
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session
+import tarfile
+import threading
+import zlib
+import click
+from datetime import datetime, timedelta
+from flask import (Flask, render_template, request, redirect, url_for, flash, jsonify, session, Response, g,
+                   before_render_template, template_rendered)
 from werkzeug.middleware.proxy_fix import ProxyFix
 
 # Configure logging
@@ -14,12 +21,87 @@ app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
 
 # Import modules after app is created
 from scanner import Scanner
-from report_manager import ReportManager
-from data_manager import data_manager, Scan
+from report_manager import report_manager
+from data_manager import data_manager, Scan, PRIORITIES, PRIORITY_NORMAL, SCAN_SORT_COLUMNS
+from report_diff import CHANGE_TYPES
+from sharding import validate_target
+from scan_profiles import PROFILES, DEFAULT_PROFILE, OPTIONS as SCAN_OPTIONS, get_profile
+import metrics
+import profiling
+from profiling import request_profiler
 
-# Create instances of the scanner and report manager
+# Create an instance of the scanner. Scans are run by scan_runner.py; set
+# FLANSCAN_EMBEDDED_RUNNER=1 to run them inside the web process instead.
 scanner = Scanner()
-report_manager = ReportManager()
+if os.environ.get('FLANSCAN_EMBEDDED_RUNNER') == '1':
+    scanner.start_runner()
+
+# Index reports that completed before the findings index existed
+threading.Thread(target=report_manager.backfill_findings, daemon=True).start()
+
+# Server-Sent Events settings for /scan_events. Each open stream holds one
+# worker thread, so only SCAN_EVENTS_MAX_STREAMS may be open per worker
+# process; past that, pages fall back to polling /scan_status.
+SCAN_EVENTS_MAX_SECONDS = 60
+SCAN_EVENTS_KEEPALIVE_SECONDS = 15
+SCAN_EVENTS_RETRY_MS = 3000
+SCAN_EVENTS_MAX_STREAMS = int(os.environ.get('FLANSCAN_SCAN_EVENTS_MAX_STREAMS', 4))
+_scan_event_slots = threading.BoundedSemaphore(SCAN_EVENTS_MAX_STREAMS)
+
+# Most scans returned by one /scan_status batch request
+SCAN_STATUS_BATCH_LIMIT = 1000
+
+# Reports listing page size (default and largest allowed)
+REPORTS_PAGE_SIZE = 50
+REPORTS_MAX_PAGE_SIZE = 500
+
+# Hosts per page in the report view (default and largest allowed)
+HOSTS_PAGE_SIZE = 100
+HOSTS_MAX_PAGE_SIZE = 1000
+
+# Findings returned per search page (default and largest allowed)
+FINDINGS_PAGE_SIZE = 100
+FINDINGS_MAX_PAGE_SIZE = 1000
+
+# Changes listed on the diff page; the API returns all of them
+DIFF_PAGE_CHANGES = 1000
+
+# Days of earlier scans of the same target shown as trends on the analytics page
+TREND_WINDOW_DAYS = 90
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    request_profiler.start_request(request.headers.get('X-Flanscan-Profile')
+                                   or request.args.get('_profile'))
+
+@app.after_request
+def observe_request(response):
+    """
+    Record each request's latency and, when profiling, its Server-Timing
+    breakdown; streamed responses count until their first byte
+    """
+    started = g.pop('request_started', None)
+    if started is not None:
+        metrics.HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, method=request.method,
+                                             endpoint=request.endpoint or 'unmatched',
+                                             status=response.status_code)
+    return request_profiler.finish_request(response, request.method, request.path,
+                                           request.endpoint)
+
+@app.teardown_request
+def end_request_profile(exc):
+    request_profiler.end_request()
+
+def start_render_phase(sender, template, context, **extra):
+    profiling.enter('render')
+
+def end_render_phase(sender, template, context, **extra):
+    profiling.leave()
+
+# Template rendering is the render phase of the Server-Timing breakdown
+before_render_template.connect(start_render_phase, app)
+template_rendered.connect(end_render_phase, app)
 
 @app.route('/')
 def index():
@@ -28,55 +110,328 @@ def index():
     # Take only the 5 most recent completed scans for display
     recent_reports = completed_scans[:5] if completed_scans else []
     
-    return render_template('index.html', active_scans=active_scans + recent_reports)
+    return render_template('index.html', active_scans=active_scans + recent_reports,
+                           profiles=PROFILES.values(), default_profile=DEFAULT_PROFILE)
 
 @app.route('/start_scan', methods=['POST'])
 def start_scan():
-    target = request.form.get('target')
-    scan_name = request.form.get('scan_name', f"Scan_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
-    
+    """
+    Queue a scan from the form, or from a JSON body of the same fields plus
+    an 'options' object, in which case the answer is JSON too
+    """
+    if request.is_json:
+        data = request.get_json(silent=True) or {}
+        options = data.get('options') or {}
+    else:
+        data = request.form
+        options = {option: data.get(option) for option in SCAN_OPTIONS if data.get(option)}
+
+    target = data.get('target')
+    scan_name = data.get('scan_name') or f"Scan_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    priority = PRIORITIES.get(data.get('priority', 'normal'), PRIORITY_NORMAL)
+    incremental = data.get('incremental') in (True, '1', 'true', 'on')
+    submitter = request.remote_addr
+
     if not target:
-        flash('Please provide a target IP address or range', 'danger')
-        return redirect(url_for('index'))
-    
+        return start_scan_error('Please provide a target IP address or range')
+    try:
+        validate_target(target, scanner.max_target_hosts)
+    except ValueError as e:
+        return start_scan_error(str(e))
+
+    try:
+        profile = get_profile(data.get('profile') or DEFAULT_PROFILE, options)
+    except (ValueError, TypeError) as e:
+        return start_scan_error(f'Invalid scan profile: {str(e)}')
+
     try:
         # Create a new scan record
         new_scan = Scan(
             name=scan_name,
             target=target,
             status='queued',
-            start_time=datetime.now()
+            start_time=datetime.now(),
+            priority=priority,
+            submitter=submitter,
+            incremental=incremental,
+            profile=profile.name,
+            scan_options=profile.options()
         )
         scan_id = data_manager.add_scan(new_scan)
         
-        # Start the scan
+        # Queue the scan; it starts when a scan worker is free
         scanner.start_scan(new_scan.id, target)
-        flash('Scan started successfully', 'success')
     except Exception as e:
         logging.error(f"Error starting scan: {str(e)}")
-        flash(f'Error starting scan: {str(e)}', 'danger')
-    
+        return start_scan_error(f'Error starting scan: {str(e)}', 500)
+
+    if request.is_json:
+        return jsonify(new_scan.to_dict()), 201
+    flash('Scan queued successfully', 'success')
+    return redirect(url_for('index'))
+
+def start_scan_error(message, status=400):
+    """Report a scan that could not be queued, as JSON or as a flash message"""
+    if request.is_json:
+        return jsonify({'error': message}), status
+    flash(message, 'danger')
     return redirect(url_for('index'))
 
+def scan_status_payload(scan, shards=None, queue_position=None):
+    """
+    Build the JSON status of a scan, as served by /scan_status and /scan_events.
+    Shard progress and queue position are looked up unless passed in.
+    """
+    status = {
+        'id': scan.id,
+        'status': scan.status,
+        'start_time': scan.start_time.isoformat() if scan.start_time else None,
+        'end_time': scan.end_time.isoformat() if scan.end_time else None
+    }
+
+    if scan.status == 'running':
+        status['progress'] = scan.progress
+        status['progress_task'] = scan.progress_task
+        status['hosts_done'] = scan.hosts_done
+
+    if shards is None:
+        shards = data_manager.get_shard_progress(scan.id)
+    if shards:
+        status['shards'] = shards
+
+    queue_info = scanner.get_queue_info(scan.id, queue_position) if scan.status == 'queued' else None
+    if queue_info:
+        status['queue_position'] = queue_info['queue_position']
+        # Minute resolution, so the estimate alone does not count as a change
+        status['estimated_start'] = queue_info['estimated_start'].replace(
+            second=0, microsecond=0).isoformat()
+
+    return status
+
 @app.route('/scan_status/<int:scan_id>')
 def scan_status(scan_id):
     scan = data_manager.get_scan(scan_id)
     if not scan:
         return jsonify({'error': 'Scan not found'}), 404
         
-    return jsonify({
-        'id': scan.id,
-        'status': scan.status,
-        'start_time': scan.start_time.isoformat() if scan.start_time else None,
-        'end_time': scan.end_time.isoformat() if scan.end_time else None
+    return jsonify(scan_status_payload(scan))
+
+@app.route('/scan_status')
+def scan_status_batch():
+    """
+    Status of many scans from one store read.
+
+    Filters: ids=1,2,3 and/or status=queued,running, plus since/until (ISO
+    dates or timestamps bounding start_time; a bare until date includes that
+    day) and limit. Without ids or status, the active scans are returned.
+    Responses carry an ETag derived from the status version, so an unchanged
+    poll with If-None-Match gets an empty 304.
+    """
+    try:
+        ids = [int(i) for i in request.args.get('ids', '').split(',') if i.strip()] or None
+        statuses = [s for s in request.args.get('status', '').split(',') if s.strip()] or None
+        since = parse_date_bound(request.args.get('since'))
+        until = parse_date_bound(request.args.get('until'), end=True)
+        limit = min(int(request.args.get('limit', SCAN_STATUS_BATCH_LIMIT)), SCAN_STATUS_BATCH_LIMIT)
+    except ValueError as e:
+        return jsonify({'error': f'Invalid filter: {str(e)}'}), 400
+
+    if ids is None and statuses is None:
+        statuses = ['queued', 'running']
+
+    # Same status version and same query means the same answer
+    etag = f'{data_manager.get_status_version()}-{zlib.crc32(request.query_string):x}'
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+        response.set_etag(etag, weak=True)
+        return response
+
+    version, scans, shard_progress, queue_positions = data_manager.get_status_snapshot(
+        ids=ids, statuses=statuses, since=since, until=until, limit=limit)
+    response = jsonify({
+        'version': version,
+        'scans': [scan_status_payload(scan, shard_progress.get(scan.id, {}), queue_positions.get(scan.id))
+                  for scan in scans]
     })
+    response.set_etag(f'{version}-{zlib.crc32(request.query_string):x}', weak=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+# Status of all active scans at one status version, shared by every event stream in this worker
+_active_status_cache = {'version': None, 'statuses': {}}
+_active_status_lock = threading.Lock()
+
+def active_scan_statuses(version):
+    """Get {scan_id: status payload} for the active scans, computed once per status version"""
+    with _active_status_lock:
+        if _active_status_cache['version'] != version:
+            # Read from the table, not the cached listing, so progress is current
+            version, scans, shard_progress, queue_positions = data_manager.get_status_snapshot(
+                statuses=['queued', 'running'])
+            _active_status_cache['statuses'] = {
+                scan.id: scan_status_payload(scan, shard_progress.get(scan.id, {}),
+                                             queue_positions.get(scan.id))
+                for scan in scans
+            }
+            _active_status_cache['version'] = version
+        return _active_status_cache['statuses']
+
+@app.route('/scan_events')
+def scan_events():
+    """
+    Server-Sent Events stream of scan status changes, replacing per-scan polling.
+
+    The first event carries every active scan; after that an event is sent
+    whenever the status version changes (in any worker), listing only the scans
+    whose status payload changed, including scans that just finished and live
+    progress. Streams end after SCAN_EVENTS_MAX_SECONDS and the browser
+    reconnects, so long-lived connections do not pin workers forever.
+
+    At most SCAN_EVENTS_MAX_STREAMS streams are open per worker; beyond that
+    the request gets a 503, which makes the page poll /scan_status instead.
+    """
+    if not _scan_event_slots.acquire(blocking=False):
+        response = jsonify({'error': 'Too many open event streams, poll /scan_status instead'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(SCAN_EVENTS_MAX_SECONDS)
+        return response
+
+    def stream():
+        yield f"retry: {SCAN_EVENTS_RETRY_MS}\n\n"
+        sent = {}
+        version = None
+        deadline = time.monotonic() + SCAN_EVENTS_MAX_SECONDS
+
+        while time.monotonic() < deadline:
+            if version is None:
+                new_version = data_manager.get_status_version()
+            else:
+                new_version = data_manager.wait_for_change(
+                    version, min(SCAN_EVENTS_KEEPALIVE_SECONDS, max(0, deadline - time.monotonic())))
+            if new_version == version:
+                yield ": keepalive\n\n"
+                continue
+            version = new_version
+
+            current = active_scan_statuses(version)
+            changed = [payload for scan_id, payload in current.items() if sent.get(scan_id) != payload]
+            # Scans that left the active set get their final state once
+            for scan_id in sent.keys() - current.keys():
+                scan = data_manager.get_scan(scan_id)
+                changed.append(scan_status_payload(scan) if scan else {'id': scan_id, 'status': 'deleted'})
+            sent = current
+
+            if changed:
+                data = json.dumps({'version': version, 'scans': changed})
+                yield f"id: {version}\nevent: scans\ndata: {data}\n\n"
+
+    response = Response(stream(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # The server closes the response however the stream ends, so the slot is always returned
+    response.call_on_close(_scan_event_slots.release)
+    return response
 
 @app.route('/reports')
 def reports():
-    all_reports = data_manager.get_all_scans()
-    # Sort by start_time in descending order
-    all_reports.sort(key=lambda x: x.start_time if x.start_time else datetime.min, reverse=True)
-    return render_template('reports.html', reports=all_reports)
+    try:
+        filters = report_listing_filters()
+        page, next_cursor = data_manager.get_scans_page(**filters)
+    except ValueError as e:
+        flash(f'Invalid filter: {str(e)}', 'danger')
+        return redirect(url_for('reports'))
+
+    return render_template('reports.html', reports=page, next_cursor=next_cursor,
+                           filters=request.args, sort_columns=SCAN_SORT_COLUMNS)
+
+@app.route('/api/reports')
+def api_reports():
+    """
+    JSON version of the reports listing: same filters, same cursor paging
+    """
+    try:
+        filters = report_listing_filters()
+        page, next_cursor = data_manager.get_scans_page(**filters)
+    except ValueError as e:
+        return jsonify({'error': f'Invalid filter: {str(e)}'}), 400
+
+    return jsonify({
+        'scans': [scan.to_dict() for scan in page],
+        'next_cursor': next_cursor
+    })
+
+@app.route('/api/reports/export')
+def api_export_reports():
+    """
+    Download finished scans as a report archive (tar): the scans listed in
+    ids (comma separated), or every finished scan matching the listing
+    filters (target, since, until)
+    """
+    try:
+        ids = [int(i) for i in request.args.get('ids', '').split(',') if i.strip()]
+        if ids:
+            scans = [scan for scan in (data_manager.get_scan(i) for i in ids) if scan]
+        else:
+            filters = report_listing_filters()
+            filters.update(statuses=['completed', 'failed', 'cancelled'], limit=REPORTS_MAX_PAGE_SIZE,
+                           cursor=None)
+            scans = []
+            while True:
+                page, filters['cursor'] = data_manager.get_scans_page(**filters)
+                scans.extend(page)
+                if not filters['cursor']:
+                    break
+    except ValueError as e:
+        return jsonify({'error': f'Invalid filter: {str(e)}'}), 400
+
+    filename = f"flanscan-reports-{datetime.now().strftime('%Y%m%d-%H%M%S')}.tar"
+    return Response(report_manager.iter_export(scans), mimetype='application/x-tar',
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+@app.route('/api/reports/import', methods=['POST'])
+def api_import_reports():
+    """
+    Import a report archive uploaded as the 'archive' file field (or as
+    the raw request body); the scans get new ids
+    """
+    upload = request.files.get('archive')
+    try:
+        scan_ids = report_manager.import_reports(upload.stream if upload else request.stream)
+    except (ValueError, EOFError, tarfile.TarError) as e:
+        return jsonify({'error': f'Invalid report archive: {str(e)}'}), 400
+
+    return jsonify({'imported': scan_ids}), 201
+
+def parse_date_bound(value, end=False):
+    """
+    Parse an ISO date or datetime filter; a bare date used as an end bound
+    includes that whole day
+    """
+    if not value:
+        return None
+    bound = datetime.fromisoformat(value)
+    if end and len(value) == 10:
+        bound += timedelta(days=1)
+    return bound
+
+def report_listing_filters():
+    """
+    Read the reports listing filters from the query string:
+    status (comma separated), target (substring), since/until (ISO dates
+    bounding start_time), sort, order (asc/desc), limit and cursor.
+    Raises ValueError on malformed values.
+    """
+    args = request.args
+    statuses = [s for s in args.get('status', '').split(',') if s.strip()]
+    return {
+        'statuses': statuses or None,
+        'target': args.get('target', '').strip() or None,
+        'since': parse_date_bound(args.get('since')),
+        'until': parse_date_bound(args.get('until'), end=True),
+        'sort': args.get('sort', 'start_time'),
+        'descending': args.get('order', 'desc') != 'asc',
+        'limit': max(1, min(int(args.get('limit', REPORTS_PAGE_SIZE)), REPORTS_MAX_PAGE_SIZE)),
+        'cursor': args.get('cursor') or None
+    }
 
 @app.route('/view_report/<int:scan_id>')
 def view_report(scan_id):
@@ -84,14 +439,95 @@ def view_report(scan_id):
     if not scan:
         flash('Scan not found', 'danger')
         return redirect(url_for('reports'))
-    
-    if scan.status != 'completed':
+
+    try:
+        filters = host_filters()
+    except ValueError as e:
+        flash(f'Invalid filter: {str(e)}', 'danger')
+        return redirect(url_for('view_report', scan_id=scan_id))
+
+    # Only host summaries are rendered; ports and vulnerabilities load on demand
+    summaries = report_manager.get_host_summaries(scan_id)
+    if summaries is None:
+        if scan.status == 'completed':
+            return render_template('view_report.html', scan=scan, report=None)
         flash('Report is not yet available', 'warning')
         return redirect(url_for('reports'))
-    
-    report_data = report_manager.get_report(scan_id)
-    return render_template('view_report.html', scan=scan, report=report_data)
-    
+
+    hosts, page, pages = host_page(summaries['hosts'], filters)
+    previous_scan = data_manager.get_previous_completed_scan(scan) if scan.status == 'completed' else None
+    return render_template('view_report.html', scan=scan, report=summaries, hosts=hosts,
+                           page=page, pages=pages, filters=request.args, previous_scan=previous_scan)
+
+@app.route('/api/reports/<int:scan_id>/hosts')
+def api_report_hosts(scan_id):
+    """
+    One page of host summaries of a report, with the same filters as view_report
+    """
+    try:
+        filters = host_filters()
+    except ValueError as e:
+        return jsonify({'error': f'Invalid filter: {str(e)}'}), 400
+
+    summaries = report_manager.get_host_summaries(scan_id)
+    if summaries is None:
+        return jsonify({'error': 'Report not found'}), 404
+
+    hosts, page, pages = host_page(summaries['hosts'], filters)
+    return jsonify({
+        'scanner': summaries['scanner'],
+        'version': summaries['version'],
+        'scan_time': summaries['scan_time'],
+        'partial': summaries['partial'],
+        'total_hosts': len(summaries['hosts']),
+        'page': page,
+        'pages': pages,
+        'hosts': hosts
+    })
+
+@app.route('/api/reports/<int:scan_id>/hosts/<int:host_index>')
+def api_report_host(scan_id, host_index):
+    """
+    Ports and vulnerabilities of one host, filtered like view_report
+    """
+    try:
+        filters = host_filters()
+    except ValueError as e:
+        return jsonify({'error': f'Invalid filter: {str(e)}'}), 400
+
+    host = report_manager.get_host(scan_id, host_index, only_open=filters['only_open'],
+                                   min_score=filters['min_score'])
+    if host is None:
+        return jsonify({'error': 'Host not found'}), 404
+    return jsonify(host)
+
+def host_filters():
+    """
+    Read the host view filters from the query string: only_open, only_vulnerable,
+    min_cvss, page and per_page. Raises ValueError on malformed values.
+    """
+    args = request.args
+    return {
+        'only_open': args.get('only_open') in ('1', 'true', 'on'),
+        'only_vulnerable': args.get('only_vulnerable') in ('1', 'true', 'on'),
+        'min_score': float(args['min_cvss']) if args.get('min_cvss') else None,
+        'page': max(1, int(args.get('page', 1))),
+        'per_page': max(1, min(int(args.get('per_page', HOSTS_PAGE_SIZE)), HOSTS_MAX_PAGE_SIZE))
+    }
+
+def host_page(hosts, filters):
+    """
+    Filter host summaries and cut out the requested page.
+    Returns the hosts on the page, the page number and the page count.
+    """
+    hosts = report_manager.filter_host_summaries(
+        hosts, only_open=filters['only_open'], only_vulnerable=filters['only_vulnerable'],
+        min_score=filters['min_score'])
+    per_page = filters['per_page']
+    pages = max(1, -(-len(hosts) // per_page))
+    page = min(filters['page'], pages)
+    return hosts[(page - 1) * per_page:page * per_page], page, pages
+
 @app.route('/vulnerability_analytics/<int:scan_id>')
 def vulnerability_analytics(scan_id):
     scan = data_manager.get_scan(scan_id)
@@ -99,12 +535,34 @@ def vulnerability_analytics(scan_id):
         flash('Scan not found', 'danger')
         return redirect(url_for('reports'))
     
-    if scan.status != 'completed':
-        flash('Analytics are not yet available', 'warning')
-        return redirect(url_for('reports'))
+    trends = None
+    if scan.status == 'completed':
+        analytics_data = report_manager.get_vulnerability_analytics(scan_id)
+        trends = report_manager.get_trends(scan.target, TREND_WINDOW_DAYS)
+    else:
+        analytics_data = report_manager.get_partial_analytics(scan_id)
+        if analytics_data is None:
+            flash('Analytics are not yet available', 'warning')
+            return redirect(url_for('reports'))
     
-    analytics_data = report_manager.get_vulnerability_analytics(scan_id)
-    return render_template('vulnerability_analytics.html', scan=scan, analytics=analytics_data)
+    return render_template('vulnerability_analytics.html', scan=scan, analytics=analytics_data,
+                           trends=trends, trend_days=TREND_WINDOW_DAYS)
+
+@app.route('/api/trends')
+def api_trends():
+    """
+    Severity counts and score statistics per completed scan of a target
+    (exact match) over the last days (default TREND_WINDOW_DAYS, 0 for all)
+    """
+    target = request.args.get('target', '').strip()
+    if not target:
+        return jsonify({'error': 'target is required'}), 400
+    try:
+        days = float(request.args.get('days', TREND_WINDOW_DAYS))
+    except ValueError:
+        return jsonify({'error': 'days must be a number'}), 400
+
+    return jsonify(dict(report_manager.get_trends(target, days), target=target, days=days))
 
 @app.route('/delete_report/<int:scan_id>', methods=['POST'])
 def delete_report(scan_id):
@@ -139,10 +597,11 @@ def cancel_scan(scan_id):
         return redirect(url_for('index'))
     
     try:
+        # The cancelled status is seen by whichever runner has the scan
+        data_manager.update_scan_fields(scan_id, only_if_status=['queued', 'running'],
+                                        status='cancelled',
+                                        end_time=datetime.now())
         scanner.cancel_scan(scan_id)
-        scan.status = 'cancelled'
-        scan.end_time = datetime.now()
-        data_manager.update_scan(scan)
         flash('Scan cancelled successfully', 'success')
     except Exception as e:
         logging.error(f"Error cancelling scan: {str(e)}")
@@ -150,6 +609,167 @@ def cancel_scan(scan_id):
     
     return redirect(url_for('index'))
 
+@app.route('/findings')
+def findings():
+    """
+    Search page over the findings index of all completed scans
+    """
+    results, next_after = [], None
+    try:
+        filters = findings_filters()
+        if any(value for key, value in filters.items() if key not in ('limit', 'after')):
+            results, next_after = data_manager.query_findings(**filters)
+    except ValueError as e:
+        flash(f'Invalid filter: {str(e)}', 'danger')
+
+    return render_template('findings.html', findings=results, next_after=next_after,
+                           filters=request.args)
+
+@app.route('/api/findings')
+def api_findings():
+    """
+    Query the findings index: cve, host, service, product, version, min_score,
+    scan_id, latest, only_open, limit and after (for paging)
+    """
+    try:
+        filters = findings_filters()
+    except ValueError as e:
+        return jsonify({'error': f'Invalid filter: {str(e)}'}), 400
+
+    results, next_after = data_manager.query_findings(**filters)
+    return jsonify({'findings': results, 'next_after': next_after})
+
+def findings_filters():
+    """
+    Read the findings search filters from the query string.
+    Raises ValueError on malformed values.
+    """
+    args = request.args
+    return {
+        'cve': args.get('cve', '').strip() or None,
+        'host': args.get('host', '').strip() or None,
+        'service': args.get('service', '').strip() or None,
+        'product': args.get('product', '').strip() or None,
+        'version': args.get('version', '').strip() or None,
+        'min_score': float(args['min_score']) if args.get('min_score') else None,
+        'scan_id': int(args['scan_id']) if args.get('scan_id') else None,
+        'latest_only': args.get('latest') in ('1', 'true', 'on'),
+        'only_open': args.get('only_open') in ('1', 'true', 'on'),
+        'limit': max(1, min(int(args.get('limit', FINDINGS_PAGE_SIZE)), FINDINGS_MAX_PAGE_SIZE)),
+        'after': int(args['after']) if args.get('after') else None
+    }
+
+@app.route('/diff/<int:old_id>/<int:new_id>')
+def diff_report(old_id, new_id):
+    """
+    Show what changed between two completed scans of the same target
+    """
+    old_scan, new_scan, error = diff_scans(old_id, new_id)
+    if error:
+        flash(error, 'danger')
+        return redirect(url_for('reports'))
+
+    try:
+        diff = report_manager.get_report_diff(old_scan, new_scan)
+    except Exception as e:
+        logging.error(f"Error comparing scans {old_id} and {new_id}: {str(e)}")
+        flash(f'Error comparing scans: {str(e)}', 'danger')
+        return redirect(url_for('view_report', scan_id=new_id))
+
+    return render_template('diff_report.html', old_scan=old_scan, new_scan=new_scan,
+                           summary=diff['summary'], changes=diff['changes'][:DIFF_PAGE_CHANGES],
+                           total_changes=len(diff['changes']))
+
+@app.route('/api/diff/<int:old_id>/<int:new_id>')
+def api_diff_report(old_id, new_id):
+    """
+    Changes between two completed scans of the same target as JSON, or with
+    stream=1 as newline-delimited JSON: one change per line as it is found,
+    then a final {"summary": ...} line
+    """
+    old_scan, new_scan, error = diff_scans(old_id, new_id)
+    if error:
+        return jsonify({'error': error}), 400
+
+    if request.args.get('stream') not in ('1', 'true'):
+        try:
+            return jsonify(report_manager.get_report_diff(old_scan, new_scan))
+        except Exception as e:
+            logging.error(f"Error comparing scans {old_id} and {new_id}: {str(e)}")
+            return jsonify({'error': f'Error comparing scans: {str(e)}'}), 500
+
+    def generate():
+        summary = dict.fromkeys(CHANGE_TYPES, 0)
+        for change in report_manager.iter_report_diff(old_scan, new_scan):
+            summary[change['type']] += 1
+            yield json.dumps(change, separators=(',', ':')) + '\n'
+        yield json.dumps({'summary': summary}, separators=(',', ':')) + '\n'
+
+    return Response(generate(), mimetype='application/x-ndjson')
+
+def diff_scans(old_id, new_id):
+    """
+    Look up two scans to compare. Returns (old_scan, new_scan, error), where
+    error explains why they cannot be compared.
+    """
+    old_scan = data_manager.get_scan(old_id)
+    new_scan = data_manager.get_scan(new_id)
+    if not old_scan or not new_scan:
+        return None, None, 'Scan not found'
+    if old_scan.status != 'completed' or new_scan.status != 'completed':
+        return None, None, 'Only completed scans can be compared'
+    if old_scan.target != new_scan.target:
+        return None, None, 'Only scans of the same target can be compared'
+    if not (old_scan.report_path and os.path.exists(old_scan.report_path)
+            and new_scan.report_path and os.path.exists(new_scan.report_path)):
+        return None, None, 'Report file is missing'
+    return old_scan, new_scan, None
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """
+    Prometheus metrics: scan, nmap, store, report parsing, analytics and
+    request timings summed over every web worker and scan runner, plus
+    gauges of the scan queue read from the store
+    """
+    counts = data_manager.get_pipeline_counts()
+    for status in ('queued', 'running', 'completed', 'failed', 'cancelled'):
+        metrics.SCANS.set(counts['scans'].get(status, 0), status=status)
+    metrics.NMAP_PROCESSES.set(counts['nmap_processes'])
+    metrics.SCAN_RUNNERS.set(counts['runners'])
+    return Response(metrics.registry.render(), content_type=metrics.CONTENT_TYPE)
+
+@app.cli.command('reindex')
+@click.option('--workers', type=int, default=None, help='Worker processes (default: one per CPU)')
+@click.option('--batch-size', type=int, default=50, show_default=True, help='Reports written per transaction')
+@click.option('--restart', is_flag=True, help='Start over instead of resuming an interrupted run')
+def reindex_command(workers, batch_size, restart):
+    """
+    Rebuild the columnar reports, report caches and findings index of every
+    report under reports/, and mark scans whose report nmap finished as
+    completed. Resumes an interrupted run unless --restart is given.
+    """
+    from reindex import Reindex
+
+    def show_progress(counts):
+        click.echo(f"\r{counts['done']}/{counts['total']} reports ({job.rate():.1f}/s), "
+                   f"{counts['failed']} failed, {counts['repaired']} repaired", nl=False)
+
+    # Request-level logging from the store would bury the progress line
+    logging.getLogger().setLevel(logging.WARNING)
+    job = Reindex(workers=workers, batch_size=batch_size, restart=restart, progress=show_progress)
+    if not restart and data_manager.get_meta('reindex_started'):
+        click.echo("Resuming an interrupted reindex (use --restart to start over)")
+    counts = job.run()
+    click.echo()
+    click.echo(f"Indexed {counts['indexed']} reports, repaired {counts['repaired']} scans; "
+               f"{counts['resumed']} already done, {counts['skipped']} skipped, "
+               f"{counts['orphaned']} without a scan, {counts['failed']} failed")
+    for scan_id, error in job.errors:
+        click.echo(f"  scan {scan_id}: {error}", err=True)
+    if counts['failed']:
+        raise SystemExit(1)
+
 # Error handlers
 @app.errorhandler(404)
 def page_not_found(e):
@@ -0,0 +1,219 @@
+"""
+Microbenchmark for the vulnerability analytics engine against the previous loop,
+and for the columnar analytics with and without NumPy.
+
+Usage: python -m benchmarks.bench_analytics [--sizes 1000,10000] [--repeat 5] [--save]
+"""
+import argparse
+import gc
+import os
+import tempfile
+import time
+from collections import defaultdict
+
+# Keep the benchmark away from the real scan store
+os.environ.setdefault('FLANSCAN_DB', os.path.join(tempfile.gettempdir(), 'flanscan-bench.db'))
+
+import analytics
+from analytics import compute_columnar_analytics, compute_vulnerability_analytics
+from columnar import ColumnarReport
+from benchmarks.results import Results, add_arguments
+from benchmarks.synthetic import write_report
+from report_manager import report_manager
+
+
+def legacy_vulnerability_analytics(report_data):
+    """
+    The analytics loop used before the single-pass engine, kept for comparison
+    """
+    analytics = {
+        'total_vulnerabilities': 0,
+        'hosts_with_vulnerabilities': 0,
+        'critical_count': 0,
+        'high_count': 0,
+        'medium_count': 0,
+        'low_count': 0,
+        'vulnerabilities_by_host': [],
+        'top_vulnerabilities': [],
+        'vulnerabilities_by_severity': {
+            'critical': [],  # 9.0-10.0
+            'high': [],      # 7.0-8.9
+            'medium': [],    # 4.0-6.9
+            'low': []        # 0.1-3.9
+        }
+    }
+
+    # Collect all vulnerabilities
+    all_vulnerabilities = []
+    vulnerability_counts = defaultdict(int)
+
+    for host in report_data['hosts']:
+        host_addr = host['addresses'][0]['addr'] if host['addresses'] else 'Unknown'
+        host_vulns = []
+
+        for port in host['ports']:
+            for vuln in port['vulnerabilities']:
+                vuln_id = vuln['id']
+                score = vuln['score']
+
+                # Convert score to float for comparison
+                try:
+                    score_float = float(score) if score != 'N/A' else 0
+                except ValueError:
+                    score_float = 0
+
+                # Categorize by severity
+                if score_float >= 9.0:
+                    analytics['critical_count'] += 1
+                    analytics['vulnerabilities_by_severity']['critical'].append({
+                        'id': vuln_id,
+                        'score': score,
+                        'host': host_addr,
+                        'port': port['portid'],
+                        'service': port['service'].get('name', '')
+                    })
+                elif score_float >= 7.0:
+                    analytics['high_count'] += 1
+                    analytics['vulnerabilities_by_severity']['high'].append({
+                        'id': vuln_id,
+                        'score': score,
+                        'host': host_addr,
+                        'port': port['portid'],
+                        'service': port['service'].get('name', '')
+                    })
+                elif score_float >= 4.0:
+                    analytics['medium_count'] += 1
+                    analytics['vulnerabilities_by_severity']['medium'].append({
+                        'id': vuln_id,
+                        'score': score,
+                        'host': host_addr,
+                        'port': port['portid'],
+                        'service': port['service'].get('name', '')
+                    })
+                elif score_float > 0:
+                    analytics['low_count'] += 1
+                    analytics['vulnerabilities_by_severity']['low'].append({
+                        'id': vuln_id,
+                        'score': score,
+                        'host': host_addr,
+                        'port': port['portid'],
+                        'service': port['service'].get('name', '')
+                    })
+
+                # Add to host vulnerabilities
+                host_vulns.append({
+                    'id': vuln_id,
+                    'score': score,
+                    'port': port['portid'],
+                    'service': port['service'].get('name', '')
+                })
+
+                # Count total vulnerabilities
+                analytics['total_vulnerabilities'] += 1
+
+                # Track unique vulnerability counts
+                vulnerability_counts[vuln_id] += 1
+
+                # Add to all vulnerabilities list
+                all_vulnerabilities.append({
+                    'id': vuln_id,
+                    'score': score,
+                    'host': host_addr,
+                    'port': port['portid'],
+                    'service': port['service'].get('name', '')
+                })
+
+        if host_vulns:
+            analytics['hosts_with_vulnerabilities'] += 1
+            analytics['vulnerabilities_by_host'].append({
+                'host': host_addr,
+                'vulnerability_count': len(host_vulns),
+                'vulnerabilities': host_vulns
+            })
+
+    # Get top vulnerabilities (by count)
+    top_vulns = sorted(vulnerability_counts.items(), key=lambda x: x[1], reverse=True)
+    for vuln_id, count in top_vulns[:10]:  # Top 10
+        # Find an example of this vulnerability to get the score
+        example = next((v for v in all_vulnerabilities if v['id'] == vuln_id), None)
+        score = example['score'] if example else 'N/A'
+
+        analytics['top_vulnerabilities'].append({
+            'id': vuln_id,
+            'count': count,
+            'score': score
+        })
+
+    # Sort vulnerabilities by severity within each category
+    for severity in analytics['vulnerabilities_by_severity']:
+        analytics['vulnerabilities_by_severity'][severity].sort(
+            key=lambda x: float(x['score']) if x['score'] != 'N/A' else 0,
+            reverse=True
+        )
+
+    return analytics
+
+
+def best_of(func, report_data, repeat):
+    """Return the fastest of several runs of func(report_data), in seconds"""
+    timings = []
+    for _ in range(repeat):
+        # Keep collector pauses over the large parsed report out of the timing
+        gc.collect()
+        gc.disable()
+        try:
+            started = time.perf_counter()
+            func(report_data)
+            timings.append(time.perf_counter() - started)
+        finally:
+            gc.enable()
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='1000,10000', help='comma-separated host counts')
+    parser.add_argument('--ports', type=int, default=4, help='ports per host')
+    parser.add_argument('--cves', type=int, default=10, help='CVEs per port')
+    parser.add_argument('--repeat', type=int, default=5)
+    add_arguments(parser)
+    args = parser.parse_args()
+    results = Results('analytics', {'sizes': args.sizes, 'ports': args.ports, 'cves': args.cves,
+                                    'repeat': args.repeat})
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in (int(s) for s in args.sizes.split(',')):
+            path = write_report(os.path.join(tmp, f'report_{size}.xml'), hosts=size,
+                                ports_per_host=args.ports, cves_per_port=args.cves)
+            report_data = report_manager._parse_xml_report(path)
+            columns = ColumnarReport(report_manager.convert_report(path, path + '.columns'))
+            os.remove(path)
+
+            # The legacy loop predates the statistics section
+            current = compute_vulnerability_analytics(report_data)
+            same = legacy_vulnerability_analytics(report_data) == {
+                key: value for key, value in current.items() if key != 'statistics'}
+            same_columnar = compute_columnar_analytics(columns) == current
+            findings = size * args.ports * args.cves
+            print(f"\n{size} hosts, {findings} findings (outputs identical: {same}, columnar: {same_columnar})")
+            for name, func, data in [('legacy', legacy_vulnerability_analytics, report_data),
+                                     ('single-pass', compute_vulnerability_analytics, report_data),
+                                     ('columnar', compute_columnar_analytics, columns)]:
+                elapsed = results.add(f"{name}/{size}", best_of(func, data, args.repeat))
+                print(f"  {name:<20} {elapsed:8.3f} s")
+
+            if analytics.np is not None:
+                numpy, analytics.np = analytics.np, None
+                try:
+                    elapsed = best_of(compute_columnar_analytics, columns, args.repeat)
+                finally:
+                    analytics.np = numpy
+                results.add(f"columnar (no NumPy)/{size}", elapsed)
+                print(f"  {'columnar (no NumPy)':<20} {elapsed:8.3f} s")
+            columns.close()
+
+    results.save_if_requested(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Compare the columnar report format against the XML and the parsed dict.
+
+Usage: python -m benchmarks.bench_columnar [--sizes 1000,10000] [--ports 4] [--cves 10] [--save]
+"""
+import argparse
+import gc
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+# Keep the benchmark away from the real scan store
+os.environ.setdefault('FLANSCAN_DB', os.path.join(tempfile.gettempdir(), 'flanscan-bench.db'))
+
+from analytics import compute_columnar_analytics, compute_vulnerability_analytics
+from benchmarks.results import Results, add_arguments
+from benchmarks.synthetic import write_report
+from columnar import ColumnarReport
+from report_manager import report_manager
+
+
+def traced(func, *args):
+    """Run func and return (result, seconds, MiB still allocated by the result)"""
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - started
+    allocated = tracemalloc.get_traced_memory()[0] / (1024 * 1024)
+    tracemalloc.stop()
+    return result, elapsed, allocated
+
+
+def timed(func, *args):
+    """Return the seconds taken by func(*args)"""
+    gc.collect()
+    started = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='1000,10000', help='comma-separated host counts')
+    parser.add_argument('--ports', type=int, default=4, help='ports per host')
+    parser.add_argument('--cves', type=int, default=10, help='CVEs per port')
+    add_arguments(parser)
+    args = parser.parse_args()
+    results = Results('columnar', {'sizes': args.sizes, 'ports': args.ports, 'cves': args.cves})
+
+    mib = 1024 * 1024
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in (int(s) for s in args.sizes.split(',')):
+            xml_path = write_report(os.path.join(tmp, f'report_{size}.xml'), hosts=size,
+                                    ports_per_host=args.ports, cves_per_port=args.cves)
+            columns_path = os.path.join(tmp, f'report_{size}.columns')
+            convert_seconds = timed(report_manager.convert_report, xml_path, columns_path)
+
+            report_data, _, dict_mib = traced(report_manager._parse_xml_report, xml_path)
+            columns, _, columns_mib = traced(ColumnarReport, columns_path)
+            json_size = len(json.dumps(report_data, separators=(',', ':')))
+            xml_size = os.path.getsize(xml_path)
+            columns_size = os.path.getsize(columns_path)
+
+            same = (columns.to_report() == report_data and
+                    compute_columnar_analytics(columns) == compute_vulnerability_analytics(report_data))
+            print(f"\n{size} hosts, {size * args.ports * args.cves} findings "
+                  f"(round trip and analytics identical: {same})")
+            print(f"  convert from XML  {convert_seconds:8.3f} s")
+            print(f"  disk: XML {xml_size / mib:8.1f} MiB, JSON {json_size / mib:8.1f} MiB, "
+                  f"columnar {columns_size / mib:8.1f} MiB ({xml_size / columns_size:.1f}x smaller than XML)")
+            # The mapped file is the most the columnar report can add to the resident set
+            print(f"  memory: parsed dict {dict_mib:8.1f} MiB, columnar heap {columns_mib:8.2f} MiB "
+                  f"+ mapped {columns_size / mib:8.1f} MiB")
+            results.add(f"convert/{size}", convert_seconds, xml_mib=xml_size / mib,
+                        columnar_mib=columns_size / mib, dict_heap_mib=dict_mib,
+                        columnar_heap_mib=columns_mib)
+            dict_seconds = results.add(f"analytics dict/{size}",
+                                       timed(compute_vulnerability_analytics, report_data))
+            columnar_seconds = results.add(f"analytics columnar/{size}",
+                                           timed(compute_columnar_analytics, columns))
+            print(f"  analytics: dict {dict_seconds:8.3f} s, columnar {columnar_seconds:8.3f} s")
+
+            del report_data
+            columns.close()
+            os.remove(xml_path)
+            os.remove(columns_path)
+
+    results.save_if_requested(args)
+
+
+if __name__ == '__main__':
+    main()
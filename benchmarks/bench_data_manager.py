@@ -0,0 +1,142 @@
+"""
+Time DataManager operations against stores holding 10 to 100k scans.
+
+Usage: python -m benchmarks.bench_data_manager [--sizes 10,1000,100000] [--calls 200] [--save]
+"""
+import argparse
+import gc
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Keep the benchmark away from the real scan store
+os.environ.setdefault('FLANSCAN_DB', os.path.join(tempfile.gettempdir(), 'flanscan-bench.db'))
+
+from benchmarks.results import Results, add_arguments
+from data_manager import DataManager, Scan, SCAN_COLUMNS, PRIORITY_NORMAL
+
+# Share of finished scans by status; a few scans are always queued and running
+FINISHED_STATUSES = ['completed'] * 8 + ['failed', 'cancelled']
+QUEUED_SCANS = 20
+RUNNING_SCANS = 2
+
+
+def seed_store(data_manager, size, seed=0):
+    """
+    Fill a store with size scans spread over the last year, about ten per
+    target, and return the targets used
+    """
+    rng = random.Random(seed)
+    targets = [f"10.{i // 256 % 256}.{i % 256}.0/24" for i in range(max(1, size // 10))]
+    now = datetime.now()
+    scans = []
+    for index in range(size):
+        if index >= size - QUEUED_SCANS:
+            status = 'queued'
+        elif index >= size - QUEUED_SCANS - RUNNING_SCANS:
+            status = 'running'
+        else:
+            status = rng.choice(FINISHED_STATUSES)
+        start_time = now - timedelta(days=365) * (1 - index / size)
+        scans.append(Scan(id=index + 1, name=f"scan {index}", target=rng.choice(targets), status=status,
+                          start_time=start_time,
+                          end_time=None if status in ('queued', 'running') else start_time + timedelta(minutes=5),
+                          report_path=f"/reports/scan_{index + 1}/report.xml.gz" if status == 'completed' else None,
+                          submitter=f"user{rng.randint(1, 20)}", scan_options={'timing': 4}))
+
+    # One transaction: going through add_scan would take minutes at 100k scans
+    with data_manager._transaction() as conn:
+        conn.executemany(
+            f"INSERT INTO scan ({', '.join(SCAN_COLUMNS)}) VALUES ({', '.join('?' for _ in SCAN_COLUMNS)})",
+            [data_manager._scan_to_row(scan) for scan in scans])
+    return targets
+
+
+def time_calls(func, calls):
+    """Return the mean seconds of calls calls of func(index)"""
+    gc.collect()
+    started = time.perf_counter()
+    for index in range(calls):
+        func(index)
+    return (time.perf_counter() - started) / calls
+
+
+def first_queued(queued, running, last_served):
+    """Claim policy for the benchmark: the head of the queue"""
+    return queued[0]
+
+
+def operations(data_manager, size, targets):
+    """
+    List (name, func(index), calls scale) for every operation measured.
+    The scale shrinks the call count of operations that read every scan.
+    """
+    rng = random.Random(1)
+    ids = [rng.randint(1, size) for _ in range(1000)]
+    page_cursor = {}
+
+    def cold_view(_):
+        # Any write moves the store version, so the next read rebuilds the view
+        data_manager._view = None
+        data_manager.get_all_scans()
+
+    def deep_page(index):
+        cursor = page_cursor.get('cursor')
+        scans, cursor = data_manager.get_scans_page(cursor=cursor)
+        page_cursor['cursor'] = cursor
+
+    def claim_and_release(_):
+        scan = data_manager.claim_next_scan('bench', 30, first_queued)
+        data_manager.release_scan(scan.id, 'bench', requeue=True)
+
+    return [
+        ('add_scan', lambda i: data_manager.add_scan(
+            Scan(name='bench', target=targets[i % len(targets)], priority=PRIORITY_NORMAL)), 1),
+        ('get_scan', lambda i: data_manager.get_scan(ids[i % len(ids)]), 1),
+        ('update_scan_fields', lambda i: data_manager.update_scan_fields(
+            ids[i % len(ids)], progress=i % 100), 1),
+        ('get_scans_page (first)', lambda i: data_manager.get_scans_page(), 1),
+        ('get_scans_page (next)', deep_page, 1),
+        ('get_scans_page (target)', lambda i: data_manager.get_scans_page(
+            target=targets[i % len(targets)][:8]), 1),
+        ('get_status_snapshot (active)', lambda i: data_manager.get_status_snapshot(
+            statuses=('queued', 'running')), 1),
+        ('get_queue_position', lambda i: data_manager.get_queue_position(size - i % QUEUED_SCANS), 1),
+        ('get_completed_scans_of_target', lambda i: data_manager.get_completed_scans_of_target(
+            targets[i % len(targets)]), 1),
+        ('get_previous_completed_scan', lambda i: data_manager.get_previous_completed_scan(
+            data_manager.get_scan(ids[i % len(ids)])), 1),
+        ('claim_next_scan + release', claim_and_release, 1),
+        ('get_all_scans (cached view)', lambda i: data_manager.get_all_scans(), 1),
+        ('get_all_scans (cold view)', cold_view, 0.05),
+        ('get_expired_scan_ids', lambda i: data_manager.get_expired_scan_ids(keep_per_target=5), 0.05),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='10,1000,100000', help='comma-separated scan counts')
+    parser.add_argument('--calls', type=int, default=200, help='calls per operation')
+    add_arguments(parser)
+    args = parser.parse_args()
+    results = Results('data_manager', {'sizes': args.sizes, 'calls': args.calls})
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in (int(s) for s in args.sizes.split(',')):
+            data_manager = DataManager(os.path.join(tmp, f'scans_{size}.db'))
+            started = time.perf_counter()
+            targets = seed_store(data_manager, size)
+            print(f"\n{size} scans (seeded in {time.perf_counter() - started:.1f} s)")
+
+            for name, func, scale in operations(data_manager, size, targets):
+                calls = max(1, int(args.calls * scale))
+                elapsed = results.add(f"{name}/{size}", time_calls(func, calls), calls=calls)
+                print(f"  {name:<32} {elapsed * 1000:9.3f} ms")
+
+    results.save_if_requested(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""
+Compare the streaming report parser against the previous ElementTree one.
+
+Usage: python -m benchmarks.bench_parser [--sizes 1000,10000,100000] [--memory] [--save]
+"""
+import argparse
+import gc
+import os
+import tempfile
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+
+# Keep the benchmark away from the real scan store
+os.environ.setdefault('FLANSCAN_DB', os.path.join(tempfile.gettempdir(), 'flanscan-bench.db'))
+
+from benchmarks.results import Results, add_arguments
+from benchmarks.synthetic import write_report
+from report_manager import report_manager
+
+
+def legacy_parse_xml_report(xml_path):
+    """
+    The ElementTree parser used before the streaming one, kept for comparison
+    """
+    root = ET.parse(xml_path).getroot()
+    scan_info = {
+        'scanner': root.get('scanner', 'Unknown'),
+        'version': root.get('version', 'Unknown'),
+        'scan_time': root.get('start', 'Unknown'),
+        'hosts': []
+    }
+    for host in root.findall('.//host'):
+        host_data = {
+            'status': host.find('.//status').get('state', 'unknown') if host.find('.//status') is not None else 'unknown',
+            'addresses': [{'addr': a.get('addr', ''), 'addrtype': a.get('addrtype', '')}
+                          for a in host.findall('.//address')],
+            'hostnames': [{'name': h.get('name', ''), 'type': h.get('type', '')}
+                          for h in host.findall('.//hostname')],
+            'ports': []
+        }
+        for port in host.findall('.//port'):
+            port_data = {
+                'protocol': port.get('protocol', ''),
+                'portid': port.get('portid', ''),
+                'state': port.find('.//state').get('state', '') if port.find('.//state') is not None else 'unknown',
+                'service': {},
+                'vulnerabilities': []
+            }
+            service = port.find('.//service')
+            if service is not None:
+                port_data['service'] = {
+                    'name': service.get('name', ''),
+                    'product': service.get('product', ''),
+                    'version': service.get('version', ''),
+                    'extrainfo': service.get('extrainfo', '')
+                }
+            for script in port.findall('.//script'):
+                if script.get('id') == 'vulners':
+                    for line in script.get('output', '').splitlines():
+                        if 'CVE-' in line:
+                            parts = line.strip().split('\t')
+                            if len(parts) >= 2:
+                                port_data['vulnerabilities'].append(
+                                    {'id': parts[0].strip(), 'score': parts[1].strip()})
+            host_data['ports'].append(port_data)
+        scan_info['hosts'].append(host_data)
+    return scan_info
+
+
+def count_streamed_hosts(xml_path):
+    """Consume the streaming parser without keeping the hosts"""
+    return sum(1 for _ in report_manager.iter_hosts(xml_path))
+
+
+def measure(func, path, memory):
+    """Run func(path) and return (seconds, peak traced MiB or None)"""
+    gc.collect()
+    if memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    result = func(path)
+    elapsed = time.perf_counter() - started
+    peak = None
+    if memory:
+        peak = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        tracemalloc.stop()
+    del result
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='1000,10000,100000',
+                        help='comma-separated host counts')
+    parser.add_argument('--memory', action='store_true',
+                        help='also record peak memory (slower, uses tracemalloc)')
+    add_arguments(parser)
+    args = parser.parse_args()
+    results = Results('parser', {'sizes': args.sizes, 'memory': args.memory})
+
+    candidates = [
+        ('legacy ElementTree', legacy_parse_xml_report),
+        ('streaming (full dict)', report_manager._parse_xml_report),
+        ('streaming (iter_hosts)', count_streamed_hosts),
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in (int(s) for s in args.sizes.split(',')):
+            path = write_report(os.path.join(tmp, f'report_{size}.xml'), hosts=size)
+            mib = os.path.getsize(path) / (1024 * 1024)
+            print(f"\n{size} hosts ({mib:.1f} MiB)")
+
+            if legacy_parse_xml_report(path) != report_manager._parse_xml_report(path):
+                print("  WARNING: parsers disagree")
+
+            for name, func in candidates:
+                elapsed, peak = measure(func, path, args.memory)
+                results.add(f"{name}/{size}", elapsed, peak_mib=peak)
+                line = f"  {name:<24} {elapsed:8.3f} s"
+                if peak is not None:
+                    line += f"  peak {peak:8.1f} MiB"
+                print(line)
+            os.remove(path)
+
+    results.save_if_requested(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+"""
+Measure end-to-end latency of the Flask routes against a seeded store.
+
+The app runs in a scratch directory with its own store: --scans scan
+records plus two completed scans of one target with synthetic reports, so
+report, analytics, findings, trend and diff pages all have data. Each route
+is timed once with the report caches emptied (cold) and then repeatedly.
+
+Usage: python -m benchmarks.bench_routes [--scans 1000] [--hosts 1000] [--calls 50] [--save]
+"""
+import argparse
+import gc
+import logging
+import os
+import shutil
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# The app writes reports and its store under the working directory
+INITIAL_DIR = os.getcwd()
+WORK_DIR = tempfile.mkdtemp(prefix='flanscan-bench-')
+os.chdir(WORK_DIR)
+os.environ['FLANSCAN_DB'] = os.path.join(WORK_DIR, 'flanscan.db')
+
+from app import app
+from benchmarks.bench_data_manager import seed_store
+from benchmarks.results import Results, add_arguments
+from benchmarks.synthetic import write_report
+from data_manager import data_manager, Scan
+from report_archive import compress_file
+from report_manager import report_manager
+
+TARGET = '10.0.0.0/16'
+
+
+def add_report_scan(name, hosts, ports, cves, seed, age):
+    """Add a completed scan of TARGET with a compressed synthetic report"""
+    start_time = datetime.now() - age
+    scan = Scan(name=name, target=TARGET, status='completed', start_time=start_time,
+                end_time=start_time + timedelta(minutes=30))
+    data_manager.add_scan(scan)
+
+    scan_dir = os.path.join(report_manager.reports_dir, f"scan_{scan.id}")
+    os.makedirs(scan_dir)
+    xml_path = write_report(os.path.join(scan_dir, 'report.xml'), hosts=hosts, ports_per_host=ports,
+                            cves_per_port=cves, seed=seed, network=TARGET)
+    report_path = compress_file(xml_path)
+    os.remove(xml_path)
+    data_manager.update_scan_fields(scan.id, report_path=report_path)
+    report_manager.index_findings(scan.id)
+    return data_manager.get_scan(scan.id)
+
+
+def reset_caches(scans):
+    """Drop every cached form of the reports, in memory and on disk"""
+    for scan in scans:
+        report_manager.cache.evict(scan.report_path)
+        columns_path = report_manager.columnar_path(scan.report_path)
+        if os.path.exists(columns_path):
+            os.remove(columns_path)
+    with report_manager._columnar_lock:
+        report_manager._columnar.clear()
+
+
+def request_seconds(client, url):
+    """Time one GET of url; fails loudly if the route did not answer 200"""
+    started = time.perf_counter()
+    response = client.get(url)
+    response.get_data()
+    elapsed = time.perf_counter() - started
+    if response.status_code != 200:
+        raise RuntimeError(f"GET {url} returned {response.status_code}")
+    return elapsed
+
+
+def timed(func, *args):
+    """Return the seconds taken by func(*args)"""
+    gc.collect()
+    started = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scans', type=int, default=1000, help='scan records in the store')
+    parser.add_argument('--hosts', type=int, default=1000, help='hosts in each report')
+    parser.add_argument('--ports', type=int, default=4, help='ports per host')
+    parser.add_argument('--cves', type=int, default=10, help='CVEs per port')
+    parser.add_argument('--calls', type=int, default=50, help='warm requests per route')
+    add_arguments(parser)
+    args = parser.parse_args()
+    if args.save:
+        args.save = os.path.join(INITIAL_DIR, args.save)
+    results = Results('routes', {'scans': args.scans, 'hosts': args.hosts, 'ports': args.ports,
+                                 'cves': args.cves, 'calls': args.calls})
+
+    # Only warnings: request logging would dominate the timings
+    logging.getLogger().setLevel(logging.WARNING)
+    try:
+        started = time.perf_counter()
+        seed_store(data_manager, args.scans)
+        old = add_report_scan('bench old', args.hosts, args.ports, args.cves, seed=1, age=timedelta(days=7))
+        new = add_report_scan('bench new', args.hosts, args.ports, args.cves, seed=2, age=timedelta(days=1))
+        cve = data_manager.query_findings(scan_id=new.id, limit=1)[0][0]['cve']
+        print(f"{args.scans} scans, reports of {args.hosts} hosts "
+              f"(seeded in {time.perf_counter() - started:.1f} s)\n")
+
+        routes = [
+            ('index', '/'),
+            ('reports', '/reports'),
+            ('api reports', '/api/reports'),
+            ('api reports (target)', f'/api/reports?target={TARGET}'),
+            ('scan status (active)', '/scan_status'),
+            ('view report', f'/view_report/{new.id}'),
+            ('api hosts', f'/api/reports/{new.id}/hosts'),
+            ('api host', f'/api/reports/{new.id}/hosts/0'),
+            ('analytics', f'/vulnerability_analytics/{new.id}'),
+            ('api trends', f'/api/trends?target={TARGET}'),
+            ('findings', f'/findings?cve={cve}'),
+            ('api findings', f'/api/findings?cve={cve}'),
+            ('diff', f'/diff/{old.id}/{new.id}'),
+            ('api diff', f'/api/diff/{old.id}/{new.id}'),
+        ]
+
+        client = app.test_client()
+        print(f"  {'route':<24} {'cold':>10} {'median':>10} {'p95':>10}")
+        for name, url in routes:
+            reset_caches([old, new])
+            gc.collect()
+            cold = request_seconds(client, url)
+            timings = sorted(request_seconds(client, url) for _ in range(args.calls))
+            median = statistics.median(timings)
+            p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+            results.add(f"{name} (cold)", cold)
+            results.add(name, median, p95=p95, url=url)
+            print(f"  {name:<24} {cold * 1000:8.1f} ms {median * 1000:8.1f} ms {p95 * 1000:8.1f} ms")
+
+        reset_caches([old, new])
+        cold = results.add('get_vulnerability_analytics (cold)',
+                           timed(report_manager.get_vulnerability_analytics, new.id))
+        warm = results.add('get_vulnerability_analytics',
+                           timed(report_manager.get_vulnerability_analytics, new.id))
+        print(f"\n  get_vulnerability_analytics: cold {cold * 1000:.1f} ms, warm {warm * 1000:.3f} ms")
+    finally:
+        os.chdir(tempfile.gettempdir())
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+    results.save_if_requested(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""
+Run scans end to end through the fake nmap and measure throughput.
+
+Scans are submitted through POST /start_scan and run by an in-process scan
+runner whose nmap is benchmarks/fake_nmap.py, so the whole pipeline (queue,
+claiming, live host parsing, sharding, merging, compression, columnar
+conversion and indexing) runs without touching a network.
+
+Usage: python -m benchmarks.bench_scans [--scans 20] [--hosts 64] [--workers 4] [--host-delay 0.01] [--save]
+"""
+import argparse
+import logging
+import os
+import shlex
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+FAKE_NMAP = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fake_nmap.py')
+
+
+def parse_args():
+    from benchmarks.results import add_arguments
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scans', type=int, default=20, help='scans to submit')
+    parser.add_argument('--hosts', type=int, default=64, help='hosts per scan target (a power of two)')
+    parser.add_argument('--workers', type=int, default=4, help='concurrent scans')
+    parser.add_argument('--shard-size', type=int, default=256, help='hosts per nmap process')
+    parser.add_argument('--ports', type=int, default=3, help='ports per host')
+    parser.add_argument('--cves', type=int, default=5, help='CVEs per port')
+    parser.add_argument('--host-delay', type=float, default=0.01, help='fake nmap seconds per host')
+    parser.add_argument('--timeout', type=float, default=600, help='give up after this many seconds')
+    add_arguments(parser)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    initial_dir = os.getcwd()
+    if args.save:
+        args.save = os.path.join(initial_dir, args.save)
+
+    # The scanner reads its settings when the app creates it, so set them first
+    work_dir = tempfile.mkdtemp(prefix='flanscan-bench-')
+    os.chdir(work_dir)
+    os.environ.update({
+        'FLANSCAN_DB': os.path.join(work_dir, 'flanscan.db'),
+        'FLANSCAN_NMAP': f"{shlex.quote(sys.executable)} {shlex.quote(FAKE_NMAP)}",
+        'FLANSCAN_MAX_CONCURRENT_SCANS': str(args.workers),
+        'FLANSCAN_SHARD_SIZE': str(args.shard_size),
+        'FLANSCAN_RUNNER_POLL_SECONDS': '0.1',
+        'FAKE_NMAP_PORTS': str(args.ports),
+        'FAKE_NMAP_CVES': str(args.cves),
+        'FAKE_NMAP_HOST_DELAY': str(args.host_delay),
+    })
+
+    from app import app, scanner
+    from benchmarks.results import Results
+    from data_manager import data_manager
+
+    results = Results('scans', {key: value for key, value in vars(args).items() if key != 'save'})
+    logging.getLogger().setLevel(logging.WARNING)
+    prefix = 32 - max(1, args.hosts.bit_length() - 1)
+    try:
+        scanner.start_runner()
+        client = app.test_client()
+        started = time.perf_counter()
+        submit_times, scan_ids = [], []
+        for index in range(args.scans):
+            target = f"10.{index // 256 % 256}.{index % 256}.0/{prefix}"
+            before = time.perf_counter()
+            response = client.post('/start_scan', json={'target': target, 'scan_name': f'bench {index}'})
+            submit_times.append(time.perf_counter() - before)
+            if response.status_code != 201:
+                raise RuntimeError(f"Submitting a scan failed: {response.get_json()}")
+            scan_ids.append(response.get_json()['id'])
+
+        pending = set(scan_ids)
+        while pending and time.perf_counter() - started < args.timeout:
+            time.sleep(0.1)
+            _, scans, _, _ = data_manager.get_status_snapshot(ids=list(pending))
+            pending -= {scan.id for scan in scans if not scan.is_active()}
+        elapsed = time.perf_counter() - started
+        scanner.stop()
+
+        scans = [data_manager.get_scan(scan_id) for scan_id in scan_ids]
+        completed = [scan for scan in scans if scan.status == 'completed']
+        durations = sorted((scan.end_time - scan.start_time).total_seconds()
+                           for scan in completed if scan.end_time)
+        hosts = len(completed) * (2 ** (32 - prefix) - 2)
+
+        print(f"{args.scans} scans of {2 ** (32 - prefix) - 2} hosts with {args.workers} workers")
+        print(f"  completed {len(completed)}, unfinished {len(pending)}, "
+              f"other {len(scans) - len(completed) - len(pending)}")
+        print(f"  submit (median)       {statistics.median(submit_times) * 1000:8.1f} ms")
+        print(f"  all scans finished    {elapsed:8.2f} s")
+        print(f"  throughput            {len(completed) / elapsed:8.2f} scans/s, {hosts / elapsed:8.1f} hosts/s")
+        results.add('submit', statistics.median(submit_times))
+        results.add('total', elapsed, completed=len(completed), unfinished=len(pending))
+        if durations:
+            print(f"  submit to end (median) {statistics.median(durations):8.2f} s")
+            results.add('submit to end (median)', statistics.median(durations))
+    finally:
+        os.chdir(initial_dir)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    results.save_if_requested(args)
+
+
+if __name__ == '__main__':
+    main()
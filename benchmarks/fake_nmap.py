@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Stand-in for the nmap executable that writes synthetic reports, so scans can
+be run under load without scanning anything.
+
+Point the scanner at it with FLANSCAN_NMAP=/path/to/benchmarks/fake_nmap.py.
+It understands the options flanscan passes (-oX, --stats-every, -sV,
+--script, -iL; the rest are accepted and ignored) and reports every address
+of its targets as up. Each address always gets the same ports and CVEs, so
+incremental scans see unchanged hosts.
+
+Behaviour is set through the environment:
+    FAKE_NMAP_START_DELAY  seconds before the first host (default 0)
+    FAKE_NMAP_HOST_DELAY   seconds spent on each host (default 0.01)
+    FAKE_NMAP_PORTS        ports per host (default 3)
+    FAKE_NMAP_CVES         CVEs per port with --script (default 5)
+    FAKE_NMAP_FAIL_RATE    chance of exiting with an error, 0-1 (default 0)
+    FAKE_NMAP_SEED         seed of the CVE pool and host contents (default 0)
+    FAKE_NMAP_IGNORE_SIGTERM  1 to ignore SIGTERM, so only SIGKILL stops it (default 0)
+"""
+import ipaddress
+import os
+import random
+import signal
+import sys
+import time
+
+# Runnable by path, without the repository on sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import host_xml, make_cve_pool, report_header, report_footer
+
+# nmap options followed by a value
+VALUE_OPTIONS = {'-oX', '-oN', '-oG', '-iL', '-p', '--top-ports', '--min-rate', '--host-timeout',
+                 '--max-parallelism', '--stats-every', '--script-args', '--exclude'}
+
+# Largest number of addresses expanded from one target
+MAX_TARGET_HOSTS = 65536
+
+
+def parse_args(argv):
+    """Split an nmap command line into (options, targets)"""
+    options, targets = {}, []
+    args = iter(argv)
+    for arg in args:
+        if arg == '--':
+            targets.extend(args)
+            break
+        if arg in VALUE_OPTIONS:
+            options[arg] = next(args, '')
+        elif arg.startswith('-'):
+            name, _, value = arg.partition('=')
+            options[name] = value
+        else:
+            targets.append(arg)
+
+    if '-iL' in options:
+        with open(options['-iL']) as f:
+            targets.extend(f.read().split())
+    return options, targets
+
+
+def expand_target(target):
+    """List the addresses of a target: an address, a CIDR block, a last-octet range or a name"""
+    try:
+        network = ipaddress.ip_network(target, strict=False)
+    except ValueError:
+        head, _, last = target.rpartition('.')
+        first, dash, end = last.partition('-')
+        if dash and first.isdigit() and end.isdigit():
+            return [f"{head}.{octet}" for octet in range(int(first), int(end) + 1)]
+        return [target]
+
+    if network.num_addresses > MAX_TARGET_HOSTS:
+        raise ValueError(f"Target too large for the fake nmap: {target}")
+    if network.num_addresses <= 2:
+        return [str(addr) for addr in network]
+    return [str(addr) for addr in network.hosts()]
+
+
+def parse_interval(value):
+    """Convert an nmap time spec (10s, 500ms, 2m) to seconds, or None"""
+    if not value:
+        return None
+    for suffix, scale in (('ms', 0.001), ('s', 1), ('m', 60), ('h', 3600)):
+        if value.endswith(suffix):
+            return float(value[:-len(suffix)]) * scale
+    return float(value)
+
+
+def main():
+    if os.environ.get('FAKE_NMAP_IGNORE_SIGTERM') == '1':
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    options, targets = parse_args(sys.argv[1:])
+    seed = int(os.environ.get('FAKE_NMAP_SEED', 0))
+    ports = int(os.environ.get('FAKE_NMAP_PORTS', 3))
+    cves = int(os.environ.get('FAKE_NMAP_CVES', 5))
+    host_delay = float(os.environ.get('FAKE_NMAP_HOST_DELAY', 0.01))
+    stats_every = parse_interval(options.get('--stats-every'))
+    scripts = '--script' in options
+    service_details = scripts or '-sV' in options
+
+    try:
+        addresses = [addr for target in targets for addr in expand_target(target)]
+    except ValueError as e:
+        print(f"Failed to resolve targets: {e}", file=sys.stderr)
+        return 1
+    if not addresses:
+        print("WARNING: No targets were specified, so 0 hosts scanned.", file=sys.stderr)
+
+    time.sleep(float(os.environ.get('FAKE_NMAP_START_DELAY', 0)))
+    if random.random() < float(os.environ.get('FAKE_NMAP_FAIL_RATE', 0)):
+        print("nmap: simulated failure", file=sys.stderr)
+        return 1
+
+    out_path = options.get('-oX')
+    out = sys.stdout if out_path in (None, '-') else open(out_path, 'w')
+    started = time.time()
+    cve_pool = make_cve_pool(random.Random(seed), 5000)
+
+    out.write(report_header(' '.join(['nmap'] + sys.argv[1:]), int(started)))
+    out.flush()
+    last_stats = time.monotonic()
+    for index, addr in enumerate(addresses):
+        time.sleep(host_delay)
+        # Seeded by address: the same host always looks the same
+        rng = random.Random(f"{seed}:{addr}")
+        out.write(host_xml(rng, addr, f"host-{addr.replace('.', '-')}.example", int(time.time()),
+                           cve_pool, ports, cves if scripts else 0, service_details))
+        if stats_every is not None and time.monotonic() - last_stats >= stats_every:
+            last_stats = time.monotonic()
+            percent = 100.0 * (index + 1) / len(addresses)
+            out.write(f'<taskprogress task="{"NSE" if scripts else "SYN Stealth Scan"}" '
+                      f'time="{int(time.time())}" percent="{percent:.2f}"/>\n')
+        out.flush()
+
+    finished = time.time()
+    out.write(report_footer(len(addresses), len(addresses), int(finished), finished - started))
+    out.flush()
+    if out is not sys.stdout:
+        out.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,147 @@
+"""
+Save benchmark results and compare them between versions.
+
+Every benchmark accepts --save: its timings are written as JSON to
+benchmarks/results/<benchmark>-<version>.json (or the path given), tagged
+with the git revision they were measured on. Compare two runs with
+
+    python -m benchmarks.results OLD.json NEW.json [--threshold 0.1]
+
+or give two directories to compare the latest result of every benchmark
+found in both. Exits with status 1 if anything got slower than the threshold.
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+# Slowdown (as a fraction) reported as a regression by default
+REGRESSION_THRESHOLD = 0.10
+
+
+def code_version():
+    """Get the git revision of the tree being measured, marked -dirty if it has changes"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=root,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def add_arguments(parser):
+    """Add the --save option to a benchmark's argument parser"""
+    parser.add_argument('--save', nargs='?', const='', default=None, metavar='PATH',
+                        help=f'save the results as JSON (default: {RESULTS_DIR}/<benchmark>-<version>.json)')
+
+
+class Results:
+    """
+    Timings collected by one benchmark run. Each result has a name unique
+    within the benchmark (e.g. "parse/10000") and a value in seconds.
+    """
+    def __init__(self, benchmark, params=None):
+        self.benchmark = benchmark
+        self.params = params or {}
+        self.results = {}
+
+    def add(self, name, seconds, **details):
+        """Record a timing, with any details worth keeping next to it"""
+        self.results[name] = dict(details, seconds=seconds)
+        return seconds
+
+    def to_dict(self):
+        return {
+            'benchmark': self.benchmark,
+            'version': code_version(),
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'machine': f"{platform.system()} {platform.machine()} ({os.cpu_count()} CPUs)",
+            'params': self.params,
+            'results': self.results
+        }
+
+    def save(self, path=None):
+        """Write the results as JSON and return the path"""
+        data = self.to_dict()
+        if not path:
+            os.makedirs(RESULTS_DIR, exist_ok=True)
+            path = os.path.join(RESULTS_DIR, f"{self.benchmark}-{data['version']}.json")
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=2)
+        return path
+
+    def save_if_requested(self, args):
+        """Save if the benchmark was run with --save"""
+        if args.save is not None:
+            print(f"\nResults saved to {self.save(args.save)}")
+
+
+def load(path):
+    """Load a saved result file"""
+    with open(path) as f:
+        return json.load(f)
+
+
+def latest_results(directory):
+    """Get the newest saved result of each benchmark in a directory"""
+    latest = {}
+    for path in glob.glob(os.path.join(directory, '*.json')):
+        data = load(path)
+        current = latest.get(data['benchmark'])
+        if current is None or data['created'] > current['created']:
+            latest[data['benchmark']] = data
+    return latest
+
+
+def compare(baseline, current, threshold=REGRESSION_THRESHOLD):
+    """
+    Compare two result sets of the same benchmark. Returns one
+    (name, old seconds, new seconds, ratio, regressed) row per result both
+    runs have; ratio is new / old.
+    """
+    rows = []
+    for name, result in current['results'].items():
+        old = baseline['results'].get(name)
+        if old is None or not old['seconds']:
+            continue
+        ratio = result['seconds'] / old['seconds']
+        rows.append((name, old['seconds'], result['seconds'], ratio, ratio > 1 + threshold))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('baseline', help='result file or directory of the old version')
+    parser.add_argument('current', help='result file or directory of the new version')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help='slowdown reported as a regression (default: %(default)s)')
+    args = parser.parse_args()
+
+    if os.path.isdir(args.baseline) or os.path.isdir(args.current):
+        baselines, currents = latest_results(args.baseline), latest_results(args.current)
+        pairs = [(baselines[name], currents[name]) for name in sorted(currents) if name in baselines]
+    else:
+        pairs = [(load(args.baseline), load(args.current))]
+
+    regressions = 0
+    for baseline, current in pairs:
+        print(f"\n{current['benchmark']}: {baseline['version']} -> {current['version']}")
+        for name, old, new, ratio, regressed in compare(baseline, current, args.threshold):
+            regressions += regressed
+            print(f"  {name:<40} {old:9.4f} s {new:9.4f} s  {ratio:6.2f}x"
+                  f"{'  REGRESSION' if regressed else ''}")
+
+    if regressions:
+        print(f"\n{regressions} regressions over {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
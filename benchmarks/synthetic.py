@@ -0,0 +1,132 @@
+"""
+Generator for synthetic Nmap XML reports, used by the benchmarks.
+
+Usage: python -m benchmarks.synthetic report.xml [--hosts 1000] [--ports 3] [--cves 3]
+"""
+import argparse
+import ipaddress
+import os
+import random
+from xml.sax.saxutils import quoteattr
+
+SERVICES = [
+    ('tcp', 22, 'ssh', 'OpenSSH', '7.4', 'protocol 2.0'),
+    ('tcp', 80, 'http', 'Apache httpd', '2.4.6', '(CentOS)'),
+    ('tcp', 443, 'https', 'nginx', '1.18.0', ''),
+    ('tcp', 3306, 'mysql', 'MySQL', '5.7.33', ''),
+    ('tcp', 445, 'microsoft-ds', 'Samba smbd', '4.6.2', 'workgroup: WORKGROUP'),
+    ('udp', 53, 'domain', 'ISC BIND', '9.11.4', ''),
+    ('tcp', 8080, 'http-proxy', 'Squid http proxy', '3.5.20', ''),
+    ('tcp', 25, 'smtp', 'Postfix smtpd', '', ''),
+]
+
+
+def make_cve_pool(rng, size):
+    """Build a pool of (cve_id, score) pairs; real fleets share a few thousand CVEs"""
+    return [(f"CVE-{rng.randint(2010, 2024)}-{rng.randint(1000, 40000)}",
+             f"{rng.randint(1, 100) / 10:.1f}")
+            for _ in range(size)]
+
+
+def _vulners_output(rng, cve_pool, cves_per_port):
+    """Build the output attribute of a vulners script element"""
+    lines = ['', '  cpe:/a:synthetic:product: ']
+    for _ in range(cves_per_port):
+        # Skewed pick, so some CVEs are much more common than others
+        cve, score = cve_pool[int(len(cve_pool) * rng.random() ** 3)]
+        lines.append(f"    \t{cve}\t{score}\thttps://vulners.com/cve/{cve}")
+    return '\n'.join(lines) + '\n'
+
+
+def _attr(value):
+    """Quote an attribute value the way Nmap does, keeping tabs and newlines intact"""
+    return quoteattr(value, {'\t': '&#x9;', '\n': '&#xa;'})
+
+
+def host_xml(rng, addr, hostname, start, cve_pool, ports_per_host=3, cves_per_port=3,
+             service_details=True):
+    """
+    Build the <host> element of one host. Without service_details the ports
+    carry only a service name and no script output, as in a scan without
+    version detection or scripts.
+    """
+    parts = [f'<host starttime="{start}" endtime="{start + 40}">'
+             '<status state="up" reason="arp-response" reason_ttl="0"/>\n'
+             f'<address addr="{addr}" addrtype="ipv4"/>\n'
+             f'<hostnames><hostname name="{hostname}" type="PTR"/></hostnames>\n'
+             '<ports><extraports state="closed" count="997"/>\n']
+    for protocol, portid, name, product, version, extrainfo in rng.sample(
+            SERVICES, min(ports_per_host, len(SERVICES))):
+        parts.append(f'<port protocol="{protocol}" portid="{portid}">'
+                     '<state state="open" reason="syn-ack" reason_ttl="64"/>')
+        if not service_details:
+            parts.append(f'<service name="{name}" method="table" conf="3"/></port>\n')
+            continue
+        parts.append(
+            f'<service name="{name}" product={_attr(product)} version={_attr(version)} '
+            f'extrainfo={_attr(extrainfo)} method="probed" conf="10"/>')
+        if cves_per_port:
+            parts.append(f'<script id="vulners" output={_attr(_vulners_output(rng, cve_pool, cves_per_port))}/>')
+        parts.append('</port>\n')
+    parts.append('</ports>\n<times srtt="500" rttvar="300" to="100000"/>\n</host>\n')
+    return ''.join(parts)
+
+
+def report_header(args, start):
+    """Build the start of a report, up to the first <host>"""
+    return ('<?xml version="1.0" encoding="UTF-8"?>\n<!DOCTYPE nmaprun>\n'
+            f'<nmaprun scanner="nmap" args={_attr(args)} start="{start}" version="7.95" '
+            'xmloutputversion="1.05">\n'
+            '<verbose level="0"/>\n<debugging level="0"/>\n')
+
+
+def report_footer(hosts_up, hosts_total, finished, elapsed):
+    """Build the end of a report, after the last <host>"""
+    return (f'<runstats><finished time="{finished}" elapsed="{elapsed:.2f}" exit="success"/>'
+            f'<hosts up="{hosts_up}" down="{hosts_total - hosts_up}" total="{hosts_total}"/>\n'
+            '</runstats>\n</nmaprun>\n')
+
+
+def iter_report_chunks(hosts=1000, ports_per_host=3, cves_per_port=3, seed=0,
+                       network='10.0.0.0/8', start=1744875330, distinct_cves=5000):
+    """
+    Yield a synthetic Nmap XML report in chunks, one host at a time, so
+    very large reports can be written without building them in memory
+    """
+    rng = random.Random(seed)
+    cve_pool = make_cve_pool(rng, distinct_cves)
+    addresses = ipaddress.ip_network(network).hosts()
+
+    yield report_header(f"nmap -sV --script=vuln {network}", start)
+    for index in range(hosts):
+        yield host_xml(rng, next(addresses), f"host{index}.example", start, cve_pool,
+                       ports_per_host, cves_per_port)
+    yield report_footer(hosts, hosts, start + 60, 60)
+
+
+def write_report(path, **kwargs):
+    """Write a synthetic Nmap XML report to path"""
+    with open(path, 'w') as f:
+        for chunk in iter_report_chunks(**kwargs):
+            f.write(chunk)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('output', help='report file to write')
+    parser.add_argument('--hosts', type=int, default=1000)
+    parser.add_argument('--ports', type=int, default=3, help='ports per host')
+    parser.add_argument('--cves', type=int, default=3, help='CVEs per port')
+    parser.add_argument('--distinct-cves', type=int, default=5000, help='size of the CVE pool')
+    parser.add_argument('--network', default='10.0.0.0/8')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    write_report(args.output, hosts=args.hosts, ports_per_host=args.ports, cves_per_port=args.cves,
+                 seed=args.seed, network=args.network, distinct_cves=args.distinct_cves)
+    print(f"Wrote {args.hosts} hosts to {args.output} ({os.path.getsize(args.output)} bytes)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,292 @@
+import array
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+
+from analytics import parse_score
+
+# File layout: MAGIC, a little header (JSON: metadata plus the typecode,
+# offset and length of every column), then the columns as raw arrays, each
+# aligned to 8 bytes so they can be used straight from a memory map.
+MAGIC = b'FLANCOL1'
+ALIGNMENT = 8
+
+# String id meaning "no value" (a port without a <service> element)
+NONE = 0xFFFFFFFF
+
+# Every column and its array typecode. Strings are interned: text columns
+# hold ids into one table of distinct strings. Findings are deduplicated as
+# well: each one is an id into the table of distinct (CVE, score) pairs.
+# *_offsets columns have one entry per parent row plus one, giving the
+# range of child rows it owns.
+COLUMNS = {
+    'string_offsets': 'I',
+    'string_data': 'B',
+    'host_status': 'I',
+    'host_address_offsets': 'I',
+    'host_hostname_offsets': 'I',
+    'host_port_offsets': 'I',
+    'address': 'I',
+    'address_type': 'I',
+    'hostname': 'I',
+    'hostname_type': 'I',
+    'port_protocol': 'I',
+    'port_number': 'I',
+    'port_state': 'I',
+    'service_name': 'I',
+    'service_product': 'I',
+    'service_version': 'I',
+    'service_extrainfo': 'I',
+    'port_vuln_offsets': 'I',
+    'vuln': 'I',
+    'cve_id': 'I',
+    'cve_score': 'd',
+    'cve_score_text': 'I',
+}
+
+OFFSET_COLUMNS = ('string_offsets', 'host_address_offsets', 'host_hostname_offsets',
+                  'host_port_offsets', 'port_vuln_offsets')
+
+
+class ColumnarWriter:
+    """
+    Builds a columnar report from parsed host dicts, one host at a time
+    """
+    def __init__(self):
+        self._ids = {}
+        self._strings = []
+        self._cves = {}
+        self.columns = {name: array.array(typecode) for name, typecode in COLUMNS.items()}
+        for name in OFFSET_COLUMNS:
+            self.columns[name].append(0)
+
+    def intern(self, value):
+        """Get the id of a string, adding it to the string table if it is new"""
+        string_id = self._ids.get(value)
+        if string_id is None:
+            string_id = self._ids[value] = len(self._strings)
+            self._strings.append(value)
+        return string_id
+
+    def intern_cve(self, vuln_id, score):
+        """Get the id of a (CVE, score) pair, adding it if it is new"""
+        cve = self._cves.get((vuln_id, score))
+        if cve is None:
+            c = self.columns
+            cve = self._cves[(vuln_id, score)] = len(c['cve_id'])
+            c['cve_id'].append(self.intern(vuln_id))
+            c['cve_score'].append(parse_score(score))
+            c['cve_score_text'].append(self.intern(score))
+        return cve
+
+    def add_host(self, host):
+        """Append one parsed host (as produced by ReportManager._parse_host)"""
+        c = self.columns
+        intern = self.intern
+
+        c['host_status'].append(intern(host['status']))
+        for address in host['addresses']:
+            c['address'].append(intern(address['addr']))
+            c['address_type'].append(intern(address['addrtype']))
+        c['host_address_offsets'].append(len(c['address']))
+
+        for hostname in host['hostnames']:
+            c['hostname'].append(intern(hostname['name']))
+            c['hostname_type'].append(intern(hostname['type']))
+        c['host_hostname_offsets'].append(len(c['hostname']))
+
+        for port in host['ports']:
+            c['port_protocol'].append(intern(port['protocol']))
+            c['port_number'].append(int(port['portid']) if port['portid'].isdigit() else NONE)
+            c['port_state'].append(intern(port['state']))
+
+            service = port['service']
+            for field in ('name', 'product', 'version', 'extrainfo'):
+                c[f'service_{field}'].append(intern(service[field]) if service else NONE)
+
+            for vuln in port['vulnerabilities']:
+                c['vuln'].append(self.intern_cve(vuln['id'], vuln['score']))
+            c['port_vuln_offsets'].append(len(c['vuln']))
+        c['host_port_offsets'].append(len(c['port_protocol']))
+
+    def write(self, path, meta):
+        """
+        Write the report to path (atomically, through a temporary file).
+        meta is stored as-is in the header and comes back as ColumnarReport.meta.
+        """
+        string_data = self.columns['string_data']
+        string_offsets = self.columns['string_offsets']
+        del string_data[:]
+        del string_offsets[1:]
+        for value in self._strings:
+            string_data.frombytes(value.encode('utf-8'))
+            string_offsets.append(len(string_data))
+
+        # Lay out the columns first, then write the header that points at them
+        layout = {}
+        position = 0
+        for name, column in self.columns.items():
+            layout[name] = [column.typecode, position, len(column)]
+            position += _aligned(len(column) * column.itemsize)
+
+        header = json.dumps({
+            'byteorder': sys.byteorder,
+            'meta': meta,
+            'hosts': len(self.columns['host_status']),
+            'columns': layout
+        }, separators=(',', ':')).encode('utf-8')
+        data_start = _aligned(len(MAGIC) + 4 + len(header))
+
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(MAGIC)
+                f.write(struct.pack('<I', len(header)))
+                f.write(header)
+                f.write(b'\0' * (data_start - f.tell()))
+                for name, column in self.columns.items():
+                    f.write(column.tobytes())
+                    f.write(b'\0' * (_aligned(len(column) * column.itemsize)
+                                     - len(column) * column.itemsize))
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return path
+
+
+def _aligned(size):
+    """Round a byte count up to the column alignment"""
+    return -(-size // ALIGNMENT) * ALIGNMENT
+
+
+class ColumnarReport:
+    """
+    Read-only view of a columnar report file.
+
+    The file is memory mapped and every column is a typed memoryview into
+    the map, so opening a report costs the header and nothing else: pages
+    are read (and shared between processes) only as columns are touched.
+    Strings are decoded on first use.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            self._mmap.close()
+            raise ValueError(f"Not a columnar report: {path}")
+        header_length = struct.unpack_from('<I', self._mmap, len(MAGIC))[0]
+        header_start = len(MAGIC) + 4
+        header = json.loads(self._mmap[header_start:header_start + header_length])
+        data_start = _aligned(header_start + header_length)
+
+        self.meta = header['meta']
+        self.host_count = header['hosts']
+        self._view = memoryview(self._mmap)
+        self.columns = {}
+        for name, (typecode, offset, length) in header['columns'].items():
+            start = data_start + offset
+            raw = self._view[start:start + length * array.array(typecode).itemsize]
+            if header['byteorder'] == sys.byteorder:
+                self.columns[name] = raw.cast(typecode)
+            else:
+                # Written on a machine of the other byte order: swap a copy
+                column = array.array(typecode, raw.tobytes())
+                column.byteswap()
+                self.columns[name] = column
+            setattr(self, name, self.columns[name])
+
+        self._strings = [None] * (len(self.string_offsets) - 1)
+
+    def close(self):
+        """Release the memory map"""
+        for column in self.columns.values():
+            if isinstance(column, memoryview):
+                column.release()
+        self.columns = {}
+        self._view.release()
+        self._mmap.close()
+
+    def __len__(self):
+        return self.host_count
+
+    def string(self, string_id):
+        """Get an interned string by id ('' for NONE)"""
+        if string_id == NONE:
+            return ''
+        value = self._strings[string_id]
+        if value is None:
+            start, end = self.string_offsets[string_id], self.string_offsets[string_id + 1]
+            value = self._strings[string_id] = str(self.string_data[start:end], 'utf-8')
+        return value
+
+    def host(self, index):
+        """Rebuild one host as the dict ReportManager._parse_host produces"""
+        string = self.string
+        a0, a1 = self.host_address_offsets[index], self.host_address_offsets[index + 1]
+        n0, n1 = self.host_hostname_offsets[index], self.host_hostname_offsets[index + 1]
+        p0, p1 = self.host_port_offsets[index], self.host_port_offsets[index + 1]
+
+        ports = []
+        for p in range(p0, p1):
+            number = self.port_number[p]
+            if self.service_name[p] == NONE:
+                service = {}
+            else:
+                service = {
+                    'name': string(self.service_name[p]),
+                    'product': string(self.service_product[p]),
+                    'version': string(self.service_version[p]),
+                    'extrainfo': string(self.service_extrainfo[p])
+                }
+            ports.append({
+                'protocol': string(self.port_protocol[p]),
+                'portid': str(number) if number != NONE else '',
+                'state': string(self.port_state[p]),
+                'service': service,
+                'vulnerabilities': [
+                    {'id': string(self.cve_id[cve]), 'score': string(self.cve_score_text[cve])}
+                    for cve in self.vuln[self.port_vuln_offsets[p]:self.port_vuln_offsets[p + 1]]
+                ]
+            })
+
+        return {
+            'status': string(self.host_status[index]),
+            'addresses': [{'addr': string(self.address[a]), 'addrtype': string(self.address_type[a])}
+                          for a in range(a0, a1)],
+            'hostnames': [{'name': string(self.hostname[n]), 'type': string(self.hostname_type[n])}
+                          for n in range(n0, n1)],
+            'ports': ports
+        }
+
+    def iter_hosts(self):
+        """Iterate over all hosts as dicts"""
+        for index in range(self.host_count):
+            yield self.host(index)
+
+    def to_report(self):
+        """Rebuild the full parsed report dict"""
+        report_data = {
+            'scanner': self.meta.get('scanner', 'Unknown'),
+            'version': self.meta.get('version', 'Unknown'),
+            'scan_time': self.meta.get('scan_time', 'Unknown'),
+            'hosts': []
+        }
+        # Only reports nmap finished carry an exit status
+        if 'exit' in self.meta:
+            report_data['exit'] = self.meta['exit']
+        report_data['hosts'].extend(self.iter_hosts())
+        return report_data
+
+
+def convert_hosts(hosts, output_path, meta):
+    """Write parsed hosts (any iterable, consumed once) as a columnar report"""
+    writer = ColumnarWriter()
+    for host in hosts:
+        writer.add_host(host)
+    return writer.write(output_path, meta)
@@ -1,15 +1,30 @@
 import os
+import base64
 import json
 import logging
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
 import shutil
+from metrics import STORE_SECONDS, timed
+
+# Scan priorities; queued scans with a lower value are started first
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+PRIORITIES = {'high': PRIORITY_HIGH, 'normal': PRIORITY_NORMAL, 'low': PRIORITY_LOW}
 
 class Scan:
     """
     Scan class to replace the database model
     """
     def __init__(self, id=None, name=None, target=None, status='queued', 
-                 start_time=None, end_time=None, report_path=None):
+                 start_time=None, end_time=None, report_path=None,
+                 priority=PRIORITY_NORMAL, submitter=None, progress=None,
+                 progress_task=None, hosts_done=0, incremental=False,
+                 profile='vuln', scan_options=None):
         self.id = id
         self.name = name
         self.target = target
@@ -17,6 +32,15 @@ class Scan:
         self.start_time = start_time or datetime.now()
         self.end_time = end_time
         self.report_path = report_path
+        self.priority = priority  # lower runs first, see PRIORITIES
+        self.submitter = submitter
+        self.progress = progress  # percent of the current nmap task, while running
+        self.progress_task = progress_task
+        self.hosts_done = hosts_done
+        self.incremental = incremental  # only re-probe hosts changed since the last scan
+        self.profile = profile  # see scan_profiles.PROFILES
+        self.scan_options = scan_options  # nmap options the profile ran with
+        self.claimed_at = None  # when a scan runner claimed it, set by claim_next_scan
     
     def to_dict(self):
         """Convert object to dictionary for JSON serialization"""
@@ -27,7 +51,15 @@ class Scan:
             'status': self.status,
             'start_time': self.start_time.isoformat() if self.start_time else None,
             'end_time': self.end_time.isoformat() if self.end_time else None,
-            'report_path': self.report_path
+            'report_path': self.report_path,
+            'priority': self.priority,
+            'submitter': self.submitter,
+            'progress': self.progress,
+            'progress_task': self.progress_task,
+            'hosts_done': self.hosts_done,
+            'incremental': self.incremental,
+            'profile': self.profile,
+            'scan_options': self.scan_options
         }
     
     @classmethod
@@ -38,9 +70,22 @@ class Scan:
             name=data.get('name'),
             target=data.get('target'),
             status=data.get('status', 'queued'),
-            report_path=data.get('report_path')
+            report_path=data.get('report_path'),
+            priority=data.get('priority', PRIORITY_NORMAL),
+            submitter=data.get('submitter'),
+            progress=data.get('progress'),
+            progress_task=data.get('progress_task'),
+            hosts_done=data.get('hosts_done') or 0,
+            incremental=bool(data.get('incremental')),
+            profile=data.get('profile') or 'vuln'
         )
         
+        # Options are stored as JSON text in the database
+        scan_options = data.get('scan_options')
+        if isinstance(scan_options, str):
+            scan_options = json.loads(scan_options)
+        scan.scan_options = scan_options
+        
         # Convert string timestamps to datetime objects
         if data.get('start_time'):
             scan.start_time = datetime.fromisoformat(data.get('start_time'))
@@ -63,124 +108,1025 @@ class Scan:
         return self.status in ['queued', 'running']
 
 
+# Columns of the scan table, in the order used by SELECT and INSERT statements
+SCAN_COLUMNS = ('id', 'name', 'target', 'status', 'start_time', 'end_time', 'report_path',
+                'priority', 'submitter', 'progress', 'progress_task', 'hosts_done', 'incremental',
+                'profile', 'scan_options')
+
+# Schema migrations, applied in order and tracked with PRAGMA user_version.
+# The first step adopts the table left behind by the old SQLAlchemy model.
+SCHEMA_MIGRATIONS = [
+    [
+        """CREATE TABLE IF NOT EXISTS scan (
+            id INTEGER NOT NULL,
+            name VARCHAR(128) NOT NULL,
+            target VARCHAR(256) NOT NULL,
+            status VARCHAR(32),
+            start_time DATETIME,
+            end_time DATETIME,
+            report_path VARCHAR(512),
+            PRIMARY KEY (id)
+        )""",
+        "CREATE INDEX IF NOT EXISTS ix_scan_status ON scan (status)",
+        "CREATE INDEX IF NOT EXISTS ix_scan_start_time ON scan (start_time)",
+        "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)",
+        # SQLAlchemy wrote timestamps with a space separator; keep them sortable as ISO text
+        "UPDATE scan SET start_time = replace(start_time, ' ', 'T') WHERE start_time LIKE '% %'",
+        "UPDATE scan SET end_time = replace(end_time, ' ', 'T') WHERE end_time LIKE '% %'",
+    ],
+    [
+        # Change counter bumped by every write to the scan table, from any process.
+        # Readers compare it against their cached view instead of reloading rows.
+        "INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0)",
+        """CREATE TRIGGER IF NOT EXISTS scan_version_insert AFTER INSERT ON scan BEGIN
+            UPDATE meta SET value = value + 1 WHERE key = 'version';
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS scan_version_update AFTER UPDATE ON scan BEGIN
+            UPDATE meta SET value = value + 1 WHERE key = 'version';
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS scan_version_delete AFTER DELETE ON scan BEGIN
+            UPDATE meta SET value = value + 1 WHERE key = 'version';
+        END""",
+    ],
+    [
+        "ALTER TABLE scan ADD COLUMN priority INTEGER NOT NULL DEFAULT 1",
+        "ALTER TABLE scan ADD COLUMN submitter VARCHAR(128)",
+        # Queue order: priority first, then submission order
+        "CREATE INDEX IF NOT EXISTS ix_scan_queue ON scan (status, priority, id)",
+    ],
+    [
+        # Large targets run as several nmap shards; one row per shard
+        """CREATE TABLE IF NOT EXISTS scan_shard (
+            scan_id INTEGER NOT NULL,
+            shard_index INTEGER NOT NULL,
+            target TEXT NOT NULL,
+            status VARCHAR(32) NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            PRIMARY KEY (scan_id, shard_index)
+        )""",
+    ],
+    [
+        # Live progress while nmap runs
+        "ALTER TABLE scan ADD COLUMN progress REAL",
+        "ALTER TABLE scan ADD COLUMN progress_task VARCHAR(64)",
+        "ALTER TABLE scan ADD COLUMN hosts_done INTEGER NOT NULL DEFAULT 0",
+    ],
+    [
+        # Shard progress counts as a change too, so status streams pick it up
+        """CREATE TRIGGER IF NOT EXISTS scan_shard_version_insert AFTER INSERT ON scan_shard BEGIN
+            UPDATE meta SET value = value + 1 WHERE key = 'version';
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS scan_shard_version_update AFTER UPDATE ON scan_shard BEGIN
+            UPDATE meta SET value = value + 1 WHERE key = 'version';
+        END""",
+    ],
+    [
+        # Reports listing: filter by status and keyset-paginate by any sort column.
+        # SQLite appends the rowid (id) to every index, which breaks ties.
+        "CREATE INDEX IF NOT EXISTS ix_scan_status_start_time ON scan (status, start_time)",
+        "CREATE INDEX IF NOT EXISTS ix_scan_name ON scan (name)",
+        "CREATE INDEX IF NOT EXISTS ix_scan_target ON scan (target)",
+    ],
+    [
+        # Findings index: one row per port, or per vulnerability on a port, of
+        # every completed scan, so fleet-wide queries never touch report XML.
+        # Text columns compare case-insensitively so prefix searches use the indexes.
+        """CREATE TABLE IF NOT EXISTS finding (
+            id INTEGER NOT NULL,
+            scan_id INTEGER NOT NULL,
+            host VARCHAR(64) NOT NULL COLLATE NOCASE,
+            hostname VARCHAR(256) COLLATE NOCASE,
+            port INTEGER,
+            protocol VARCHAR(8),
+            state VARCHAR(16),
+            service VARCHAR(64) COLLATE NOCASE,
+            product VARCHAR(128) COLLATE NOCASE,
+            version VARCHAR(64) COLLATE NOCASE,
+            cve VARCHAR(64) COLLATE NOCASE,
+            score REAL,
+            PRIMARY KEY (id)
+        )""",
+        "CREATE INDEX IF NOT EXISTS ix_finding_cve ON finding (cve)",
+        "CREATE INDEX IF NOT EXISTS ix_finding_host ON finding (host)",
+        "CREATE INDEX IF NOT EXISTS ix_finding_service ON finding (service)",
+        "CREATE INDEX IF NOT EXISTS ix_finding_product ON finding (product, version)",
+        "CREATE INDEX IF NOT EXISTS ix_finding_scan ON finding (scan_id)",
+        # Scans whose report has been indexed, so backfills can resume
+        """CREATE TABLE IF NOT EXISTS finding_scan (
+            scan_id INTEGER NOT NULL,
+            indexed_at DATETIME NOT NULL,
+            PRIMARY KEY (scan_id)
+        )""",
+    ],
+    [
+        "ALTER TABLE scan ADD COLUMN incremental BOOLEAN NOT NULL DEFAULT 0",
+    ],
+    [
+        # Scan profile and the nmap options it resolved to; older scans ran the full vuln scan
+        "ALTER TABLE scan ADD COLUMN profile VARCHAR(32) NOT NULL DEFAULT 'vuln'",
+        "ALTER TABLE scan ADD COLUMN scan_options TEXT",
+    ],
+    [
+        # Durable job queue: queued scans are claimed by scan runners, which
+        # hold a lease on each running scan and renew it with heartbeats.
+        # Leases and processes have no version triggers, so heartbeats do not
+        # count as changes for status pollers.
+        "ALTER TABLE scan ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE scan ADD COLUMN claimed_at DATETIME",
+        "CREATE INDEX IF NOT EXISTS ix_scan_submitter_claimed ON scan (submitter, claimed_at)",
+        """CREATE TABLE IF NOT EXISTS scan_lease (
+            scan_id INTEGER NOT NULL,
+            owner VARCHAR(128) NOT NULL,
+            expires_at REAL NOT NULL,
+            heartbeat_at REAL NOT NULL,
+            PRIMARY KEY (scan_id)
+        )""",
+        # nmap processes of running scans, so a new runner can stop orphans
+        """CREATE TABLE IF NOT EXISTS scan_process (
+            scan_id INTEGER NOT NULL,
+            pid INTEGER NOT NULL,
+            owner VARCHAR(128) NOT NULL,
+            PRIMARY KEY (scan_id, pid)
+        )""",
+    ],
+    [
+        # Live progress moves its own counter, not the store version, so
+        # progress writes during scans do not invalidate the cached ScanView.
+        # Status pollers and event streams watch both (see get_status_version).
+        "INSERT OR IGNORE INTO meta (key, value) VALUES ('progress_version', 0)",
+        "DROP TRIGGER IF EXISTS scan_version_update",
+        """CREATE TRIGGER IF NOT EXISTS scan_version_update AFTER UPDATE OF
+            name, target, status, start_time, end_time, report_path, priority, submitter,
+            incremental, profile, scan_options, attempts, claimed_at ON scan BEGIN
+            UPDATE meta SET value = value + 1 WHERE key = 'version';
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS scan_progress_version_update AFTER UPDATE OF
+            progress, progress_task, hosts_done ON scan BEGIN
+            UPDATE meta SET value = value + 1 WHERE key = 'progress_version';
+        END""",
+    ],
+    [
+        # Shard rows are per-scan progress too, not part of the listing
+        "DROP TRIGGER IF EXISTS scan_shard_version_insert",
+        "DROP TRIGGER IF EXISTS scan_shard_version_update",
+        """CREATE TRIGGER IF NOT EXISTS scan_shard_progress_insert AFTER INSERT ON scan_shard BEGIN
+            UPDATE meta SET value = value + 1 WHERE key = 'progress_version';
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS scan_shard_progress_update AFTER UPDATE ON scan_shard BEGIN
+            UPDATE meta SET value = value + 1 WHERE key = 'progress_version';
+        END""",
+    ],
+]
+
+# Columns of the finding table, in the order used by SELECT and INSERT statements
+FINDING_COLUMNS = ('scan_id', 'host', 'hostname', 'port', 'protocol', 'state',
+                   'service', 'product', 'version', 'cve', 'score')
+
+# Queued scans a runner looks at when choosing the next one to claim
+CLAIM_WINDOW = 200
+
+# Columns the reports listing can be sorted by
+SCAN_SORT_COLUMNS = ('start_time', 'name', 'target')
+
+
+class ScanView:
+    """
+    Immutable snapshot of the scan table at one store version, with the
+    orderings the pages need already computed
+    """
+    def __init__(self, version, scans):
+        self.version = version
+        self.by_id = {scan.id: scan for scan in scans}
+        # Newest first; id breaks ties between scans started in the same instant
+        self.by_start_time = sorted(
+            scans, key=lambda x: (x.start_time or datetime.min, x.id), reverse=True)
+        self.by_status = {}
+        for scan in self.by_start_time:
+            self.by_status.setdefault(scan.status, []).append(scan)
+
+
 class DataManager:
     """
-    Class to manage data storage in JSON files
+    Class to manage scan records in the SQLite store at instance/flanscan.db
     """
-    def __init__(self):
+    def __init__(self, db_path=None):
         self.data_dir = os.path.join(os.getcwd(), 'data')
         self.scans_file = os.path.join(self.data_dir, 'scans.json')
         self.reports_dir = os.path.join(os.getcwd(), 'reports')
-        
+        self.instance_dir = os.path.join(os.getcwd(), 'instance')
+        self.db_path = db_path or os.environ.get(
+            'FLANSCAN_DB', os.path.join(self.instance_dir, 'flanscan.db'))
+
+        # One connection per thread (and per process, so forked workers reconnect)
+        self._local = threading.local()
+
+        # Cached ScanView, replaced whenever the store version moves
+        self._view = None
+        self._view_lock = threading.Lock()
+
+        # Signalled after every write from this process (see wait_for_change)
+        self._changed = threading.Condition()
+
         # Create data directory if it doesn't exist
         if not os.path.exists(self.data_dir):
             os.makedirs(self.data_dir)
-            
+
         # Create reports directory if it doesn't exist
         if not os.path.exists(self.reports_dir):
             os.makedirs(self.reports_dir)
-            
-        # Create scans file if it doesn't exist
+
+        # Create the database directory if it doesn't exist
+        db_dir = os.path.dirname(os.path.abspath(self.db_path))
+        if not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+
+        self._init_db()
+
+    def _connect(self):
+        """Get the SQLite connection for the current thread"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            # isolation_level=None: transactions are managed explicitly in _transaction()
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None,
+                                   check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """
+        Run a write transaction. BEGIN IMMEDIATE takes the write lock up front,
+        so concurrent writers in other threads or processes queue up instead of
+        overwriting each other.
+        """
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        else:
+            conn.execute("COMMIT")
+            with self._changed:
+                self._changed.notify_all()
+
+    def _init_db(self):
+        """Create or upgrade the schema and import the legacy JSON file once"""
+        with self._transaction() as conn:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            for step, statements in enumerate(SCHEMA_MIGRATIONS[version:], start=version + 1):
+                for statement in statements:
+                    conn.execute(statement)
+                conn.execute(f"PRAGMA user_version = {step}")
+
+            migrated = conn.execute(
+                "SELECT value FROM meta WHERE key = 'json_migrated'").fetchone()
+            if migrated is None:
+                self._migrate_json(conn)
+                conn.execute("INSERT INTO meta (key, value) VALUES ('json_migrated', ?)",
+                             (datetime.now().isoformat(),))
+
+    def _migrate_json(self, conn):
+        """Copy scans from the legacy data/scans.json file into the store"""
         if not os.path.exists(self.scans_file):
-            with open(self.scans_file, 'w') as f:
-                json.dump([], f)
-    
-    def get_all_scans(self):
-        """Get all scans"""
+            return
+
         try:
             with open(self.scans_file, 'r') as f:
                 data = json.load(f)
-                return [Scan.from_dict(scan_data) for scan_data in data]
         except Exception as e:
-            logging.error(f"Error reading scans file: {str(e)}")
+            logging.error(f"Error reading legacy scans file: {str(e)}")
+            return
+
+        scans = [Scan.from_dict(scan_data) for scan_data in data]
+        # The JSON file was the live store, so its records win over stale rows
+        conn.executemany(
+            f"INSERT OR REPLACE INTO scan ({', '.join(SCAN_COLUMNS)}) "
+            f"VALUES ({', '.join('?' for _ in SCAN_COLUMNS)})",
+            [self._scan_to_row(scan) for scan in scans if scan.id is not None])
+        logging.info(f"Migrated {len(scans)} scans from {self.scans_file}")
+
+    @staticmethod
+    def _scan_to_row(scan):
+        """Convert a Scan into a tuple of column values"""
+        data = scan.to_dict()
+        data['name'] = data['name'] or ''
+        data['target'] = data['target'] or ''
+        if data['scan_options'] is not None:
+            data['scan_options'] = json.dumps(data['scan_options'], sort_keys=True)
+        return tuple(data[column] for column in SCAN_COLUMNS)
+
+    @staticmethod
+    def _row_to_scan(row):
+        """Convert a database row into a Scan"""
+        return Scan.from_dict(dict(row))
+
+    def _query_scans(self, where='', params=()):
+        """Run a SELECT over the scan table and build Scan objects"""
+        try:
+            rows = self._connect().execute(
+                f"SELECT {', '.join(SCAN_COLUMNS)} FROM scan {where}", params).fetchall()
+            return [self._row_to_scan(row) for row in rows]
+        except Exception as e:
+            logging.error(f"Error reading scans: {str(e)}")
             return []
-    
+
+    def get_version(self):
+        """
+        Get the store change counter; it moves on every write to a scan from
+        any process, except live progress (see get_status_version)
+        """
+        row = self._connect().execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        return int(row[0]) if row else 0
+
+    def get_status_version(self):
+        """
+        Get the counter status pollers watch: it moves with the store version
+        and with every live progress write. Both parts only grow, so their sum
+        changes whenever either does.
+        """
+        row = self._connect().execute(
+            "SELECT SUM(value) FROM meta WHERE key IN ('version', 'progress_version')").fetchone()
+        return int(row[0]) if row and row[0] is not None else 0
+
+    def wait_for_change(self, version, timeout):
+        """
+        Wait until the status version differs from the given one, or timeout
+        seconds pass, and return the current status version. Writes from this
+        process wake waiters immediately; writes from other processes are
+        noticed by re-checking the version every second.
+        """
+        deadline = time.monotonic() + timeout
+        current = self.get_status_version()
+        while current == version:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            with self._changed:
+                self._changed.wait(min(1.0, remaining))
+            current = self.get_status_version()
+        return current
+
+    def _current_view(self):
+        """
+        Get the cached ScanView, reloading it only if another thread or worker
+        process has written to the store since it was built. Scans in the view
+        are shared between callers and must be treated as read-only.
+        """
+        try:
+            version = self.get_version()
+        except Exception as e:
+            logging.error(f"Error reading store version: {str(e)}")
+            return ScanView(0, [])
+
+        view = self._view
+        if view is not None and view.version == version:
+            return view
+
+        with self._view_lock:
+            view = self._view
+            if view is None or view.version != version:
+                # Rows and version are read in one transaction so they agree
+                with STORE_SECONDS.time(operation='reload_view'):
+                    conn = self._connect()
+                    conn.execute("BEGIN")
+                    try:
+                        version = self.get_version()
+                        scans = self._query_scans()
+                    finally:
+                        conn.execute("COMMIT")
+                    view = ScanView(version, scans)
+                self._view = view
+            return view
+
+    def get_all_scans(self):
+        """Get all scans"""
+        return sorted(self._current_view().by_id.values(), key=lambda x: x.id)
+
+    def get_scans_by_start_time(self):
+        """Get all scans, newest first"""
+        return list(self._current_view().by_start_time)
+
+    @timed(STORE_SECONDS)
+    def get_scans_page(self, statuses=None, target=None, since=None, until=None,
+                       sort='start_time', descending=True, limit=50, cursor=None):
+        """
+        Get one page of scans using keyset pagination.
+
+        Filters and sort order run in SQL against the scan indexes, and the
+        page starts right after the (sort value, id) encoded in the cursor, so
+        a page costs the same however many scans came before it. Returns the
+        scans and the cursor of the next page (None on the last page).
+        """
+        if sort not in SCAN_SORT_COLUMNS:
+            raise ValueError(f"Unknown sort column: {sort}")
+
+        clauses, params = [], []
+        if statuses:
+            clauses.append(f"status IN ({', '.join('?' for _ in statuses)})")
+            params.extend(statuses)
+        if target:
+            clauses.append("instr(lower(target), ?) > 0")
+            params.append(target.lower())
+        if since:
+            clauses.append("start_time >= ?")
+            params.append(since.isoformat())
+        if until:
+            clauses.append("start_time < ?")
+            params.append(until.isoformat())
+        if cursor:
+            value, last_id = self._decode_cursor(cursor)
+            clauses.append(f"({sort}, id) {'<' if descending else '>'} (?, ?)")
+            params.extend([value, last_id])
+
+        direction = 'DESC' if descending else 'ASC'
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        # Fetch one extra row to know whether there is a next page
+        where += f" ORDER BY {sort} {direction}, id {direction} LIMIT {int(limit) + 1}"
+
+        scans = self._query_scans(where, params)
+        next_cursor = None
+        if len(scans) > limit:
+            scans = scans[:limit]
+            last = scans[-1]
+            value = getattr(last, sort)
+            if isinstance(value, datetime):
+                value = value.isoformat()
+            next_cursor = self._encode_cursor(value, last.id)
+        return scans, next_cursor
+
+    @staticmethod
+    def _encode_cursor(value, scan_id):
+        """Encode a page position as an opaque URL-safe token"""
+        raw = json.dumps([value, scan_id], separators=(',', ':')).encode('utf-8')
+        return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+    @staticmethod
+    def _decode_cursor(cursor):
+        """Decode a token from _encode_cursor; raises ValueError if it is malformed"""
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            value, scan_id = json.loads(raw)
+            return value, int(scan_id)
+        except Exception:
+            raise ValueError(f"Invalid cursor: {cursor}")
+
+    @timed(STORE_SECONDS)
+    def get_previous_completed_scan(self, scan, same_profile=False):
+        """
+        Get the completed scan of the same target (and optionally the same
+        profile) that ran just before this one
+        """
+        where = "WHERE target = ? AND status = 'completed' AND (start_time, id) < (?, ?)"
+        params = [scan.target, scan.start_time.isoformat(), scan.id]
+        if same_profile:
+            where += " AND profile = ?"
+            params.append(scan.profile)
+        scans = self._query_scans(where + " ORDER BY start_time DESC, id DESC LIMIT 1", params)
+        return scans[0] if scans else None
+
+    @timed(STORE_SECONDS)
+    def get_completed_scans_of_target(self, target, since=None):
+        """Get the completed scans of a target, oldest first, optionally only those started since a time"""
+        where = "WHERE target = ? AND status = 'completed'"
+        params = [target]
+        if since is not None:
+            where += " AND start_time >= ?"
+            params.append(since.isoformat())
+        return self._query_scans(where + " ORDER BY start_time, id", params)
+
+    @timed(STORE_SECONDS)
     def get_scan(self, scan_id):
         """Get a specific scan by ID"""
-        scans = self.get_all_scans()
-        for scan in scans:
-            if scan.id == scan_id:
-                return scan
-        return None
-    
+        scans = self._query_scans("WHERE id = ?", (scan_id,))
+        return scans[0] if scans else None
+
+    @timed(STORE_SECONDS)
     def add_scan(self, scan):
         """Add a new scan"""
-        scans = self.get_all_scans()
-        
-        # Generate new ID if not provided
-        if scan.id is None:
-            scan.id = self._generate_id(scans)
-            
-        # Add scan to list
-        scans.append(scan)
-        
-        # Save scans list
-        self._save_scans(scans)
-        
+        with self._transaction() as conn:
+            if scan.id is None:
+                # Let SQLite assign the next rowid
+                row = list(self._scan_to_row(scan))
+                cursor = conn.execute(
+                    f"INSERT INTO scan ({', '.join(SCAN_COLUMNS[1:])}) "
+                    f"VALUES ({', '.join('?' for _ in SCAN_COLUMNS[1:])})", row[1:])
+                scan.id = cursor.lastrowid
+            else:
+                conn.execute(
+                    f"INSERT INTO scan ({', '.join(SCAN_COLUMNS)}) "
+                    f"VALUES ({', '.join('?' for _ in SCAN_COLUMNS)})", self._scan_to_row(scan))
+
         return scan.id
-    
+
+    @timed(STORE_SECONDS)
+    def add_scans(self, scans, report_path=None):
+        """
+        Add new scans in one transaction, so either all of them are stored or
+        none is. report_path, if given, is called with each scan once it has
+        its id and returns the scan's report path (or None). Returns the ids.
+        """
+        with self._transaction() as conn:
+            for scan in scans:
+                row = list(self._scan_to_row(scan))
+                cursor = conn.execute(
+                    f"INSERT INTO scan ({', '.join(SCAN_COLUMNS[1:])}) "
+                    f"VALUES ({', '.join('?' for _ in SCAN_COLUMNS[1:])})", row[1:])
+                scan.id = cursor.lastrowid
+                if report_path:
+                    scan.report_path = report_path(scan)
+                    conn.execute("UPDATE scan SET report_path = ? WHERE id = ?",
+                                 (scan.report_path, scan.id))
+
+        return [scan.id for scan in scans]
+
+    @timed(STORE_SECONDS)
     def update_scan(self, scan):
         """Update an existing scan"""
-        scans = self.get_all_scans()
-        
-        # Find and update the scan
-        for i, existing_scan in enumerate(scans):
-            if existing_scan.id == scan.id:
-                scans[i] = scan
-                break
-        
-        # Save updated scans list
-        self._save_scans(scans)
-        
+        row = self._scan_to_row(scan)
+        with self._transaction() as conn:
+            conn.execute(
+                f"UPDATE scan SET {', '.join(f'{column} = ?' for column in SCAN_COLUMNS[1:])} "
+                "WHERE id = ?", row[1:] + (scan.id,))
+
         return scan.id
-    
+
+    @timed(STORE_SECONDS)
+    def update_scan_fields(self, scan_id, only_if_status=None, **fields):
+        """
+        Update selected columns of a scan. When only_if_status is given the row is
+        only changed if its current status is one of those values, which lets a
+        state transition lose cleanly against a concurrent one (e.g. a cancel).
+        Returns True if the row was updated.
+        """
+        values = {}
+        for column, value in fields.items():
+            if column not in SCAN_COLUMNS[1:]:
+                raise ValueError(f"Unknown scan column: {column}")
+            values[column] = value.isoformat() if isinstance(value, datetime) else value
+
+        sql = f"UPDATE scan SET {', '.join(f'{column} = ?' for column in values)} WHERE id = ?"
+        params = list(values.values()) + [scan_id]
+        if only_if_status:
+            sql += f" AND status IN ({', '.join('?' for _ in only_if_status)})"
+            params.extend(only_if_status)
+
+        with self._transaction() as conn:
+            cursor = conn.execute(sql, params)
+
+        return cursor.rowcount > 0
+
+    @timed(STORE_SECONDS)
+    def get_status_snapshot(self, ids=None, statuses=None, since=None, until=None, limit=None):
+        """
+        Read the scans matching a filter together with their shard progress
+        and queue positions, all in one read transaction so they agree with
+        the returned status version. Rows are read directly rather than from
+        the cached ScanView, so live progress is current. Returns (version,
+        scans, shard_progress, queue_positions), the last two being dicts
+        keyed by scan id.
+        """
+        clauses, params = [], []
+        if ids is not None:
+            clauses.append(f"id IN ({', '.join('?' for _ in ids)})")
+            params.extend(ids)
+        if statuses:
+            clauses.append(f"status IN ({', '.join('?' for _ in statuses)})")
+            params.extend(statuses)
+        if since:
+            clauses.append("start_time >= ?")
+            params.append(since.isoformat())
+        if until:
+            clauses.append("start_time < ?")
+            params.append(until.isoformat())
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        where += " ORDER BY start_time DESC, id DESC"
+        if limit:
+            where += f" LIMIT {int(limit)}"
+
+        conn = self._connect()
+        conn.execute("BEGIN")
+        try:
+            version = self.get_status_version()
+            scans = self._query_scans(where, params)
+            scan_ids = [scan.id for scan in scans]
+
+            shard_progress = {}
+            if scan_ids:
+                rows = conn.execute(
+                    "SELECT scan_id, status, COUNT(*) FROM scan_shard "
+                    f"WHERE scan_id IN ({', '.join('?' for _ in scan_ids)}) "
+                    "GROUP BY scan_id, status", scan_ids).fetchall()
+                for scan_id, status, count in rows:
+                    progress = shard_progress.setdefault(
+                        scan_id, {'total': 0, 'queued': 0, 'running': 0, 'completed': 0, 'failed': 0})
+                    progress[status] = progress.get(status, 0) + count
+                    progress['total'] += count
+
+            queue_positions = {}
+            if any(scan.status == 'queued' for scan in scans):
+                rows = conn.execute(
+                    "SELECT id FROM scan WHERE status = 'queued' ORDER BY priority, id").fetchall()
+                queue_positions = {row[0]: position for position, row in enumerate(rows, start=1)}
+        finally:
+            conn.execute("COMMIT")
+
+        return version, scans, shard_progress, queue_positions
+
+    def get_pipeline_counts(self):
+        """
+        Get the numbers shown as gauges on /metrics: scans by status, nmap
+        processes running for scans and scan runners holding a live lease
+        """
+        conn = self._connect()
+        statuses = dict(conn.execute("SELECT status, COUNT(*) FROM scan GROUP BY status").fetchall())
+        processes = conn.execute("SELECT COUNT(*) FROM scan_process").fetchone()[0]
+        runners = conn.execute("SELECT COUNT(DISTINCT owner) FROM scan_lease WHERE expires_at >= ?",
+                               (time.time(),)).fetchone()[0]
+        return {'scans': statuses, 'nmap_processes': processes, 'runners': runners}
+
+    @timed(STORE_SECONDS)
+    def get_queue_position(self, scan_id):
+        """
+        Get the 1-based position of a queued scan, counting the queued scans
+        that are ahead of it by priority and submission order
+        """
+        scan = self.get_scan(scan_id)
+        if not scan or scan.status != 'queued':
+            return None
+
+        row = self._connect().execute(
+            """SELECT COUNT(*) FROM scan
+               WHERE status = 'queued'
+                 AND (priority < ? OR (priority = ? AND id < ?))""",
+            (scan.priority, scan.priority, scan.id)).fetchone()
+        return row[0] + 1
+
+    @timed(STORE_SECONDS)
+    def claim_next_scan(self, owner, lease_seconds, choose):
+        """
+        Claim a queued scan for a scan runner. choose(queued, running,
+        last_served) picks the scan from the queued scans (best priority
+        first, then oldest), the running scans and the time each submitter
+        last had a scan claimed, or returns None. All of it runs in one write
+        transaction, so concurrent runners never claim the same scan. Returns
+        the claimed Scan, now running, leased to owner and with its claim
+        time set, or None.
+        """
+        now = time.time()
+        claimed_at = datetime.now()
+        with self._transaction() as conn:
+            queued = self._query_scans(
+                "WHERE status = 'queued' ORDER BY priority, id LIMIT ?", (CLAIM_WINDOW,))
+            if not queued:
+                return None
+            running = self._query_scans("WHERE status = 'running'")
+            last_served = dict(conn.execute(
+                "SELECT submitter, MAX(claimed_at) FROM scan "
+                "WHERE claimed_at IS NOT NULL GROUP BY submitter").fetchall())
+
+            scan = choose(queued, running, last_served)
+            if scan is None:
+                return None
+
+            conn.execute(
+                "UPDATE scan SET status = 'running', claimed_at = ?, attempts = attempts + 1 "
+                "WHERE id = ?", (claimed_at.isoformat(), scan.id))
+            conn.execute("INSERT OR REPLACE INTO scan_lease (scan_id, owner, expires_at, heartbeat_at) "
+                         "VALUES (?, ?, ?, ?)", (scan.id, owner, now + lease_seconds, now))
+
+        scan.status = 'running'
+        scan.claimed_at = claimed_at
+        return scan
+
+    @timed(STORE_SECONDS)
+    def renew_leases(self, owner, scan_ids, lease_seconds):
+        """
+        Extend the leases owner holds on running scans. Returns the ids whose
+        lease is still held; a scan that was cancelled, or whose lease was
+        taken over after expiring, drops out.
+        """
+        now = time.time()
+        held = set()
+        if not scan_ids:
+            return held
+        with self._transaction() as conn:
+            for scan_id in scan_ids:
+                cursor = conn.execute(
+                    "UPDATE scan_lease SET expires_at = ?, heartbeat_at = ? "
+                    "WHERE scan_id = ? AND owner = ? "
+                    "AND EXISTS (SELECT 1 FROM scan WHERE id = ? AND status = 'running')",
+                    (now + lease_seconds, now, scan_id, owner, scan_id))
+                if cursor.rowcount:
+                    held.add(scan_id)
+        return held
+
+    @timed(STORE_SECONDS)
+    def release_scan(self, scan_id, owner, requeue=False):
+        """
+        Drop owner's lease on a scan once its runner is done with it. With
+        requeue, a scan that is still running goes back to the queue (used
+        when a runner shuts down).
+        """
+        with self._transaction() as conn:
+            cursor = conn.execute("DELETE FROM scan_lease WHERE scan_id = ? AND owner = ?",
+                                  (scan_id, owner))
+            conn.execute("DELETE FROM scan_process WHERE scan_id = ? AND owner = ?", (scan_id, owner))
+            if requeue and cursor.rowcount:
+                conn.execute(
+                    "UPDATE scan SET status = 'queued', progress = NULL, progress_task = NULL, "
+                    "hosts_done = 0, attempts = MAX(attempts - 1, 0) "
+                    "WHERE id = ? AND status = 'running'", (scan_id,))
+                conn.execute("DELETE FROM scan_shard WHERE scan_id = ?", (scan_id,))
+
+    @timed(STORE_SECONDS)
+    def add_scan_process(self, scan_id, pid, owner):
+        """Record an nmap process started for a scan"""
+        with self._transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO scan_process (scan_id, pid, owner) VALUES (?, ?, ?)",
+                         (scan_id, pid, owner))
+
+    @timed(STORE_SECONDS)
+    def remove_scan_process(self, scan_id, pid):
+        """Forget an nmap process once it has exited"""
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM scan_process WHERE scan_id = ? AND pid = ?", (scan_id, pid))
+
+    @timed(STORE_SECONDS)
+    def recover_stale_scans(self, max_attempts):
+        """
+        Recover running scans whose runner is gone: scans whose lease expired
+        go back to the queue until they have been tried max_attempts times,
+        then fail. Running scans without any lease predate the job queue and
+        fail. Returns one dict per recovered scan with its id, new status and
+        the (owner, pid) of nmap processes its runner left behind.
+        """
+        now = time.time()
+        recovered = []
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "SELECT s.id, s.attempts, l.owner FROM scan s "
+                "LEFT JOIN scan_lease l ON l.scan_id = s.id "
+                "WHERE s.status = 'running' AND (l.scan_id IS NULL OR l.expires_at < ?)",
+                (now,)).fetchall()
+            for scan_id, attempts, owner in rows:
+                processes = conn.execute("SELECT owner, pid FROM scan_process WHERE scan_id = ?",
+                                         (scan_id,)).fetchall()
+                if owner is not None and attempts < max_attempts:
+                    conn.execute(
+                        "UPDATE scan SET status = 'queued', progress = NULL, progress_task = NULL, "
+                        "hosts_done = 0 WHERE id = ?", (scan_id,))
+                    status = 'queued'
+                else:
+                    conn.execute("UPDATE scan SET status = 'failed', end_time = ? WHERE id = ?",
+                                 (datetime.now().isoformat(), scan_id))
+                    status = 'failed'
+                conn.execute("DELETE FROM scan_shard WHERE scan_id = ?", (scan_id,))
+                conn.execute("DELETE FROM scan_lease WHERE scan_id = ?", (scan_id,))
+                conn.execute("DELETE FROM scan_process WHERE scan_id = ?", (scan_id,))
+                recovered.append({'id': scan_id, 'status': status,
+                                  'processes': [tuple(process) for process in processes]})
+        return recovered
+
+    @timed(STORE_SECONDS)
+    def set_scan_shards(self, scan_id, targets):
+        """Record the shards a scan is split into, replacing any previous ones"""
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM scan_shard WHERE scan_id = ?", (scan_id,))
+            conn.executemany(
+                "INSERT INTO scan_shard (scan_id, shard_index, target) VALUES (?, ?, ?)",
+                [(scan_id, index, target) for index, target in enumerate(targets)])
+
+    @timed(STORE_SECONDS)
+    def update_shard(self, scan_id, shard_index, **fields):
+        """Update the status, attempts or error of one shard"""
+        for column in fields:
+            if column not in ('status', 'attempts', 'error'):
+                raise ValueError(f"Unknown shard column: {column}")
+        with self._transaction() as conn:
+            conn.execute(
+                f"UPDATE scan_shard SET {', '.join(f'{column} = ?' for column in fields)} "
+                "WHERE scan_id = ? AND shard_index = ?",
+                list(fields.values()) + [scan_id, shard_index])
+
+    @timed(STORE_SECONDS)
+    def get_shard_progress(self, scan_id):
+        """
+        Get shard counts for a scan by status, e.g. {'total': 4, 'completed': 1,
+        'running': 2, 'queued': 1, 'failed': 0}, or None if it is not sharded
+        """
+        rows = self._connect().execute(
+            "SELECT status, COUNT(*) FROM scan_shard WHERE scan_id = ? GROUP BY status",
+            (scan_id,)).fetchall()
+        if not rows:
+            return None
+        progress = {'total': 0, 'queued': 0, 'running': 0, 'completed': 0, 'failed': 0}
+        for status, count in rows:
+            progress[status] = progress.get(status, 0) + count
+            progress['total'] += count
+        return progress
+
+    @timed(STORE_SECONDS)
     def delete_scan(self, scan_id):
         """Delete a scan"""
-        scans = self.get_all_scans()
-        
-        # Filter out the scan to delete
-        updated_scans = [scan for scan in scans if scan.id != scan_id]
-        
-        # Save updated scans list
-        self._save_scans(updated_scans)
-        
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM scan_shard WHERE scan_id = ?", (scan_id,))
+            conn.execute("DELETE FROM finding WHERE scan_id = ?", (scan_id,))
+            conn.execute("DELETE FROM finding_scan WHERE scan_id = ?", (scan_id,))
+            conn.execute("DELETE FROM scan_lease WHERE scan_id = ?", (scan_id,))
+            conn.execute("DELETE FROM scan_process WHERE scan_id = ?", (scan_id,))
+            conn.execute("DELETE FROM scan WHERE id = ?", (scan_id,))
+
         return True
-    
-    def _save_scans(self, scans):
-        """Save scans list to file"""
-        try:
-            # Convert scan objects to dictionaries for JSON serialization
-            scan_dicts = [scan.to_dict() for scan in scans]
-            
-            with open(self.scans_file, 'w') as f:
-                json.dump(scan_dicts, f, indent=2)
-                
-            return True
-        except Exception as e:
-            logging.error(f"Error saving scans file: {str(e)}")
-            return False
-    
-    def _generate_id(self, scans):
-        """Generate a new unique ID for a scan"""
-        if not scans:
-            return 1
-            
-        # Get the maximum ID
-        max_id = max(scan.id for scan in scans if scan.id is not None)
-        
-        # Return next ID
-        return max_id + 1
-    
+
+    @timed(STORE_SECONDS)
+    def get_expired_scan_ids(self, keep_per_target=None, older_than=None):
+        """
+        Get the finished scans a retention policy removes: those beyond the
+        newest keep_per_target of their target and/or those started before
+        older_than. Completed scans are counted apart from failed and
+        cancelled ones, so failures never push a target's last reports out.
+        Queued and running scans are never returned.
+        """
+        clauses, params = [], []
+        if keep_per_target:
+            clauses.append("rank > ?")
+            params.append(int(keep_per_target))
+        if older_than is not None:
+            clauses.append("start_time < ?")
+            params.append(older_than.isoformat())
+        if not clauses:
+            return []
+
+        rows = self._connect().execute(
+            "SELECT id FROM (SELECT id, start_time, ROW_NUMBER() OVER ("
+            "PARTITION BY target, status = 'completed' ORDER BY start_time DESC, id DESC) AS rank "
+            "FROM scan WHERE status IN ('completed', 'failed', 'cancelled')) "
+            f"WHERE {' OR '.join(clauses)} ORDER BY id", params).fetchall()
+        return [row[0] for row in rows]
+
+    @timed(STORE_SECONDS)
+    def replace_findings(self, scan_id, rows):
+        """
+        Replace the indexed findings of a scan with the given rows (tuples in
+        FINDING_COLUMNS order, scan_id excluded) and mark the scan indexed
+        """
+        with self._transaction() as conn:
+            self._replace_findings(conn, scan_id, rows)
+
+    @staticmethod
+    def _replace_findings(conn, scan_id, rows):
+        """Replace the findings of a scan inside an open transaction"""
+        conn.execute("DELETE FROM finding WHERE scan_id = ?", (scan_id,))
+        conn.executemany(
+            f"INSERT INTO finding ({', '.join(FINDING_COLUMNS)}) "
+            f"VALUES ({', '.join('?' for _ in FINDING_COLUMNS)})",
+            ((scan_id,) + tuple(row) for row in rows))
+        conn.execute("INSERT OR REPLACE INTO finding_scan (scan_id, indexed_at) VALUES (?, ?)",
+                     (scan_id, datetime.now().isoformat()))
+
+    @timed(STORE_SECONDS)
+    def apply_reindex_batch(self, results):
+        """
+        Write a batch of rebuilt reports in one transaction. Each result is
+        (scan_id, findings rows, repair), where repair is None or
+        (expected status, {column: value}) to fix a scan record that went
+        stale. A repair only applies if the scan still has the expected
+        status and no scan runner holds a live lease on it; if it does not
+        apply, the scan's findings are left alone too. Returns the ids of
+        the scans indexed and of those repaired.
+        """
+        now = time.time()
+        indexed, repaired = [], []
+        with self._transaction() as conn:
+            for scan_id, rows, repair in results:
+                if repair is not None:
+                    status, fields = repair
+                    values = [value.isoformat() if isinstance(value, datetime) else value
+                              for value in fields.values()]
+                    cursor = conn.execute(
+                        f"UPDATE scan SET {', '.join(f'{column} = ?' for column in fields)} "
+                        "WHERE id = ? AND status = ? AND NOT EXISTS ("
+                        "SELECT 1 FROM scan_lease WHERE scan_id = ? AND expires_at >= ?)",
+                        values + [scan_id, status, scan_id, now])
+                    if not cursor.rowcount:
+                        continue
+                    conn.execute("DELETE FROM scan_shard WHERE scan_id = ?", (scan_id,))
+                    conn.execute("DELETE FROM scan_lease WHERE scan_id = ?", (scan_id,))
+                    conn.execute("DELETE FROM scan_process WHERE scan_id = ?", (scan_id,))
+                    repaired.append(scan_id)
+                elif not conn.execute("SELECT 1 FROM scan WHERE id = ?", (scan_id,)).fetchone():
+                    continue  # Deleted since the batch was planned
+                self._replace_findings(conn, scan_id, rows)
+                indexed.append(scan_id)
+        return indexed, repaired
+
+    def get_indexed_scan_ids(self, since):
+        """Get the scans whose findings were indexed at or after since"""
+        rows = self._connect().execute("SELECT scan_id FROM finding_scan WHERE indexed_at >= ?",
+                                       (since.isoformat(),)).fetchall()
+        return {row[0] for row in rows}
+
+    def get_leased_scan_ids(self):
+        """Get the scans a scan runner holds a live lease on"""
+        rows = self._connect().execute("SELECT scan_id FROM scan_lease WHERE expires_at >= ?",
+                                       (time.time(),)).fetchall()
+        return {row[0] for row in rows}
+
+    def get_meta(self, key):
+        """Get a value from the meta table, or None"""
+        row = self._connect().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        """Set a value in the meta table; None removes it"""
+        with self._transaction() as conn:
+            if value is None:
+                conn.execute("DELETE FROM meta WHERE key = ?", (key,))
+            else:
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def get_unindexed_scan_ids(self):
+        """Get the completed scans with a report that are not in the findings index yet"""
+        rows = self._connect().execute(
+            "SELECT id FROM scan WHERE status = 'completed' AND report_path IS NOT NULL "
+            "AND id NOT IN (SELECT scan_id FROM finding_scan) ORDER BY id").fetchall()
+        return [row[0] for row in rows]
+
+    @timed(STORE_SECONDS)
+    def query_findings(self, cve=None, host=None, service=None, product=None, version=None,
+                       min_score=None, scan_id=None, latest_only=False, only_open=False,
+                       limit=100, after=None):
+        """
+        Search the findings index.
+
+        cve and service match exactly, host, product and version match as
+        case-insensitive prefixes; all of them use an index. latest_only
+        keeps the most recent completed scan of each target. Results are
+        ordered by row id and paged with after (the last id seen). Returns
+        the findings as dicts and the id to pass as after for the next page,
+        or None on the last page.
+        """
+        clauses, params = [], []
+        for column, value in (('cve', cve), ('service', service)):
+            if value:
+                clauses.append(f"f.{column} = ?")
+                params.append(value)
+        for column, value in (('host', host), ('product', product), ('version', version)):
+            if value:
+                escaped = value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+                clauses.append(f"f.{column} LIKE ? ESCAPE '\\'")
+                params.append(f"{escaped}%")
+        if min_score is not None:
+            clauses.append("f.score >= ?")
+            params.append(min_score)
+        if scan_id is not None:
+            clauses.append("f.scan_id = ?")
+            params.append(scan_id)
+        if latest_only:
+            clauses.append("f.scan_id IN (SELECT MAX(id) FROM scan WHERE status = 'completed' GROUP BY target)")
+        if only_open:
+            clauses.append("f.state = 'open'")
+        if after is not None:
+            clauses.append("f.id > ?")
+            params.append(after)
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        rows = self._connect().execute(
+            f"SELECT f.id, {', '.join('f.' + c for c in FINDING_COLUMNS)}, s.name, s.target "
+            f"FROM finding f JOIN scan s ON s.id = f.scan_id {where} "
+            f"ORDER BY f.id LIMIT {int(limit) + 1}", params).fetchall()
+
+        findings = [
+            dict(zip(('id',) + FINDING_COLUMNS + ('scan_name', 'scan_target'), row))
+            for row in rows[:limit]
+        ]
+        next_after = findings[-1]['id'] if len(rows) > limit else None
+        return findings, next_after
+
+    def get_scans_by_status(self, *statuses):
+        """Get scans with any of the given statuses, newest first"""
+        view = self._current_view()
+        if len(statuses) == 1:
+            return list(view.by_status.get(statuses[0], []))
+        return [scan for scan in view.by_start_time if scan.status in statuses]
+
     def get_active_scans(self):
-        """Get all active scans (queued or running)"""
-        scans = self.get_all_scans()
-        return [scan for scan in scans if scan.is_active()]
-    
+        """Get all active scans (queued or running), newest first"""
+        return self.get_scans_by_status('queued', 'running')
+
     def get_completed_scans(self):
-        """Get all completed scans"""
-        scans = self.get_all_scans()
-        return [scan for scan in scans if scan.status == 'completed']
-    
+        """Get all completed scans, newest first"""
+        return self.get_scans_by_status('completed')
+
     def delete_scan_report(self, scan_id):
         """Delete a scan's report files"""
         try:
@@ -193,4 +1139,4 @@ class DataManager:
             return False
 
 # Create a global instance
-data_manager = DataManager()
\ No newline at end of file
+data_manager = DataManager()
@@ -0,0 +1,70 @@
+import xml.etree.ElementTree as ET
+
+from report_archive import open_report
+
+
+def host_fingerprints(xml_path):
+    """
+    Read the open-port fingerprint of every host in an Nmap XML report
+    (plain or compressed).
+
+    Returns {address: (open ports, scanned at)} in report order, where open
+    ports is a frozenset of 'port/protocol' strings and scanned at is the
+    epoch time nmap finished the host (None if the report does not say).
+    Only the port elements are looked at, so this is cheap even for large
+    reports.
+    """
+    fingerprints = {}
+    root = None
+    depth = 0
+    with open_report(xml_path) as source:
+        for event, elem in ET.iterparse(source, events=('start', 'end')):
+            if event == 'start':
+                depth += 1
+                if depth == 1:
+                    root = elem
+                continue
+
+            depth -= 1
+            if depth != 1:
+                continue
+
+            if elem.tag == 'host':
+                address = elem.find('address')
+                if address is not None:
+                    open_ports = frozenset(
+                        f"{port.get('portid')}/{port.get('protocol')}"
+                        for port in elem.iterfind('ports/port')
+                        if port.find('state') is not None and port.find('state').get('state') == 'open'
+                    )
+                    endtime = elem.get('endtime')
+                    fingerprints[address.get('addr')] = (open_ports, int(endtime) if endtime else None)
+            root.clear()
+
+    return fingerprints
+
+
+def plan_rescan(discovered, previous, max_age, now, previous_time):
+    """
+    Decide which discovered hosts need a deep scan.
+
+    A host is deep scanned if the previous report does not have it, if its
+    open ports differ from the previous report, or if its last deep scan
+    (the host's end time, else previous_time) is more than max_age seconds
+    before now. Everything else is carried forward from the previous report.
+    Returns (addresses to deep scan in discovery order, addresses to carry
+    forward).
+    """
+    deep, carry = [], set()
+    for address, (open_ports, _) in discovered.items():
+        known = previous.get(address)
+        if known is None or known[0] != open_ports:
+            deep.append(address)
+            continue
+
+        scanned_at = known[1] or previous_time
+        if now - scanned_at > max_age:
+            deep.append(address)
+        else:
+            carry.add(address)
+    return deep, carry
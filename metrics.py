@@ -0,0 +1,412 @@
+import atexit
+import bisect
+import fcntl
+import functools
+import json
+import logging
+import math
+import os
+import threading
+import time
+import uuid
+
+import profiling
+
+# Prometheus text exposition format
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Upper bounds (seconds) of the histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SCAN_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200, 14400, 43200)
+
+ARCHIVE_NAME = 'archive.json'
+
+
+class _Metric:
+    """
+    A metric with label values recorded in this process. Every process
+    (web workers and scan runners alike) writes its values to its own file
+    in the metrics directory, and /metrics adds up all the files, so counts
+    are totals over the whole deployment.
+    """
+    kind = None
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._registry = registry
+        self._values = {}
+        registry.register(self)
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {sorted(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def clear(self):
+        self._values = {}
+
+    def sample_labelnames(self, sample_name):
+        return self.labelnames
+
+    def samples(self, values):
+        """Yield (sample name, label values, value) for rendering"""
+        for key, value in values.items():
+            yield self.name, key, value
+
+    def _recorded(self):
+        """Note a new value (called with the registry lock held)"""
+        self._registry.dirty = True
+
+
+class Counter(_Metric):
+    """A count that only goes up"""
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        if not self._registry.enabled:
+            return
+        key = self._key(labels)
+        with self._registry.lock:
+            self._values[key] = self._values.get(key, 0) + amount
+            self._recorded()
+        self._registry.start_flusher()
+
+    def dump(self):
+        return [[list(key), value] for key, value in self._values.items()]
+
+    def merge(self, total, dumped):
+        for key, value in dumped:
+            key = tuple(key)
+            total[key] = total.get(key, 0) + value
+
+
+class Histogram(_Metric):
+    """Observations counted into buckets, with their sum"""
+    kind = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS,
+                 phase=None):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(float(bound) for bound in buckets)
+        self.phase = phase  # Request phase (see profiling.PHASES) the timed code belongs to
+
+    def observe(self, value, **labels):
+        if not self._registry.enabled:
+            return
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._registry.lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # One count per bucket plus +Inf, then the sum
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+            self._recorded()
+        self._registry.start_flusher()
+
+    def time(self, **labels):
+        """Context manager observing the seconds its block takes"""
+        return _Timer(self, labels)
+
+    def dump(self):
+        return [[list(key), counts[:], total] for key, (counts, total) in self._values.items()]
+
+    def merge(self, total, dumped):
+        for key, counts, value in dumped:
+            if len(counts) != len(self.buckets) + 1:
+                continue  # Written with other buckets, by an older version
+            entry = total.setdefault(tuple(key), [[0] * len(counts), 0.0])
+            entry[0] = [a + b for a, b in zip(entry[0], counts)]
+            entry[1] += value
+
+    def samples(self, values):
+        for key, (counts, total) in values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                yield f"{self.name}_bucket", key + (_format_value(bound),), cumulative
+            yield f"{self.name}_sum", key, total
+            yield f"{self.name}_count", key, cumulative
+
+    def sample_labelnames(self, sample_name):
+        return self.labelnames + ('le',) if sample_name.endswith('_bucket') else self.labelnames
+
+
+class Gauge(_Metric):
+    """
+    A value that goes up and down. Gauges are not shared between processes:
+    the process serving /metrics sets them (e.g. from the store) right
+    before rendering.
+    """
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        with self._registry.lock:
+            self._values[self._key(labels)] = value
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        if self.histogram.phase:
+            profiling.enter(self.histogram.phase)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+        if self.histogram.phase:
+            profiling.leave()
+
+
+class MetricsRegistry:
+    """
+    The metrics of this process and their shared directory
+    (FLANSCAN_METRICS_DIR, default instance/metrics). Values are written
+    to the directory every FLANSCAN_METRICS_FLUSH_SECONDS and at exit;
+    set FLANSCAN_METRICS=0 to record nothing.
+    """
+    def __init__(self, directory=None):
+        self.directory = directory or os.environ.get(
+            'FLANSCAN_METRICS_DIR', os.path.join(os.getcwd(), 'instance', 'metrics'))
+        self.enabled = os.environ.get('FLANSCAN_METRICS', '1') != '0'
+        self.flush_interval = float(os.environ.get('FLANSCAN_METRICS_FLUSH_SECONDS', 5))
+        self.metrics = []
+        self.lock = threading.Lock()
+        self.dirty = False
+        self._flusher = None
+        self._reset_process()
+
+        atexit.register(self.flush)
+        # A forked worker starts from zero instead of counting its parent's values again
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _reset_process(self):
+        self.pid = os.getpid()
+        self.path = os.path.join(self.directory, f"{self.pid}-{uuid.uuid4().hex[:8]}.json")
+
+    def _after_fork(self):
+        self.lock = threading.Lock()
+        for metric in self.metrics:
+            metric.clear()
+        self.dirty = False
+        self._flusher = None
+        self._reset_process()
+
+    def register(self, metric):
+        self.metrics.append(metric)
+
+    def counter(self, name, documentation, labelnames=()):
+        return Counter(self, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS, phase=None):
+        return Histogram(self, name, documentation, labelnames, buckets, phase)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return Gauge(self, name, documentation, labelnames)
+
+    def _shared(self):
+        return [metric for metric in self.metrics if metric.kind != 'gauge']
+
+    def start_flusher(self):
+        """Start writing this process's values in the background, once per process"""
+        if self._flusher is not None:
+            return
+        with self.lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(target=self._flush_loop, daemon=True,
+                                             name="metrics-flush")
+        self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        """Write this process's values to its file if they changed"""
+        if not self.dirty or os.getpid() != self.pid:
+            return
+        with self.lock:
+            data = {'pid': self.pid,
+                    'metrics': {metric.name: metric.dump() for metric in self._shared()}}
+            self.dirty = False
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f, separators=(',', ':'))
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logging.error(f"Error writing metrics to {self.path}: {str(e)}")
+
+    def _read_files(self):
+        """
+        Load every process's values. Files of processes that have exited are
+        folded into the archive file first, so they stop piling up but their
+        counts are kept.
+        """
+        if not os.path.isdir(self.directory):
+            return []
+        with open(os.path.join(self.directory, '.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            archive_path = os.path.join(self.directory, ARCHIVE_NAME)
+            archive = _load_json(archive_path) or {'metrics': {}}
+            loaded = []
+            archived = []
+            for name in os.listdir(self.directory):
+                if not name.endswith('.json') or name == ARCHIVE_NAME:
+                    continue
+                path = os.path.join(self.directory, name)
+                data = _load_json(path)
+                if data is None:
+                    continue
+                if _process_alive(data.get('pid')):
+                    loaded.append(data)
+                else:
+                    archived.append((path, data))
+
+            if archived:
+                merged = self._merge([archive] + [data for _, data in archived])
+                archive = {'metrics': {metric.name: _dump_merged(metric, merged.get(metric.name, {}))
+                                       for metric in self._shared()}}
+                tmp_path = f"{archive_path}.tmp"
+                with open(tmp_path, 'w') as f:
+                    json.dump(archive, f, separators=(',', ':'))
+                os.replace(tmp_path, archive_path)
+                for path, _ in archived:
+                    os.remove(path)
+        return [archive] + loaded
+
+    def _merge(self, files):
+        """Add up the values of several processes: {metric name: {labels: value}}"""
+        merged = {}
+        for metric in self._shared():
+            total = merged[metric.name] = {}
+            for data in files:
+                metric.merge(total, data.get('metrics', {}).get(metric.name, []))
+        return merged
+
+    def render(self):
+        """Render all metrics, summed over every process, in the Prometheus text format"""
+        self.flush()
+        try:
+            merged = self._merge(self._read_files())
+        except Exception as e:
+            logging.error(f"Error reading metrics from {self.directory}: {str(e)}")
+            merged = {}
+
+        lines = []
+        for metric in self.metrics:
+            values = metric._values if metric.kind == 'gauge' else merged.get(metric.name, {})
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for sample_name, key, value in metric.samples(dict(values)):
+                labels = _format_labels(metric.sample_labelnames(sample_name), key)
+                lines.append(f"{sample_name}{labels} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+def _dump_merged(metric, values):
+    """Dump merged values in the per-process file format"""
+    if metric.kind == 'histogram':
+        return [[list(key), counts, total] for key, (counts, total) in values.items()]
+    return [[list(key), value] for key, value in values.items()]
+
+
+def _load_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _process_alive(pid):
+    """Check whether a process exists on this host"""
+    if not isinstance(pid, int):
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # Exists, owned by someone else
+    return True
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return str(value)
+
+
+def _format_labels(labelnames, values):
+    if not labelnames:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for value in values)
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(labelnames, escaped)) + '}'
+
+
+def timed(histogram, label='operation'):
+    """
+    Decorator observing each call's duration in histogram, labelled with the
+    function name, and counting it towards the histogram's request phase
+    """
+    def decorator(func):
+        labels = {label: func.__name__}
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if histogram.phase:
+                profiling.enter(histogram.phase)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - started, **labels)
+                if histogram.phase:
+                    profiling.leave()
+        return wrapper
+    return decorator
+
+
+# Create a global registry and the application's metrics
+registry = MetricsRegistry()
+
+HTTP_REQUEST_SECONDS = registry.histogram(
+    'flanscan_http_request_duration_seconds', 'Time to handle a web request',
+    ('method', 'endpoint', 'status'))
+SCAN_SECONDS = registry.histogram(
+    'flanscan_scan_duration_seconds', 'Time from a runner claiming a scan to it finishing, by final status',
+    ('status',), SCAN_BUCKETS)
+SCAN_QUEUE_WAIT_SECONDS = registry.histogram(
+    'flanscan_scan_queue_wait_seconds', 'Time from submitting a scan to a runner claiming it',
+    (), SCAN_BUCKETS)
+NMAP_SECONDS = registry.histogram(
+    'flanscan_nmap_run_duration_seconds', 'Time one nmap process ran, by outcome',
+    ('outcome',), SCAN_BUCKETS)
+STORE_SECONDS = registry.histogram(
+    'flanscan_store_operation_duration_seconds', 'Time of scan store reads and writes',
+    ('operation',), phase='store')
+REPORT_PARSE_SECONDS = registry.histogram(
+    'flanscan_report_parse_duration_seconds', 'Time to parse an Nmap XML report',
+    ('operation',), phase='parse')
+REPORT_HOSTS_PARSED = registry.counter(
+    'flanscan_report_hosts_parsed_total', 'Hosts read from Nmap XML reports')
+ANALYTICS_SECONDS = registry.histogram(
+    'flanscan_analytics_duration_seconds', 'Time to get the vulnerability analytics of a report',
+    ('cache',))
+SCANS = registry.gauge('flanscan_scans', 'Scans in the store, by status', ('status',))
+NMAP_PROCESSES = registry.gauge('flanscan_nmap_processes', 'nmap processes running for scans')
+SCAN_RUNNERS = registry.gauge('flanscan_scan_runners', 'Scan runners holding a lease on a running scan')
@@ -0,0 +1,260 @@
+import contextvars
+import cProfile
+import glob
+import hmac
+import io
+import logging
+import os
+import pstats
+import random
+import re
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+# Request phases reported in Server-Timing; time outside all of them is "app"
+PHASES = ('store', 'parse', 'analyze', 'render')
+
+# Deepest call chain written to a flame graph dump
+FLAME_GRAPH_MAX_DEPTH = 64
+
+# Timings of the request being handled in this context, or None when the
+# request is not being timed (or outside requests, e.g. in scan workers)
+_current = contextvars.ContextVar('flanscan_request_timings', default=None)
+
+
+class RequestTimings:
+    """
+    Time spent by one request in each phase. Phases nest (a report parse
+    reads the store); the time of an inner phase is taken out of the outer
+    one, so the phases add up to no more than the whole request.
+    """
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.totals = {}  # phase -> [seconds, calls]
+        self._stack = []  # [phase, running since]
+        self.profiler = None
+        self.on_demand = False
+
+    def enter(self, name):
+        now = time.perf_counter()
+        if self._stack:
+            outer = self._stack[-1]
+            self._add(outer[0], now - outer[1])
+            outer[1] = now
+        total = self.totals.setdefault(name, [0.0, 0])
+        if not self._stack or self._stack[-1][0] != name:
+            total[1] += 1
+        self._stack.append([name, now])
+
+    def leave(self):
+        now = time.perf_counter()
+        name, since = self._stack.pop()
+        self._add(name, now - since)
+        if self._stack:
+            self._stack[-1][1] = now
+
+    def _add(self, name, seconds):
+        self.totals.setdefault(name, [0.0, 0])[0] += seconds
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self, total):
+        """Build the Server-Timing header value (durations in milliseconds)"""
+        entries = []
+        accounted = 0.0
+        for name in PHASES:
+            seconds, calls = self.totals.get(name, (0.0, 0))
+            accounted += seconds
+            entries.append(f'{name};desc="{calls} calls";dur={seconds * 1000:.2f}')
+        entries.append(f'app;dur={max(0.0, total - accounted) * 1000:.2f}')
+        entries.append(f'total;dur={total * 1000:.2f}')
+        return ', '.join(entries)
+
+
+def enter(name):
+    """Start a phase of the current request, if it is being timed"""
+    timings = _current.get()
+    if timings is not None:
+        timings.enter(name)
+
+
+def leave():
+    """End the phase started last"""
+    timings = _current.get()
+    if timings is not None:
+        timings.leave()
+
+
+@contextmanager
+def phase(name):
+    """Count the time of a block towards a phase of the current request"""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    timings.enter(name)
+    try:
+        yield
+    finally:
+        timings.leave()
+
+
+class RequestProfiler:
+    """
+    Opt-in request profiling.
+
+    With FLANSCAN_PROFILING=1 every response carries a Server-Timing header
+    splitting the request into store, parse, analyze, render and app time,
+    and FLANSCAN_PROFILE_SAMPLE_RATE of the requests run under cProfile;
+    those slower than FLANSCAN_PROFILE_SLOW_MS are dumped.
+
+    Independently, when FLANSCAN_PROFILE_TOKEN is set, sending that token
+    in an X-Flanscan-Profile header (or a _profile query parameter) profiles
+    the request and always dumps it. Dumps go to FLANSCAN_PROFILE_DIR
+    (default instance/profiles), which keeps the FLANSCAN_PROFILE_KEEP
+    slowest: a .prof file for pstats or snakeviz, a .txt summary and a
+    .folded file of collapsed stacks for flame graph tools.
+    """
+    def __init__(self):
+        self.enabled = os.environ.get('FLANSCAN_PROFILING') == '1'
+        self.sample_rate = float(os.environ.get('FLANSCAN_PROFILE_SAMPLE_RATE', 0.01))
+        self.slow_seconds = float(os.environ.get('FLANSCAN_PROFILE_SLOW_MS', 1000)) / 1000
+        self.token = os.environ.get('FLANSCAN_PROFILE_TOKEN') or None
+        self.keep = int(os.environ.get('FLANSCAN_PROFILE_KEEP', 50))
+        self.directory = os.environ.get(
+            'FLANSCAN_PROFILE_DIR', os.path.join(os.getcwd(), 'instance', 'profiles'))
+
+    def start_request(self, token=None):
+        """
+        Start timing a request if profiling is on or the request asks for a
+        profile with the right token. Returns the RequestTimings, or None.
+        """
+        self.end_request()
+        on_demand = (self.token is not None and token is not None
+                     and hmac.compare_digest(token.encode(), self.token.encode()))
+        if not (self.enabled or on_demand):
+            return None
+
+        timings = RequestTimings()
+        timings.on_demand = on_demand
+        if on_demand or random.random() < self.sample_rate:
+            timings.profiler = cProfile.Profile()
+            try:
+                timings.profiler.enable()
+            except ValueError:
+                # Another request in this process is being profiled already
+                timings.profiler = None
+        _current.set(timings)
+        return timings
+
+    def finish_request(self, response, method, path, endpoint):
+        """
+        Add the Server-Timing header to a response and dump the profile if
+        one was taken and the request was slow enough (or asked for it)
+        """
+        timings = _current.get()
+        if timings is None:
+            return response
+        total = timings.elapsed()
+        if timings.profiler is not None:
+            timings.profiler.disable()
+
+        response.headers['Server-Timing'] = timings.server_timing(total)
+        if timings.profiler is not None and (timings.on_demand or total >= self.slow_seconds):
+            try:
+                dump_path = self._dump(timings, total, method, path, endpoint)
+                if timings.on_demand:
+                    response.headers['X-Flanscan-Profile'] = os.path.basename(dump_path)
+            except Exception as e:
+                logging.error(f"Error writing request profile: {str(e)}")
+        timings.profiler = None
+        _current.set(None)
+        return response
+
+    def end_request(self):
+        """Stop timing the current request, if anything is left running (e.g. after an error)"""
+        timings = _current.get()
+        if timings is not None and timings.profiler is not None:
+            timings.profiler.disable()
+        _current.set(None)
+
+    def _dump(self, timings, total, method, path, endpoint):
+        """Write the profile of a request and prune the directory; returns the .prof path"""
+        os.makedirs(self.directory, exist_ok=True)
+        name = re.sub(r'[^A-Za-z0-9_]+', '_', endpoint or 'unmatched')
+        base = os.path.join(self.directory, f"{int(total * 1000):08d}ms-"
+                                            f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-"
+                                            f"{name}-{os.getpid()}")
+        timings.profiler.dump_stats(base + '.prof')
+
+        stats = pstats.Stats(timings.profiler)
+        summary = io.StringIO()
+        summary.write(f"{method} {path}\n{total * 1000:.1f} ms\n"
+                      f"Server-Timing: {timings.server_timing(total)}\n\n")
+        stats.stream = summary
+        stats.sort_stats('cumulative').print_stats(40)
+        with open(base + '.txt', 'w') as f:
+            f.write(summary.getvalue())
+        with open(base + '.folded', 'w') as f:
+            f.writelines(f"{stack} {value}\n" for stack, value in collapsed_stacks(stats))
+
+        self._prune()
+        return base + '.prof'
+
+    def _prune(self):
+        """Keep the slowest dumps; file names start with the duration, so name order is speed order"""
+        dumps = sorted(glob.glob(os.path.join(self.directory, '*.prof')), reverse=True)
+        for path in dumps[self.keep:]:
+            for suffix in ('.prof', '.txt', '.folded'):
+                try:
+                    os.remove(path[:-len('.prof')] + suffix)
+                except OSError:
+                    pass
+
+
+def _label(func):
+    filename, line, name = func
+    return f"{os.path.basename(filename)}:{line}:{name}" if line else name
+
+
+def collapsed_stacks(stats):
+    """
+    Rebuild approximate call stacks from a profile, in the collapsed format
+    of flame graph tools ("outer;inner;leaf microseconds"). cProfile only
+    keeps caller/callee pairs, so time is split between the callers of a
+    function in proportion to the time each spent in it.
+    """
+    callees = {}
+    for func, (_, _, _, _, callers) in stats.stats.items():
+        for caller, (_, _, _, cumulative) in callers.items():
+            callees.setdefault(caller, []).append((func, cumulative))
+
+    roots = [func for func, (_, _, _, _, callers) in stats.stats.items() if not callers]
+    totals = {}
+    # Depth-first walk carrying the share of each function's time on this path
+    pending = [((root,), 1.0) for root in roots]
+    while pending:
+        path, share = pending.pop()
+        func = path[-1]
+        own_time = stats.stats[func][2]
+        stack = ';'.join(_label(f) for f in path)
+        totals[stack] = totals.get(stack, 0.0) + own_time * share
+        if len(path) >= FLAME_GRAPH_MAX_DEPTH:
+            continue
+        for callee, edge_time in callees.get(func, ()):
+            if callee in path:
+                continue  # Recursion: already counted on this path
+            callee_cumulative = stats.stats[callee][3]
+            if callee_cumulative:
+                pending.append((path + (callee,), share * edge_time / callee_cumulative))
+
+    for stack, seconds in totals.items():
+        microseconds = int(seconds * 1e6)
+        if microseconds > 0:
+            yield stack, microseconds
+
+
+# Create a global instance
+request_profiler = RequestProfiler()
@@ -0,0 +1,177 @@
+import logging
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+
+import report_archive
+from data_manager import data_manager
+from report_manager import report_manager
+
+# Meta key holding the start of an unfinished reindex, so it can resume
+PROGRESS_KEY = 'reindex_started'
+
+SCAN_DIR_PATTERN = re.compile(r'^scan_(\d+)$')
+
+
+def _rebuild(scan_id, report_path):
+    """Rebuild one report in a worker process; errors come back as text"""
+    try:
+        rows, finished = report_manager.rebuild_report(report_path)
+        return scan_id, report_path, rows, finished, None
+    except Exception as e:
+        return scan_id, report_path, None, False, str(e)
+
+
+def find_reports(reports_dir=None):
+    """Find the report of every scan directory, as (scan_id, path) sorted by scan id"""
+    reports_dir = reports_dir or report_manager.reports_dir
+    reports = []
+    for name in os.listdir(reports_dir):
+        match = SCAN_DIR_PATTERN.match(name)
+        if not match:
+            continue
+        path = report_archive.find_file(os.path.join(reports_dir, name), 'report.xml')
+        if path:
+            reports.append((int(match.group(1)), path))
+    return sorted(reports)
+
+
+def plan_repair(scan, report_path):
+    """
+    Get the fix for the record of a scan whose report nmap finished, as
+    (expected status, fields) for DataManager.apply_reindex_batch, or None
+    if the record is fine: a stale status becomes completed, and a
+    completed scan is pointed at the report found
+    """
+    if scan.status == 'completed':
+        if scan.report_path and os.path.abspath(scan.report_path) == os.path.abspath(report_path):
+            return None
+        return 'completed', {'report_path': report_path}
+    end_time = scan.end_time or datetime.fromtimestamp(os.path.getmtime(report_path))
+    return scan.status, {'status': 'completed', 'report_path': report_path,
+                         'end_time': end_time, 'progress': 100.0}
+
+
+class Reindex:
+    """
+    Rebuild the columnar copies, cached analytics and host summaries and
+    the findings index of every report under reports/, parsing in a pool of
+    worker processes and writing to the store in batches from this one.
+
+    Scans a runner is working on are left alone, as are cancelled scans and
+    report directories without a scan. Scans whose report nmap finished but
+    whose record says queued, running or failed (a runner that died before
+    recording the end) are marked completed.
+
+    Progress is kept in the store: an interrupted run resumes where it
+    stopped, skipping the scans indexed since it started.
+    """
+    def __init__(self, workers=None, batch_size=50, restart=False, progress=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = max(1, batch_size)
+        self.restart = restart
+        self.progress = progress or (lambda counts: None)
+        self.counts = {'total': 0, 'done': 0, 'indexed': 0, 'repaired': 0, 'failed': 0,
+                       'skipped': 0, 'orphaned': 0, 'resumed': 0}
+        self.errors = []
+        self.started = None
+
+    def _start(self):
+        """Get the start of this run, or of the interrupted one it resumes"""
+        started = data_manager.get_meta(PROGRESS_KEY)
+        if started is not None and not self.restart:
+            return datetime.fromisoformat(started), True
+        started = datetime.now()
+        data_manager.set_meta(PROGRESS_KEY, started.isoformat())
+        return started, False
+
+    def plan(self, started, resuming):
+        """Match reports to scans; returns the (scan, report path) pairs to rebuild"""
+        scans = {scan.id: scan for scan in data_manager.get_all_scans()}
+        leased = data_manager.get_leased_scan_ids()
+        done = data_manager.get_indexed_scan_ids(started) if resuming else set()
+
+        tasks = []
+        for scan_id, path in find_reports():
+            scan = scans.get(scan_id)
+            if scan is None:
+                self.counts['orphaned'] += 1
+            elif scan_id in leased or scan.status == 'cancelled':
+                self.counts['skipped'] += 1
+            elif scan_id in done and scan.status == 'completed':
+                self.counts['resumed'] += 1
+            else:
+                tasks.append((scan, path))
+        return tasks
+
+    def run(self):
+        """Rebuild every report; returns the counts (also passed to progress after each batch)"""
+        started, resuming = self._start()
+        tasks = self.plan(started, resuming)
+        self.counts['total'] = len(tasks)
+        self.started = time.perf_counter()
+        self.progress(self.counts)
+
+        scans = {scan.id: scan for scan, _ in tasks}
+        pending = iter(tasks)
+        batch = []
+        # Spawned workers: forking would copy this process's store connections and threads
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=context) as pool:
+            # A few reports in flight per worker keeps them busy without holding every result
+            running = set()
+            while True:
+                while len(running) < self.workers * 2:
+                    task = next(pending, None)
+                    if task is None:
+                        break
+                    scan, path = task
+                    running.add(pool.submit(_rebuild, scan.id, path))
+                if not running:
+                    break
+                finished, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    batch.append(future.result())
+                if len(batch) >= self.batch_size:
+                    self._write(batch, scans)
+                    batch = []
+        if batch:
+            self._write(batch, scans)
+
+        data_manager.set_meta(PROGRESS_KEY, None)
+        return self.counts
+
+    def _write(self, batch, scans):
+        """Store a batch of rebuilt reports and repair the scans that need it"""
+        results = []
+        for scan_id, path, rows, finished, error in batch:
+            scan = scans[scan_id]
+            if scan.status != 'completed' and (error is not None or not finished):
+                # A failed or interrupted scan whose report nmap did not finish
+                self.counts['skipped'] += 1
+                continue
+            if error is not None:
+                self.counts['failed'] += 1
+                self.errors.append((scan_id, error))
+                logging.error(f"Error rebuilding report of scan {scan_id}: {error}")
+                continue
+            results.append((scan_id, rows, plan_repair(scan, path)))
+
+        indexed, repaired = data_manager.apply_reindex_batch(results)
+        for scan_id in repaired:
+            report_manager.discard_partial(scan_id)
+        self.counts['indexed'] += len(indexed)
+        self.counts['repaired'] += len(repaired)
+        self.counts['skipped'] += len(results) - len(indexed)
+        self.counts['done'] += len(batch)
+        self.progress(self.counts)
+
+    def rate(self):
+        """Reports rebuilt per second so far"""
+        if self.started is None:
+            return 0.0
+        elapsed = time.perf_counter() - self.started
+        return self.counts['done'] / elapsed if elapsed > 0 else 0.0
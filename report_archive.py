@@ -0,0 +1,158 @@
+import gzip
+import json
+import os
+import shutil
+import tarfile
+import threading
+import logging
+
+try:
+    import zstandard
+except ImportError:
+    # Optional: without it reports are compressed with gzip
+    zstandard = None
+
+# Compressed file suffix of each compression method
+SUFFIXES = {'gzip': '.gz', 'zstd': '.zst'}
+
+# Files a scan directory can hold that are worth archiving, in any compression
+ARCHIVED_FILES = ('report.xml', 'error.log')
+
+MANIFEST_NAME = 'manifest.json'
+
+
+def compression_method():
+    """
+    Get the configured compression for finished reports (FLANSCAN_REPORT_COMPRESSION:
+    gzip, zstd or none), falling back to gzip if zstandard is not installed
+    """
+    method = os.environ.get('FLANSCAN_REPORT_COMPRESSION', 'gzip').lower()
+    if method == 'zstd' and zstandard is None:
+        logging.warning("zstandard is not installed, compressing reports with gzip")
+        return 'gzip'
+    if method not in SUFFIXES and method != 'none':
+        logging.warning(f"Unknown report compression {method}, using gzip")
+        return 'gzip'
+    return method
+
+
+def is_compressed(path):
+    """Check whether a report file is stored compressed"""
+    return path.endswith(tuple(SUFFIXES.values()))
+
+
+def open_report(path):
+    """
+    Open a report file for binary reading, decompressing it on the fly if it
+    is stored compressed. The result streams, so it can be handed straight
+    to ElementTree.iterparse.
+    """
+    if path.endswith(SUFFIXES['gzip']):
+        return gzip.open(path, 'rb')
+    if path.endswith(SUFFIXES['zstd']):
+        if zstandard is None:
+            raise RuntimeError(f"zstandard is needed to read {path}")
+        return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+    return open(path, 'rb')
+
+
+def compress_file(path, method=None):
+    """
+    Write a compressed copy of a file next to it and return the copy's path.
+    The original is left in place, so the caller can switch readers over
+    before removing it. Returns path unchanged if compression is off or the
+    file is compressed already.
+    """
+    method = method or compression_method()
+    if method == 'none' or is_compressed(path):
+        return path
+
+    compressed_path = path + SUFFIXES[method]
+    tmp_path = f"{compressed_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(path, 'rb') as src, open(tmp_path, 'wb') as raw:
+            if method == 'zstd':
+                with zstandard.ZstdCompressor(level=10).stream_writer(raw, closefd=False) as dst:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+            else:
+                # No name or timestamp in the header: the same report always compresses the same
+                with gzip.GzipFile(filename='', mode='wb', fileobj=raw, mtime=0) as dst:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+        os.replace(tmp_path, compressed_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return compressed_path
+
+
+def find_file(scan_dir, name):
+    """Find a scan file stored plain or compressed, or None"""
+    for candidate in [name] + [name + suffix for suffix in SUFFIXES.values()]:
+        path = os.path.join(scan_dir, candidate)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def archive_member_name(name):
+    """
+    Check a file name from an imported archive: only the archived scan files
+    (plain or compressed) are accepted, never paths
+    """
+    if os.path.basename(name) != name:
+        return None
+    for archived in ARCHIVED_FILES:
+        if name == archived or name in (archived + suffix for suffix in SUFFIXES.values()):
+            return name
+    return None
+
+
+# Size of the pieces a file is streamed into an archive in
+ARCHIVE_CHUNK_SIZE = 1024 * 1024
+
+
+def _tar_header(name, size, mtime=0):
+    """Tar header block of a regular file"""
+    info = tarfile.TarInfo(name)
+    info.size = size
+    info.mtime = mtime
+    info.mode = 0o644
+    return info.tobuf(format=tarfile.PAX_FORMAT)
+
+
+def _tar_padding(size):
+    """Zero bytes that fill a member's data up to a whole tar block"""
+    return tarfile.NUL * (-size % tarfile.BLOCKSIZE)
+
+
+def iter_archive(manifest, files):
+    """
+    Yield a tar archive in chunks: the manifest first, then each
+    (archive name, path) of files, so an import can read the manifest before
+    any report. Headers are written here and each file is read in
+    ARCHIVE_CHUNK_SIZE pieces, so an export never holds a whole file in memory.
+    """
+    data = json.dumps(manifest, indent=2).encode('utf-8')
+    head = _tar_header(MANIFEST_NAME, len(data)) + data + _tar_padding(len(data))
+    length = len(head)
+    yield head
+
+    for name, path in files:
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            header = _tar_header(name, size, int(os.path.getmtime(path)))
+            yield header
+            remaining = size
+            while remaining:
+                chunk = f.read(min(ARCHIVE_CHUNK_SIZE, remaining))
+                if not chunk:
+                    raise OSError(f"{path} shrank while it was being archived")
+                remaining -= len(chunk)
+                yield chunk
+        padding = _tar_padding(size)
+        yield padding
+        length += len(header) + size + len(padding)
+
+    # End of archive: two zero blocks, then zeros up to a whole record, as tarfile writes it
+    end = 2 * tarfile.BLOCKSIZE
+    yield tarfile.NUL * (end + -(length + end) % tarfile.RECORDSIZE)
@@ -0,0 +1,134 @@
+import os
+import json
+import logging
+import threading
+from collections import OrderedDict
+
+
+class ReportCache:
+    """
+    Cache for data computed from reports: analytics, host summaries and diffs.
+
+    Entries are keyed on the report path plus its size and mtime, so a report
+    that changes on disk is never served stale. Each entry lives in a compact
+    JSON sidecar next to the report (surviving restarts and shared between
+    workers) and in a bounded in-memory LRU in front of it.
+
+    Data derived from two reports (such as a diff) passes the second report
+    as depends_on, so a change to either one invalidates the entry, and a
+    variant to keep one sidecar per pairing.
+    """
+    KINDS = ('analytics', 'hosts', 'diff')
+
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries or int(os.environ.get('FLANSCAN_REPORT_CACHE_SIZE', 32))
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _stat_key(report_path):
+        """Get the (path, size, mtime) key of a report, or None if it is missing"""
+        try:
+            st = os.stat(report_path)
+        except OSError:
+            return None
+        return [os.path.abspath(report_path), st.st_size, st.st_mtime_ns]
+
+    def _entry_key(self, report_path, depends_on=None):
+        """Get the stat key of a report, extended with that of the report it depends on"""
+        key = self._stat_key(report_path)
+        if key is None or depends_on is None:
+            return key
+        other = self._stat_key(depends_on)
+        return key + other if other is not None else None
+
+    @staticmethod
+    def _sidecar_path(report_path, kind, variant=None):
+        """Get the sidecar file for one kind of cached data (one of KINDS)"""
+        name = f"{kind}.{variant}.cache.json" if variant is not None else f"{kind}.cache.json"
+        return os.path.join(os.path.dirname(os.path.abspath(report_path)), name)
+
+    def get(self, report_path, kind, variant=None, depends_on=None):
+        """
+        Get cached data for a report, or None if there is no valid entry
+        """
+        key = self._entry_key(report_path, depends_on)
+        if key is None:
+            return None
+
+        memory_key = (key[0], kind, variant)
+        with self._lock:
+            entry = self._entries.get(memory_key)
+            if entry is not None:
+                if entry[0] == key:
+                    self._entries.move_to_end(memory_key)
+                    return entry[1]
+                del self._entries[memory_key]
+
+        sidecar = self._sidecar_path(report_path, kind, variant)
+        if not os.path.exists(sidecar):
+            return None
+
+        try:
+            with open(sidecar, 'r') as f:
+                cached = json.load(f)
+        except Exception as e:
+            logging.error(f"Error reading report cache {sidecar}: {str(e)}")
+            return None
+
+        if cached.get('key') != key:
+            return None
+
+        self._remember(memory_key, key, cached['data'])
+        return cached['data']
+
+    def put(self, report_path, kind, data, variant=None, depends_on=None):
+        """
+        Store data for a report in memory and in its sidecar file
+        """
+        key = self._entry_key(report_path, depends_on)
+        if key is None or data is None:
+            return
+
+        self._remember((key[0], kind, variant), key, data)
+
+        sidecar = self._sidecar_path(report_path, kind, variant)
+        tmp_path = f"{sidecar}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump({'key': key, 'data': data}, f, separators=(',', ':'))
+            # Atomic rename so readers in other workers never see a partial file
+            os.replace(tmp_path, sidecar)
+        except Exception as e:
+            logging.error(f"Error writing report cache {sidecar}: {str(e)}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _remember(self, memory_key, key, data):
+        """Add an entry to the in-memory LRU, evicting the oldest if it is full"""
+        with self._lock:
+            self._entries[memory_key] = (key, data)
+            self._entries.move_to_end(memory_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def evict(self, report_path):
+        """
+        Drop every cached entry for a report, in memory and on disk
+        """
+        path = os.path.abspath(report_path)
+        with self._lock:
+            for memory_key in [k for k in self._entries if k[0] == path]:
+                del self._entries[memory_key]
+
+        scan_dir = os.path.dirname(path)
+        if not os.path.isdir(scan_dir):
+            return
+        for name in os.listdir(scan_dir):
+            if not name.endswith('.cache.json'):
+                continue
+            sidecar = os.path.join(scan_dir, name)
+            try:
+                os.remove(sidecar)
+            except OSError as e:
+                logging.error(f"Error removing report cache {sidecar}: {str(e)}")
@@ -0,0 +1,118 @@
+from collections import Counter
+
+# Kinds of change reported by iter_diff, in display order
+CHANGE_TYPES = ('host_added', 'host_removed', 'host_status_changed', 'port_opened',
+                'port_closed', 'service_changed', 'cve_added', 'cve_fixed')
+
+
+def _host_key(host):
+    """Identify a host across reports by its first address"""
+    return host['addresses'][0]['addr'] if host['addresses'] else None
+
+
+def _service_label(service):
+    """Describe a port's service as 'name product version'"""
+    return ' '.join(part for part in (service.get('name'), service.get('product'),
+                                      service.get('version')) if part)
+
+
+def _index_host(host):
+    """
+    Reduce a parsed host to what the diff compares: its status and, per
+    (protocol, port), the state, service label and {CVE: score}
+    """
+    ports = {}
+    for port in host['ports']:
+        ports[(port['protocol'], port['portid'])] = (
+            port['state'],
+            _service_label(port['service']),
+            {vuln['id']: vuln['score'] for vuln in port['vulnerabilities']}
+        )
+    return host['status'], ports
+
+
+def index_hosts(hosts):
+    """
+    Build the hash index of a report's hosts: address -> (status, ports).
+    Only the compared fields are kept, so the index is much smaller than
+    the parsed report.
+    """
+    index = {}
+    for host in hosts:
+        key = _host_key(host)
+        if key is not None:
+            index[key] = _index_host(host)
+    return index
+
+
+def iter_diff(old_hosts, new_hosts):
+    """
+    Yield the changes between two reports as dicts with a 'type' (one of
+    CHANGE_TYPES), the host and, for port level changes, port, protocol and
+    old/new values.
+
+    The old report is indexed first; the new one is consumed one host at a
+    time, so it can be a streaming iterator and changes come out as soon as
+    each host has been compared. Every host and port is looked up in a hash
+    index once, so the diff is linear in the size of both reports.
+    """
+    old_index = index_hosts(old_hosts)
+
+    for host in new_hosts:
+        addr = _host_key(host)
+        if addr is None:
+            continue
+        status, new_ports = _index_host(host)
+
+        old = old_index.pop(addr, None)
+        if old is None:
+            yield {
+                'type': 'host_added',
+                'host': addr,
+                'status': status,
+                'open_ports': sorted(f"{portid}/{protocol}" for (protocol, portid), port in new_ports.items()
+                                     if port[0] == 'open'),
+                'vulnerability_count': sum(len(port[2]) for port in new_ports.values())
+            }
+            continue
+
+        old_status, old_ports = old
+        if old_status != status:
+            yield {'type': 'host_status_changed', 'host': addr, 'old': old_status, 'new': status}
+
+        for key in list(new_ports) + [key for key in old_ports if key not in new_ports]:
+            protocol, portid = key
+            old_state, old_service, old_cves = old_ports.get(key, (None, None, {}))
+            new_state, new_service, new_cves = new_ports.get(key, (None, None, {}))
+            change = {'host': addr, 'port': portid, 'protocol': protocol}
+
+            if new_state == 'open' and old_state != 'open':
+                yield dict(change, type='port_opened', old=old_state, new=new_state, service=new_service)
+            elif old_state == 'open' and new_state != 'open':
+                yield dict(change, type='port_closed', old=old_state, new=new_state, service=old_service)
+            elif old_state == 'open' and old_service != new_service:
+                yield dict(change, type='service_changed', old=old_service, new=new_service)
+
+            for cve, score in new_cves.items():
+                if cve not in old_cves:
+                    yield dict(change, type='cve_added', cve=cve, score=score)
+            for cve, score in old_cves.items():
+                if cve not in new_cves:
+                    yield dict(change, type='cve_fixed', cve=cve, score=score)
+
+    # Whatever is left in the old index is gone from the new report
+    for addr, (status, ports) in old_index.items():
+        yield {
+            'type': 'host_removed',
+            'host': addr,
+            'status': status,
+            'open_ports': sorted(f"{portid}/{protocol}" for (protocol, portid), port in ports.items()
+                                 if port[0] == 'open'),
+            'vulnerability_count': sum(len(port[2]) for port in ports.values())
+        }
+
+
+def summarize_changes(changes):
+    """Count changes by type, with every type present"""
+    counts = Counter(change['type'] for change in changes)
+    return {change_type: counts.get(change_type, 0) for change_type in CHANGE_TYPES}
@@ -1,14 +1,33 @@
 import os
 import json
+import shutil
+import tarfile
+import tempfile
+import threading
+import time
 import xml.etree.ElementTree as ET
 import logging
-from datetime import datetime
-from collections import defaultdict
+from collections import OrderedDict
+from datetime import datetime, timedelta
 from data_manager import data_manager, Scan
+from report_cache import ReportCache
+from analytics import (compute_vulnerability_analytics, compute_columnar_analytics, compute_trends,
+                       finding_scores, parse_score)
+from columnar import ColumnarReport, ColumnarWriter
+import report_archive
+from report_archive import open_report
+from report_diff import iter_diff, summarize_changes
+from metrics import ANALYTICS_SECONDS, REPORT_HOSTS_PARSED, REPORT_PARSE_SECONDS, timed
+from profiling import phase
 
 class ReportManager:
     def __init__(self):
         self.reports_dir = os.path.join(os.getcwd(), 'reports')
+        self.cache = ReportCache()
+        self._partial_lock = threading.Lock()
+        self._columnar = OrderedDict()
+        self._columnar_lock = threading.Lock()
+        self.max_columnar = int(os.environ.get('FLANSCAN_COLUMNAR_CACHE_SIZE', 16))
         
         # Create reports directory if it doesn't exist
         if not os.path.exists(self.reports_dir):
@@ -22,234 +41,580 @@ class ReportManager:
         if not scan or not scan.report_path or not os.path.exists(scan.report_path):
             return None
         
+        return self._get_parsed_report(scan_id, scan.report_path)
+
+    def _get_parsed_report(self, scan_id, report_path):
+        """
+        Get the parsed report, rebuilt from its columnar copy
+        """
+        columns = self.get_columnar(scan_id, report_path)
+        return columns.to_report() if columns is not None else None
+
+    @staticmethod
+    def columnar_path(report_path):
+        """Get the columnar copy of an XML report"""
+        return os.path.join(os.path.dirname(os.path.abspath(report_path)), 'report.columns')
+
+    def get_columnar(self, scan_id, report_path):
+        """
+        Get the memory mapped columnar copy of a finished report, converting
+        the XML on first use or when it has changed since. Returns None if
+        the report cannot be read.
+        """
+        key = ReportCache._stat_key(report_path)
+        if key is None:
+            return None
+
+        with self._columnar_lock:
+            cached = self._columnar.get(key[0])
+            if cached is not None and cached.meta.get('source') == key:
+                self._columnar.move_to_end(key[0])
+                return cached
+
+        columns_path = self.columnar_path(report_path)
+        columns = None
         try:
-            # Parse the XML report into a structured format
-            report_data = self._parse_xml_report(scan.report_path)
-            return report_data
+            if os.path.exists(columns_path):
+                columns = ColumnarReport(columns_path)
+                if columns.meta.get('source') != key:
+                    columns = None
+            if columns is None:
+                columns = ColumnarReport(self.convert_report(report_path, columns_path))
         except Exception as e:
-            logging.error(f"Error parsing report for scan {scan_id}: {str(e)}")
+            logging.error(f"Error loading columnar report for scan {scan_id}: {str(e)}")
+            return None
+
+        with self._columnar_lock:
+            self._columnar[key[0]] = columns
+            self._columnar.move_to_end(key[0])
+            while len(self._columnar) > self.max_columnar:
+                # Not closed: a request may still be reading it; the map goes with the last reference
+                self._columnar.popitem(last=False)
+        return columns
+
+    @timed(REPORT_PARSE_SECONDS)
+    def convert_report(self, xml_path, columns_path=None):
+        """
+        Convert an Nmap XML report to the columnar format, streaming the
+        hosts so the parsed report is never held in memory. The XML's stat
+        key is stored with it to detect a stale copy. Returns the path written.
+        """
+        columns_path = columns_path or self.columnar_path(xml_path)
+        key = ReportCache._stat_key(xml_path)
+        scan_info = {'scanner': 'Unknown', 'version': 'Unknown', 'scan_time': 'Unknown'}
+        writer = ColumnarWriter()
+        for host in self.iter_hosts(xml_path, scan_info):
+            writer.add_host(host)
+        REPORT_HOSTS_PARSED.inc(len(writer.columns['host_status']))
+        scan_info['source'] = key
+        return writer.write(columns_path, scan_info)
+
+    def _partial_path(self, scan_id):
+        """Get the file that collects hosts of a scan while it is still running"""
+        return os.path.join(self.reports_dir, f"scan_{scan_id}", 'partial.jsonl')
+
+    def append_partial_host(self, scan_id, host_data):
+        """
+        Save one host of a running scan as soon as nmap has finished with it
+        """
+        line = json.dumps(host_data, separators=(',', ':'))
+        with self._partial_lock:
+            with open(self._partial_path(scan_id), 'a') as f:
+                f.write(line + '\n')
+
+    def get_partial_report(self, scan_id):
+        """
+        Get the hosts a running (or interrupted) scan has finished so far, in
+        the same shape as a parsed report, or None if there are none yet
+        """
+        partial_path = self._partial_path(scan_id)
+        if not os.path.exists(partial_path):
+            return None
+
+        # Keyed on address, so a host seen again by a retried shard replaces the earlier copy
+        hosts = {}
+        with open(partial_path, 'r') as f:
+            for line in f:
+                try:
+                    host = json.loads(line)
+                except ValueError:
+                    # The last line may still be being written
+                    break
+                key = host['addresses'][0]['addr'] if host['addresses'] else len(hosts)
+                hosts[key] = host
+
+        scan = data_manager.get_scan(scan_id)
+        return {
+            'scanner': 'nmap',
+            'version': 'Unknown',
+            'scan_time': scan.start_time.strftime('%Y-%m-%d %H:%M:%S') if scan else 'Unknown',
+            'hosts': list(hosts.values()),
+            'partial': True
+        }
+
+    def get_partial_analytics(self, scan_id):
+        """
+        Get vulnerability analytics over the partial results of a scan
+        """
+        report_data = self.get_partial_report(scan_id)
+        if report_data is None:
+            return None
+        with phase('analyze'):
+            analytics = compute_vulnerability_analytics(report_data)
+        analytics['partial'] = True
+        return analytics
+
+    def discard_partial(self, scan_id):
+        """Remove the partial results once the full report is available"""
+        partial_path = self._partial_path(scan_id)
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+
+    def warm_cache(self, scan_id):
+        """
+        Convert a finished report to the columnar format and compute its
+        analytics once, so the first page views are served from the cache
+        """
+        warmed = self.get_vulnerability_analytics(scan_id) is not None
+        self.get_host_summaries(scan_id)
+        return warmed
+
+    def index_findings(self, scan_id):
+        """
+        Add the ports and vulnerabilities of a completed scan to the findings
+        index, replacing anything indexed for it before. Hosts are read one
+        at a time, so the full report is never held in memory.
+        """
+        scan = data_manager.get_scan(scan_id)
+        if not scan or not scan.report_path or not os.path.exists(scan.report_path):
+            return False
+
+        try:
+            rows = self.finding_rows(self._iter_scan_hosts(scan))
+            data_manager.replace_findings(scan_id, rows)
+            return True
+        except Exception as e:
+            logging.error(f"Error indexing findings for scan {scan_id}: {str(e)}")
+            return False
+
+    @staticmethod
+    def finding_rows(hosts):
+        """
+        Build findings index rows (FINDING_COLUMNS order, scan_id excluded)
+        from parsed hosts: one per port, or per vulnerability on a port
+        """
+        rows = []
+        for host in hosts:
+            addr = host['addresses'][0]['addr'] if host['addresses'] else 'Unknown'
+            hostname = host['hostnames'][0]['name'] if host['hostnames'] else None
+            for port in host['ports']:
+                service = port['service']
+                base = (addr, hostname, int(port['portid']) if port['portid'].isdigit() else None,
+                        port['protocol'], port['state'], service.get('name'),
+                        service.get('product'), service.get('version'))
+                if not port['vulnerabilities']:
+                    rows.append(base + (None, None))
+                for vuln in port['vulnerabilities']:
+                    rows.append(base + (vuln['id'], parse_score(vuln['score'])))
+        return rows
+
+    def rebuild_report(self, report_path):
+        """
+        Rebuild everything derived from a finished report: convert it to the
+        columnar format again and recompute its cached analytics and host
+        summaries. Does not touch the scan store, so it can run in a worker
+        process. Returns (findings index rows, whether nmap finished the
+        scan successfully).
+        """
+        columns = ColumnarReport(self.convert_report(report_path))
+        try:
+            self.cache.put(report_path, 'analytics', compute_columnar_analytics(columns))
+            self.cache.put(report_path, 'hosts', self._columnar_summaries(columns))
+            rows = self.finding_rows(columns.iter_hosts())
+            return rows, columns.meta.get('exit') == 'success'
+        finally:
+            columns.close()
+
+    def backfill_findings(self):
+        """
+        Index every completed scan that is not in the findings index yet.
+        Safe to run from several workers at once and to interrupt: each scan
+        is indexed in its own transaction. Returns the number indexed.
+        """
+        indexed = 0
+        for scan_id in data_manager.get_unindexed_scan_ids():
+            if self.index_findings(scan_id):
+                indexed += 1
+        if indexed:
+            logging.info(f"Indexed findings of {indexed} existing scans")
+        return indexed
+
+    def get_scan_report(self, scan):
+        """
+        Get the full report of a completed scan, or the partial results of a
+        running or interrupted one
+        """
+        if scan.status == 'completed':
+            return self.get_report(scan.id)
+        return self.get_partial_report(scan.id)
+
+    def get_host_summaries(self, scan_id):
+        """
+        Get the report header plus one small summary per host (addresses,
+        port and vulnerability counts, highest score), or None if there is
+        no report. Summaries of finished reports are cached, so listing a
+        page of hosts never needs the full parsed report.
+        """
+        scan = data_manager.get_scan(scan_id)
+        if not scan:
+            return None
+
+        if scan.status == 'completed' and scan.report_path:
+            summaries = self.cache.get(scan.report_path, 'hosts')
+            if summaries is not None:
+                return summaries
+
+            columns = self.get_columnar(scan_id, scan.report_path)
+            if columns is None:
+                return None
+            summaries = self._columnar_summaries(columns)
+            self.cache.put(scan.report_path, 'hosts', summaries)
+            return summaries
+
+        report_data = self.get_scan_report(scan)
+        if report_data is None:
             return None
+
+        summaries = {
+            'scanner': report_data['scanner'],
+            'version': report_data['version'],
+            'scan_time': report_data['scan_time'],
+            'partial': report_data.get('partial', False),
+            'hosts': [self._summarize_host(index, host) for index, host in enumerate(report_data['hosts'])]
+        }
+        return summaries
+
+    @staticmethod
+    def _summarize_host(index, host):
+        """Reduce a parsed host to the fields shown in the host list"""
+        vulnerability_count = 0
+        max_score = 0.0
+        for port in host['ports']:
+            vulnerability_count += len(port['vulnerabilities'])
+            for vuln in port['vulnerabilities']:
+                max_score = max(max_score, parse_score(vuln['score']))
+
+        return {
+            'index': index,
+            'addresses': [addr['addr'] for addr in host['addresses']],
+            'hostnames': [hostname['name'] for hostname in host['hostnames']],
+            'status': host['status'],
+            'port_count': len(host['ports']),
+            'open_port_count': sum(1 for port in host['ports'] if port['state'] == 'open'),
+            'vulnerability_count': vulnerability_count,
+            'max_score': max_score
+        }
+
+    @classmethod
+    def _columnar_summaries(cls, columns):
+        """Build the report header and host summaries of a columnar report"""
+        return {
+            'scanner': columns.meta['scanner'],
+            'version': columns.meta['version'],
+            'scan_time': columns.meta['scan_time'],
+            'partial': False,
+            'hosts': [cls._summarize_columnar_host(columns, index) for index in range(len(columns))]
+        }
+
+    @staticmethod
+    def _summarize_columnar_host(columns, index):
+        """Summarize one host of a columnar report straight from its arrays"""
+        string = columns.string
+        a0, a1 = columns.host_address_offsets[index], columns.host_address_offsets[index + 1]
+        n0, n1 = columns.host_hostname_offsets[index], columns.host_hostname_offsets[index + 1]
+        p0, p1 = columns.host_port_offsets[index], columns.host_port_offsets[index + 1]
+        v0, v1 = columns.port_vuln_offsets[p0], columns.port_vuln_offsets[p1]
+
+        return {
+            'index': index,
+            'addresses': [string(columns.address[a]) for a in range(a0, a1)],
+            'hostnames': [string(columns.hostname[n]) for n in range(n0, n1)],
+            'status': string(columns.host_status[index]),
+            'port_count': p1 - p0,
+            'open_port_count': sum(1 for p in range(p0, p1) if string(columns.port_state[p]) == 'open'),
+            'vulnerability_count': v1 - v0,
+            'max_score': max((columns.cve_score[cve] for cve in columns.vuln[v0:v1]), default=0.0)
+        }
+
+    @staticmethod
+    def filter_host_summaries(hosts, only_open=False, only_vulnerable=False, min_score=None):
+        """
+        Keep the hosts with open ports, with vulnerabilities and/or with a
+        vulnerability scoring at least min_score
+        """
+        if only_open:
+            hosts = [host for host in hosts if host['open_port_count']]
+        if only_vulnerable:
+            hosts = [host for host in hosts if host['vulnerability_count']]
+        if min_score:
+            hosts = [host for host in hosts if host['max_score'] >= min_score]
+        return hosts
+
+    def get_host(self, scan_id, host_index, only_open=False, min_score=None):
+        """
+        Get one host of a report with its ports and vulnerabilities, keeping
+        only open ports and/or vulnerabilities scoring at least min_score.
+        Returns None if the scan, report or host does not exist.
+        """
+        scan = data_manager.get_scan(scan_id)
+        if not scan:
+            return None
+
+        if scan.status == 'completed':
+            # Only the one host is rebuilt from the columnar report
+            columns = self.get_columnar(scan_id, scan.report_path) if scan.report_path else None
+            if columns is None or not 0 <= host_index < len(columns):
+                return None
+            host = columns.host(host_index)
+        else:
+            report_data = self.get_partial_report(scan_id)
+            if report_data is None or not 0 <= host_index < len(report_data['hosts']):
+                return None
+            host = report_data['hosts'][host_index]
+
+        ports = []
+        for port in host['ports']:
+            if only_open and port['state'] != 'open':
+                continue
+            if min_score:
+                vulnerabilities = [vuln for vuln in port['vulnerabilities']
+                                   if parse_score(vuln['score']) >= min_score]
+                if not vulnerabilities:
+                    continue
+                port = dict(port, vulnerabilities=vulnerabilities)
+            ports.append(port)
+
+        return dict(host, index=host_index, ports=ports)
     
+    @timed(REPORT_PARSE_SECONDS)
     def _parse_xml_report(self, xml_path):
         """
         Parse the Nmap XML report into a structured format
         """
         try:
-            tree = ET.parse(xml_path)
-            root = tree.getroot()
-            
-            # Basic scan information
             scan_info = {
-                'scanner': root.get('scanner', 'Unknown'),
-                'version': root.get('version', 'Unknown'),
-                'scan_time': root.get('start', 'Unknown'),
+                'scanner': 'Unknown',
+                'version': 'Unknown',
+                'scan_time': 'Unknown',
                 'hosts': []
             }
-            
-            # Parse host information
-            for host in root.findall('.//host'):
-                host_data = {
-                    'status': host.find('.//status').get('state', 'unknown') if host.find('.//status') is not None else 'unknown',
-                    'addresses': [],
-                    'hostnames': [],
-                    'ports': []
-                }
-                
-                # Get IP addresses
-                for addr in host.findall('.//address'):
-                    host_data['addresses'].append({
-                        'addr': addr.get('addr', ''),
-                        'addrtype': addr.get('addrtype', '')
-                    })
-                
-                # Get hostnames
-                for hostname in host.findall('.//hostname'):
-                    host_data['hostnames'].append({
-                        'name': hostname.get('name', ''),
-                        'type': hostname.get('type', '')
-                    })
-                
-                # Get ports and services
-                for port in host.findall('.//port'):
-                    port_data = {
-                        'protocol': port.get('protocol', ''),
-                        'portid': port.get('portid', ''),
-                        'state': port.find('.//state').get('state', '') if port.find('.//state') is not None else 'unknown',
-                        'service': {},
-                        'vulnerabilities': []
-                    }
-                    
-                    # Get service information
-                    service = port.find('.//service')
-                    if service is not None:
-                        port_data['service'] = {
-                            'name': service.get('name', ''),
-                            'product': service.get('product', ''),
-                            'version': service.get('version', ''),
-                            'extrainfo': service.get('extrainfo', '')
-                        }
-                    
-                    # Get vulnerability information (if present)
-                    for script in port.findall('.//script'):
-                        if script.get('id') == 'vulners':
-                            output = script.get('output', '')
-                            for line in output.splitlines():
-                                if 'CVE-' in line:
-                                    # Extract CVE information
-                                    parts = line.strip().split('\t')
-                                    if len(parts) >= 2:
-                                        cve_id = parts[0].strip()
-                                        score = parts[1].strip() if len(parts) > 1 else "N/A"
-                                        port_data['vulnerabilities'].append({
-                                            'id': cve_id,
-                                            'score': score
-                                        })
-                    
-                    host_data['ports'].append(port_data)
-                
-                scan_info['hosts'].append(host_data)
-            
+            scan_info['hosts'].extend(self.iter_hosts(xml_path, scan_info))
+            REPORT_HOSTS_PARSED.inc(len(scan_info['hosts']))
             return scan_info
-        
+
         except Exception as e:
             logging.error(f"Error parsing XML report: {str(e)}")
             raise
-    
+
+    def iter_hosts(self, xml_path, scan_info=None):
+        """
+        Stream the hosts of an Nmap XML report one at a time.
+
+        Uses iterparse and clears each top-level element once it has been
+        handled, so memory stays bounded by the size of a single host rather
+        than the whole report. Compressed reports are decompressed as they
+        are read. If scan_info is given, the basic scan
+        information from the <nmaprun> element is filled into it, plus
+        the exit status nmap wrote when it finished ('exit').
+        """
+        root = None
+        depth = 0
+        with open_report(xml_path) as source:
+            for event, elem in ET.iterparse(source, events=('start', 'end')):
+                if event == 'start':
+                    depth += 1
+                    if depth == 1:
+                        root = elem
+                        if scan_info is not None:
+                            # Basic scan information
+                            scan_info['scanner'] = elem.get('scanner', 'Unknown')
+                            scan_info['version'] = elem.get('version', 'Unknown')
+                            scan_info['scan_time'] = elem.get('start', 'Unknown')
+                    continue
+
+                depth -= 1
+                if depth == 1:
+                    # A direct child of <nmaprun> is complete
+                    if elem.tag == 'host':
+                        yield self._parse_host(elem)
+                    elif elem.tag == 'runstats' and scan_info is not None:
+                        finished = elem.find('finished')
+                        if finished is not None:
+                            scan_info['exit'] = finished.get('exit', 'success')
+                    root.clear()
+
+    def _parse_host(self, host):
+        """
+        Parse a single <host> element into a host dict
+        """
+        status = host.find('status')
+        host_data = {
+            'status': status.get('state', 'unknown') if status is not None else 'unknown',
+            'addresses': [],
+            'hostnames': [],
+            'ports': []
+        }
+
+        # Get IP addresses
+        for addr in host.iterfind('address'):
+            host_data['addresses'].append({
+                'addr': addr.get('addr', ''),
+                'addrtype': addr.get('addrtype', '')
+            })
+
+        # Get hostnames
+        for hostname in host.iterfind('hostnames/hostname'):
+            host_data['hostnames'].append({
+                'name': hostname.get('name', ''),
+                'type': hostname.get('type', '')
+            })
+
+        # Get ports and services
+        for port in host.iterfind('ports/port'):
+            host_data['ports'].append(self._parse_port(port))
+
+        return host_data
+
+    def _parse_port(self, port):
+        """
+        Parse a single <port> element, including vulners script findings
+        """
+        port_data = {
+            'protocol': port.get('protocol', ''),
+            'portid': port.get('portid', ''),
+            'state': 'unknown',
+            'service': {},
+            'vulnerabilities': []
+        }
+
+        # A single pass over the direct children replaces repeated subtree searches
+        for child in port:
+            if child.tag == 'state':
+                port_data['state'] = child.get('state', '')
+            elif child.tag == 'service':
+                port_data['service'] = {
+                    'name': child.get('name', ''),
+                    'product': child.get('product', ''),
+                    'version': child.get('version', ''),
+                    'extrainfo': child.get('extrainfo', '')
+                }
+            elif child.tag == 'script' and child.get('id') == 'vulners':
+                port_data['vulnerabilities'].extend(
+                    self._parse_vulners_output(child.get('output', '')))
+
+        return port_data
+
+    @staticmethod
+    def _parse_vulners_output(output):
+        """
+        Extract CVE ids and scores from the output of the vulners NSE script
+        """
+        vulnerabilities = []
+        for line in output.splitlines():
+            if 'CVE-' in line:
+                # Extract CVE information
+                parts = line.strip().split('\t')
+                if len(parts) >= 2:
+                    vulnerabilities.append({
+                        'id': parts[0].strip(),
+                        'score': parts[1].strip()
+                    })
+        return vulnerabilities
+
     def get_vulnerability_analytics(self, scan_id):
         """
         Get vulnerability analytics data for a specific scan
         """
-        report_data = self.get_report(scan_id)
-        if not report_data:
+        started = time.perf_counter()
+        scan = data_manager.get_scan(scan_id)
+        if not scan or not scan.report_path or not os.path.exists(scan.report_path):
             return None
-        
-        analytics = {
-            'total_vulnerabilities': 0,
-            'hosts_with_vulnerabilities': 0,
-            'critical_count': 0,
-            'high_count': 0,
-            'medium_count': 0,
-            'low_count': 0,
-            'vulnerabilities_by_host': [],
-            'top_vulnerabilities': [],
-            'vulnerabilities_by_severity': {
-                'critical': [],  # 9.0-10.0
-                'high': [],      # 7.0-8.9
-                'medium': [],    # 4.0-6.9
-                'low': []        # 0.1-3.9
-            }
-        }
-        
-        # Collect all vulnerabilities
-        all_vulnerabilities = []
-        vulnerability_counts = defaultdict(int)
-        
-        for host in report_data['hosts']:
-            host_addr = host['addresses'][0]['addr'] if host['addresses'] else 'Unknown'
-            host_vulns = []
-            
-            for port in host['ports']:
-                for vuln in port['vulnerabilities']:
-                    vuln_id = vuln['id']
-                    score = vuln['score']
-                    
-                    # Convert score to float for comparison
-                    try:
-                        score_float = float(score) if score != 'N/A' else 0
-                    except ValueError:
-                        score_float = 0
-                    
-                    # Categorize by severity
-                    if score_float >= 9.0:
-                        analytics['critical_count'] += 1
-                        analytics['vulnerabilities_by_severity']['critical'].append({
-                            'id': vuln_id,
-                            'score': score,
-                            'host': host_addr,
-                            'port': port['portid'],
-                            'service': port['service'].get('name', '')
-                        })
-                    elif score_float >= 7.0:
-                        analytics['high_count'] += 1
-                        analytics['vulnerabilities_by_severity']['high'].append({
-                            'id': vuln_id,
-                            'score': score,
-                            'host': host_addr,
-                            'port': port['portid'],
-                            'service': port['service'].get('name', '')
-                        })
-                    elif score_float >= 4.0:
-                        analytics['medium_count'] += 1
-                        analytics['vulnerabilities_by_severity']['medium'].append({
-                            'id': vuln_id,
-                            'score': score,
-                            'host': host_addr,
-                            'port': port['portid'],
-                            'service': port['service'].get('name', '')
-                        })
-                    elif score_float > 0:
-                        analytics['low_count'] += 1
-                        analytics['vulnerabilities_by_severity']['low'].append({
-                            'id': vuln_id,
-                            'score': score,
-                            'host': host_addr,
-                            'port': port['portid'],
-                            'service': port['service'].get('name', '')
-                        })
-                    
-                    # Add to host vulnerabilities
-                    host_vulns.append({
-                        'id': vuln_id,
-                        'score': score,
-                        'port': port['portid'],
-                        'service': port['service'].get('name', '')
-                    })
-                    
-                    # Count total vulnerabilities
-                    analytics['total_vulnerabilities'] += 1
-                    
-                    # Track unique vulnerability counts
-                    vulnerability_counts[vuln_id] += 1
-                    
-                    # Add to all vulnerabilities list
-                    all_vulnerabilities.append({
-                        'id': vuln_id,
-                        'score': score,
-                        'host': host_addr,
-                        'port': port['portid'],
-                        'service': port['service'].get('name', '')
-                    })
-            
-            if host_vulns:
-                analytics['hosts_with_vulnerabilities'] += 1
-                analytics['vulnerabilities_by_host'].append({
-                    'host': host_addr,
-                    'vulnerability_count': len(host_vulns),
-                    'vulnerabilities': host_vulns
-                })
-        
-        # Get top vulnerabilities (by count)
-        top_vulns = sorted(vulnerability_counts.items(), key=lambda x: x[1], reverse=True)
-        for vuln_id, count in top_vulns[:10]:  # Top 10
-            # Find an example of this vulnerability to get the score
-            example = next((v for v in all_vulnerabilities if v['id'] == vuln_id), None)
-            score = example['score'] if example else 'N/A'
-            
-            analytics['top_vulnerabilities'].append({
-                'id': vuln_id,
-                'count': count,
-                'score': score
-            })
-        
-        # Sort vulnerabilities by severity within each category
-        for severity in analytics['vulnerabilities_by_severity']:
-            analytics['vulnerabilities_by_severity'][severity].sort(
-                key=lambda x: float(x['score']) if x['score'] != 'N/A' else 0, 
-                reverse=True
-            )
-        
+
+        analytics = self.cache.get(scan.report_path, 'analytics')
+        # Entries cached before the statistics section existed are recomputed
+        if analytics is not None and 'statistics' in analytics:
+            ANALYTICS_SECONDS.observe(time.perf_counter() - started, cache='hit')
+            return analytics
+
+        columns = self.get_columnar(scan_id, scan.report_path)
+        if columns is None:
+            return None
+
+        with phase('analyze'):
+            analytics = compute_columnar_analytics(columns)
+        self.cache.put(scan.report_path, 'analytics', analytics)
+        ANALYTICS_SECONDS.observe(time.perf_counter() - started, cache='miss')
         return analytics
-        
+
+    def get_trends(self, target, days=90):
+        """
+        Get severity counts and score statistics for each completed scan of
+        a target over the last days, plus the whole window together. Scores
+        come straight from each scan's memory mapped columnar report.
+        """
+        since = datetime.now() - timedelta(days=days) if days else None
+        points = []
+        for scan in data_manager.get_completed_scans_of_target(target, since):
+            columns = self.get_columnar(scan.id, scan.report_path) if scan.report_path else None
+            if columns is None:
+                continue
+            label = {'id': scan.id, 'name': scan.name,
+                     'start_time': scan.start_time.isoformat() if scan.start_time else None}
+            with phase('analyze'):
+                points.append((label, finding_scores(columns)))
+        with phase('analyze'):
+            return compute_trends(points)
+
+    def _iter_scan_hosts(self, scan):
+        """
+        Iterate over the hosts of a completed scan, from its columnar report
+        if it can be loaded, otherwise streamed from the XML
+        """
+        columns = self.get_columnar(scan.id, scan.report_path)
+        if columns is not None:
+            return columns.iter_hosts()
+        return self.iter_hosts(scan.report_path)
+
+    def iter_report_diff(self, old_scan, new_scan):
+        """
+        Yield the changes from one completed scan to another as they are
+        found. A cached diff is replayed; otherwise the finished diff is
+        cached against both reports.
+        """
+        cached = self.cache.get(new_scan.report_path, 'diff', variant=old_scan.id,
+                                depends_on=old_scan.report_path)
+        if cached is not None:
+            yield from cached['changes']
+            return
+
+        changes = []
+        for change in iter_diff(self._iter_scan_hosts(old_scan), self._iter_scan_hosts(new_scan)):
+            changes.append(change)
+            yield change
+
+        self.cache.put(new_scan.report_path, 'diff',
+                       {'summary': summarize_changes(changes), 'changes': changes},
+                       variant=old_scan.id, depends_on=old_scan.report_path)
+
+    def get_report_diff(self, old_scan, new_scan):
+        """
+        Get the changes from one completed scan to another with a count per
+        change type
+        """
+        with phase('analyze'):
+            changes = list(self.iter_report_diff(old_scan, new_scan))
+            return {'summary': summarize_changes(changes), 'changes': changes}
+
     def delete_report(self, scan_id):
         """
         Delete a scan report
@@ -259,13 +624,205 @@ class ReportManager:
             return False
         
         try:
+            if scan.report_path:
+                self.cache.evict(scan.report_path)
+
             # Delete the report directory
             scan_dir = os.path.join(self.reports_dir, f"scan_{scan_id}")
             if os.path.exists(scan_dir):
-                import shutil
                 shutil.rmtree(scan_dir)
             
             return True
         except Exception as e:
             logging.error(f"Error deleting report for scan {scan_id}: {str(e)}")
             return False
+
+    def _scan_dir(self, scan):
+        """Get the directory holding a scan's files"""
+        if scan.report_path:
+            return os.path.dirname(os.path.abspath(scan.report_path))
+        return os.path.join(self.reports_dir, f"scan_{scan.id}")
+
+    def compress_report(self, scan_id):
+        """
+        Compress the report and error log of a finished scan in place. The
+        scan is pointed at the compressed report before the plain one is
+        removed, so readers never see it missing. Returns True if anything
+        was compressed.
+        """
+        scan = data_manager.get_scan(scan_id)
+        if not scan or scan.status in ('queued', 'running'):
+            return False
+
+        scan_dir = self._scan_dir(scan)
+        compressed = False
+        try:
+            for name in report_archive.ARCHIVED_FILES:
+                path = os.path.join(scan_dir, name)
+                if not os.path.exists(path):
+                    continue
+                compressed_path = report_archive.compress_file(path)
+                if compressed_path == path:
+                    continue
+                if scan.report_path and os.path.abspath(scan.report_path) == os.path.abspath(path):
+                    data_manager.update_scan_fields(scan_id, report_path=compressed_path)
+                os.remove(path)
+                compressed = True
+        except Exception as e:
+            logging.error(f"Error compressing report for scan {scan_id}: {str(e)}")
+            return False
+        return compressed
+
+    def compress_finished_reports(self):
+        """
+        Compress the reports of finished scans that are still stored plain,
+        such as those from before reports were compressed. Returns the
+        number of scans compressed.
+        """
+        if report_archive.compression_method() == 'none':
+            return 0
+        compressed = 0
+        for scan in data_manager.get_scans_by_status('completed', 'failed', 'cancelled'):
+            if scan.report_path and report_archive.is_compressed(scan.report_path):
+                continue
+            if self.compress_report(scan.id):
+                compressed += 1
+        if compressed:
+            logging.info(f"Compressed the reports of {compressed} scans")
+        return compressed
+
+    def apply_retention(self, keep_per_target=None, max_age_days=None):
+        """
+        Delete finished scans and their reports by retention policy: keep the
+        newest keep_per_target scans of each target (completed ones counted
+        apart from failures) and/or drop scans older than max_age_days.
+        Defaults come from FLANSCAN_KEEP_REPORTS_PER_TARGET and
+        FLANSCAN_REPORT_MAX_AGE_DAYS; with neither set nothing is deleted.
+        Returns the ids of the deleted scans.
+        """
+        if keep_per_target is None:
+            keep_per_target = int(os.environ.get('FLANSCAN_KEEP_REPORTS_PER_TARGET', 0)) or None
+        if max_age_days is None:
+            max_age_days = float(os.environ.get('FLANSCAN_REPORT_MAX_AGE_DAYS', 0)) or None
+        older_than = datetime.now() - timedelta(days=max_age_days) if max_age_days else None
+
+        deleted = []
+        for scan_id in data_manager.get_expired_scan_ids(keep_per_target, older_than):
+            if self.delete_report(scan_id):
+                data_manager.delete_scan(scan_id)
+                deleted.append(scan_id)
+        if deleted:
+            logging.info(f"Retention removed {len(deleted)} scans")
+        return deleted
+
+    def iter_export(self, scans):
+        """
+        Stream an archive (tar) of finished scans: a manifest with each
+        scan's record, then its report and error log as stored, compressed
+        or not. Derived files (caches, columnar copies) are left out and
+        rebuilt after an import.
+        """
+        scans = [scan for scan in scans if scan.status not in ('queued', 'running')]
+        files = []
+        for scan in scans:
+            scan_dir = self._scan_dir(scan)
+            for name in report_archive.ARCHIVED_FILES:
+                path = report_archive.find_file(scan_dir, name)
+                if path:
+                    files.append((f"scan_{scan.id}/{os.path.basename(path)}", path))
+        manifest = {'version': 1, 'scans': [scan.to_dict() for scan in scans]}
+        return report_archive.iter_archive(manifest, files)
+
+    def import_reports(self, fileobj):
+        """
+        Import an archive written by iter_export, read as a stream. Files are
+        staged in a temporary directory under reports/, and the scans are
+        added in one transaction only once the whole archive has been read,
+        so a truncated or broken upload leaves nothing behind. Every scan
+        gets a new id; its report is the file named by the report path in the
+        manifest. Completed scans are indexed for findings. Raises ValueError
+        for an archive that does not start with a manifest. Returns the new
+        scan ids.
+        """
+        os.makedirs(self.reports_dir, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix='.import-', dir=self.reports_dir)
+        added, moved = [], []
+        try:
+            staged = self._stage_import(fileobj, staging)
+            scans = [scan for scan, _, _ in staged]
+            report_names = {scan: report_name for scan, _, report_name in staged}
+
+            def report_path(scan):
+                name = report_names[scan]
+                return os.path.join(self.reports_dir, f"scan_{scan.id}", name) if name else None
+
+            added = data_manager.add_scans(scans, report_path)
+
+            for scan, staged_dir, _ in staged:
+                if not os.path.isdir(staged_dir):
+                    continue
+                scan_dir = os.path.join(self.reports_dir, f"scan_{scan.id}")
+                os.makedirs(scan_dir, exist_ok=True)
+                moved.append(scan_dir)
+                for name in os.listdir(staged_dir):
+                    os.replace(os.path.join(staged_dir, name), os.path.join(scan_dir, name))
+        except BaseException:
+            for scan_id in added:
+                data_manager.delete_scan(scan_id)
+            for scan_dir in moved:
+                shutil.rmtree(scan_dir, ignore_errors=True)
+            raise
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+        for scan in scans:
+            if scan.status == 'completed':
+                self.index_findings(scan.id)
+        return added
+
+    def _stage_import(self, fileobj, staging):
+        """
+        Read a report archive into a staging directory, one subdirectory per
+        scan. Returns (scan, staged directory, report file name or None) for
+        each scan of the manifest, the scans not yet stored.
+        """
+        manifest_scans = None
+        with tarfile.open(fileobj=fileobj, mode='r|*') as tar:
+            for member in tar:
+                if manifest_scans is None:
+                    if member.name != report_archive.MANIFEST_NAME:
+                        raise ValueError("Not a report archive: the manifest must come first")
+                    manifest = json.load(tar.extractfile(member))
+                    manifest_scans = {data['id']: data for data in manifest.get('scans', [])
+                                      if data.get('status') not in ('queued', 'running')}
+                    if not manifest_scans:
+                        break
+                    continue
+
+                old_dir, _, name = member.name.partition('/')
+                old_id = old_dir[len('scan_'):] if old_dir.startswith('scan_') else ''
+                if (not old_id.isdigit() or int(old_id) not in manifest_scans or not member.isfile()
+                        or not report_archive.archive_member_name(name)):
+                    logging.warning(f"Skipping {member.name} in report archive")
+                    continue
+
+                staged_dir = os.path.join(staging, old_dir)
+                os.makedirs(staged_dir, exist_ok=True)
+                with tar.extractfile(member) as src, open(os.path.join(staged_dir, name), 'wb') as dst:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+
+        staged = []
+        for old_id, data in (manifest_scans or {}).items():
+            staged_dir = os.path.join(staging, f"scan_{old_id}")
+            # The report is the file the exported record pointed at, whatever
+            # else the archive holds; older records fall back to a lookup
+            report_name = os.path.basename(data['report_path']) if data.get('report_path') else None
+            if not report_name or not os.path.exists(os.path.join(staged_dir, report_name)):
+                found = report_archive.find_file(staged_dir, 'report.xml')
+                report_name = os.path.basename(found) if found else None
+            scan = Scan.from_dict(dict(data, id=None, report_path=None))
+            staged.append((scan, staged_dir, report_name))
+        return staged
+
+# Create a global instance
+report_manager = ReportManager()
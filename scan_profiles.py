@@ -0,0 +1,130 @@
+import re
+
+# Accepted values for the options a scan can set; anything else is rejected
+# before it gets near the nmap command line
+OPTION_PATTERNS = {
+    'ports': re.compile(r'^[TUSP:0-9,\-]+$'),
+    'scripts': re.compile(r'^[A-Za-z0-9_\-,*]+$'),
+    'host_timeout': re.compile(r'^\d+(ms|s|m|h)?$'),
+}
+
+OPTIONS = ('timing', 'min_rate', 'host_timeout', 'ports', 'top_ports', 'max_parallelism',
+           'version_detection', 'scripts')
+
+
+class ScanProfile:
+    """
+    Named set of nmap options: scan depth (version detection, scripts),
+    timing template, packet rate, host timeout, port scope and parallelism
+    """
+    def __init__(self, name, label, version_detection=True, scripts=None, timing=None,
+                 min_rate=None, host_timeout=None, ports=None, top_ports=None,
+                 max_parallelism=None):
+        self.name = name
+        self.label = label
+        self.version_detection = version_detection
+        self.scripts = scripts  # comma separated NSE scripts or categories
+        self.timing = timing  # nmap -T template, 0-5
+        self.min_rate = min_rate
+        self.host_timeout = host_timeout
+        self.ports = ports  # nmap -p spec; overrides top_ports
+        self.top_ports = top_ports
+        self.max_parallelism = max_parallelism
+
+    def options(self):
+        """Get the option values, as stored with a scan"""
+        return {option: getattr(self, option) for option in OPTIONS}
+
+    def with_options(self, options):
+        """
+        Get a copy of this profile with some options changed.
+        Raises ValueError for unknown options or invalid values.
+        """
+        values = self.options()
+        for option, value in (options or {}).items():
+            if option not in OPTIONS:
+                raise ValueError(f"Unknown scan option: {option}")
+            values[option] = _validate_option(option, value)
+        return ScanProfile(self.name, self.label, **values)
+
+    def _scope_args(self):
+        """Options shared by the deep scan and the discovery pass"""
+        args = []
+        if self.timing is not None:
+            args.append(f"-T{self.timing}")
+        if self.min_rate:
+            args += ["--min-rate", str(self.min_rate)]
+        if self.host_timeout:
+            args += ["--host-timeout", self.host_timeout]
+        if self.ports:
+            args += ["-p", self.ports]
+        elif self.top_ports:
+            args += ["--top-ports", str(self.top_ports)]
+        if self.max_parallelism:
+            args += ["--max-parallelism", str(self.max_parallelism)]
+        return args
+
+    def nmap_args(self):
+        """Get the nmap options of a scan with this profile"""
+        args = []
+        if self.version_detection:
+            args.append("-sV")  # Version detection
+        if self.scripts:
+            args.append(f"--script={self.scripts}")
+        return args + self._scope_args()
+
+    def discovery_args(self):
+        """
+        Get the nmap options of the discovery pass of an incremental scan:
+        the same ports and timing, but no probes or scripts
+        """
+        args = self._scope_args()
+        if self.timing is None:
+            args.insert(0, "-T4")
+        return args + ["--open"]
+
+
+def _validate_option(option, value):
+    """Convert and check one option value; empty values reset the option"""
+    if value is None or value == '':
+        return None
+    if option == 'version_detection':
+        return value in (True, 1, '1', 'true', 'on')
+    if option == 'timing':
+        value = int(value)
+        if not 0 <= value <= 5:
+            raise ValueError("Timing template must be between 0 and 5")
+        return value
+    if option in ('min_rate', 'top_ports', 'max_parallelism'):
+        value = int(value)
+        if value <= 0:
+            raise ValueError(f"{option} must be a positive number")
+        return value
+
+    value = str(value).strip()
+    if not OPTION_PATTERNS[option].match(value):
+        raise ValueError(f"Invalid {option}: {value}")
+    return value
+
+
+# Built-in profiles, from fastest to most thorough
+PROFILES = {
+    'quick': ScanProfile('quick', 'Quick (top 100 ports, no service detection)',
+                         version_detection=False, timing=4, top_ports=100),
+    'service': ScanProfile('service', 'Services (version detection, no scripts)',
+                           timing=4),
+    'vuln': ScanProfile('vuln', 'Full vulnerability scan', scripts='vuln'),
+    'custom': ScanProfile('custom', 'Custom scripts', scripts='default'),
+}
+
+DEFAULT_PROFILE = 'vuln'
+
+
+def get_profile(name, options=None):
+    """
+    Get a built-in profile with the given options applied.
+    Raises ValueError for an unknown profile or invalid options.
+    """
+    if name not in PROFILES:
+        raise ValueError(f"Unknown scan profile: {name}")
+    return PROFILES[name].with_options(options)
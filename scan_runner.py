@@ -0,0 +1,19 @@
+import logging
+
+from scanner import Scanner
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+
+def main():
+    """
+    Run queued scans until stopped. Start one or more next to the web app;
+    they share the queue through the scan store and recover each other's
+    scans if one dies.
+    """
+    Scanner().run_forever()
+
+
+if __name__ == '__main__':
+    main()
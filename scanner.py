@@ -1,38 +1,169 @@
 import os
-import subprocess
+import sys
+import math
+import shlex
+import signal
+import socket
+import asyncio
+import uuid
 import threading
+import time
 import logging
-import json
 import xml.etree.ElementTree as ET
-from datetime import datetime
-from data_manager import data_manager, Scan
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from data_manager import data_manager
+from report_manager import report_manager
+from sharding import shard_targets, merge_reports, validate_target
+from incremental import host_fingerprints, plan_rescan
+from scan_profiles import get_profile
+from report_archive import compress_file
+from metrics import NMAP_SECONDS, SCAN_QUEUE_WAIT_SECONDS, SCAN_SECONDS
+
+# Used for queue estimates until enough scans have completed
+DEFAULT_SCAN_DURATION = timedelta(minutes=5)
+
+# How often nmap reports task progress, and how often we store it
+NMAP_STATS_INTERVAL = '10s'
+PROGRESS_WRITE_INTERVAL = 5.0
+
+# Bytes read from an nmap pipe at a time. The pipe reader buffers at most
+# twice this before it stops reading, so nmap blocks on a slow consumer
+# instead of the runner's memory growing.
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Bytes at the end of nmap's stdout and stderr kept for error reports
+OUTPUT_TAIL_BYTES = 8192
+
+
+def target_key(target):
+    """Normalize a target for the per-target concurrency limit"""
+    return target.strip().lower()
+
+
+def _use_pidfd_child_watcher(loop):
+    """
+    Have a loop learn of exited nmap processes through pidfds. Before Python
+    3.12 asyncio otherwise waits for each child on a thread of its own.
+    """
+    if sys.version_info >= (3, 12) or not hasattr(os, 'pidfd_open'):
+        return
+    try:
+        os.close(os.pidfd_open(os.getpid()))
+    except OSError:
+        return  # Kernel without pidfd support
+    watcher = asyncio.PidfdChildWatcher()
+    watcher.attach_loop(loop)
+    asyncio.set_child_watcher(watcher)
+
+
+class ScanProgress:
+    """
+    Live progress of a running scan, combined over its shards and written to
+    the store at most every PROGRESS_WRITE_INTERVAL seconds. Only used from
+    the scan runner's event loop.
+    """
+    def __init__(self, scan_id, shard_count):
+        self.scan_id = scan_id
+        self.shard_percent = [0.0] * shard_count
+        self.task = None
+        self.hosts_done = 0
+        self._written_at = 0.0
+        # Shards flush concurrently; one write at a time keeps the newest last
+        self._write_lock = asyncio.Lock()
+
+    def host_done(self, count=1):
+        self.hosts_done += count
+
+    def task_progress(self, shard_index, task, percent):
+        self.task = task
+        self.shard_percent[shard_index] = percent
+
+    def shard_done(self, shard_index):
+        self.shard_percent[shard_index] = 100.0
+
+    async def flush(self, force=False):
+        """Write the current progress to the store unless it was written recently"""
+        now = time.monotonic()
+        if not force and now - self._written_at < PROGRESS_WRITE_INTERVAL:
+            return
+        self._written_at = now
+        async with self._write_lock:
+            percent = sum(self.shard_percent) / len(self.shard_percent)
+            await asyncio.to_thread(data_manager.update_scan_fields, self.scan_id,
+                                    only_if_status=['running'],
+                                    progress=round(percent, 1),
+                                    progress_task=self.task,
+                                    hosts_done=self.hosts_done)
 
 
 class Scanner:
 
-    def __init__(self):
-        self.active_scans = {}
+    def __init__(self, max_concurrent=None, max_per_target=None):
+        self.active_scans = {}  # scan_id -> nmap processes (asyncio.subprocess.Process)
         self.reports_dir = os.path.join(os.getcwd(), 'reports')
 
+        # Scheduler: queued scans are durable jobs in the store. A scan runner
+        # claims them and holds a lease on each running scan, renewed by
+        # heartbeats, so another runner can recover the scans of one that died.
+        # All scans of a runner and their nmap processes are supervised by one
+        # asyncio event loop on the runner's thread.
+        self.max_concurrent = max_concurrent or int(os.environ.get('FLANSCAN_MAX_CONCURRENT_SCANS', 2))
+        self.max_per_target = max_per_target or int(os.environ.get('FLANSCAN_MAX_SCANS_PER_TARGET', 1))
+        self.lease_seconds = float(os.environ.get('FLANSCAN_LEASE_SECONDS', 30))
+        self.max_attempts = int(os.environ.get('FLANSCAN_SCAN_MAX_ATTEMPTS', 2))
+        self.poll_interval = float(os.environ.get('FLANSCAN_RUNNER_POLL_SECONDS', 5))
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._running = {}  # scan_id -> Scan, for scans this runner is running
+        self._stopping = threading.Event()
+        self._loop = None
+        self._thread = None
+        self._tasks = set()
+
+        # Store writes, report merging and indexing block, so they run on a
+        # bounded pool of threads; scans queue for it when it is busy
+        self.io_threads = int(os.environ.get('FLANSCAN_RUNNER_IO_THREADS', min(32, (os.cpu_count() or 1) + 4)))
+
+        # Large targets are split into shards that share a budget of nmap processes
+        self.shard_size = int(os.environ.get('FLANSCAN_SHARD_SIZE', 256))
+        self.shard_retries = int(os.environ.get('FLANSCAN_SHARD_RETRIES', 2))
+        # Largest target accepted (in addresses) and most shards one scan is split into
+        self.max_target_hosts = int(os.environ.get('FLANSCAN_MAX_TARGET_HOSTS', 65536))
+        self.max_shards = int(os.environ.get('FLANSCAN_MAX_SHARDS', 1024))
+        self.max_nmap_processes = int(os.environ.get('FLANSCAN_MAX_NMAP_PROCESSES', os.cpu_count() or 1))
+        self._cancelled = set()
+
+        # Wall-clock limit of a scan's nmap runs (0: none), and how long nmap
+        # gets to exit after SIGTERM before it is killed
+        self.scan_timeout = float(os.environ.get('FLANSCAN_SCAN_TIMEOUT_SECONDS', 0))
+        self.kill_grace = float(os.environ.get('FLANSCAN_NMAP_KILL_GRACE_SECONDS', 10))
+        self._deadlines = {}  # scan_id -> event loop time its nmap runs must end by
+        self._stopping_pids = set()
+
+        # Incremental scans deep scan unchanged hosts again once their last deep scan is this old
+        self.deep_scan_max_age = timedelta(hours=float(os.environ.get('FLANSCAN_DEEP_SCAN_MAX_AGE_HOURS', 168)))
+
+        # Report retention and compression run this often (seconds)
+        self.maintenance_interval = float(os.environ.get('FLANSCAN_MAINTENANCE_SECONDS', 3600))
+
+        # The nmap command, e.g. a full path or benchmarks/fake_nmap.py for load tests
+        self.nmap_command = shlex.split(os.environ.get('FLANSCAN_NMAP', 'nmap'))
+
         # Create reports directory if it doesn't exist
         if not os.path.exists(self.reports_dir):
             os.makedirs(self.reports_dir)
 
-    def _run_scan(self, scan_id, target):
+    async def _run_scan(self, scan_id, target):
         """
-        Run Nmap directly against the specified target
+        Run Nmap against the specified target, split into parallel shards
+        if it covers more than shard_size hosts
         """
-        logging.debug(f"Starting scan {scan_id} for target {target}")
-
-        # Update scan status to running
-        scan = data_manager.get_scan(scan_id)
+        # The scan was set to running when this runner claimed it
+        scan = await asyncio.to_thread(data_manager.get_scan, scan_id)
         if not scan:
             logging.error(f"Scan {scan_id} not found")
             return
 
-        scan.status = 'running'
-        data_manager.update_scan(scan)
-
         # Create a directory for this scan's reports
         scan_dir = os.path.join(self.reports_dir, f"scan_{scan_id}")
         if not os.path.exists(scan_dir):
@@ -42,86 +173,688 @@ class Scanner:
         xml_report_path = os.path.join(scan_dir, 'report.xml')
 
         try:
-            # Prepare the Nmap command with vulnerability scanning scripts
-            nmap_cmd = [
-                "nmap",
-                "-sV",  # Version detection
-                "--script=vuln",  # Run vulnerability scanning scripts
-                "-oX",
-                xml_report_path,  # Output to XML file
-                target  # Target to scan
-            ]
-
-            # Run the Nmap command
-            process = subprocess.Popen(nmap_cmd,
-                                       stdout=subprocess.PIPE,
-                                       stderr=subprocess.PIPE,
-                                       text=True)
-
-            # Store the process in active_scans for potential cancellation
-            self.active_scans[scan_id] = process
-
-            # Wait for the process to complete
-            stdout, stderr = process.communicate()
-
-            # Process has completed, remove from active_scans
-            if scan_id in self.active_scans:
-                del self.active_scans[scan_id]
-
-            # Check if the scan completed successfully
-            if process.returncode == 0:
-                # Parse the report and update the data
-                if os.path.exists(xml_report_path):
-                    scan.status = 'completed'
-                    scan.end_time = datetime.now()
-                    scan.report_path = xml_report_path
-                    data_manager.update_scan(scan)
-                    logging.debug(f"Scan {scan_id} completed successfully")
-                else:
-                    scan.status = 'failed'
-                    scan.end_time = datetime.now()
-                    data_manager.update_scan(scan)
-                    logging.error(f"Scan {scan_id} output file not found")
+            # Checked when the scan was submitted, and again for rows written by anything else
+            validate_target(target, self.max_target_hosts)
+            profile = get_profile(scan.profile, scan.scan_options)
+
+            # Reports merged in besides the shards: (path, addresses to copy)
+            extra_reports = []
+            if scan.incremental:
+                plan = await self._plan_incremental(scan_id, scan, scan_dir, profile)
+                if plan is not None:
+                    target, extra_reports = plan
+
+            shards = (await asyncio.to_thread(shard_targets, target, self.shard_size, self.max_shards)
+                      if target else [])
+            if len(shards) == 1 and not extra_reports:
+                shard_paths = [xml_report_path]
             else:
-                # Scan failed
-                scan.status = 'failed'
-                scan.end_time = datetime.now()
-                data_manager.update_scan(scan)
-                logging.error(f"Scan {scan_id} failed: {stderr}")
+                if len(shards) > 1:
+                    logging.debug(f"Scan {scan_id} split into {len(shards)} shards")
+                    await asyncio.to_thread(data_manager.set_scan_shards, scan_id, shards)
+                shard_paths = [os.path.join(scan_dir, f"shard_{index}.xml")
+                               for index in range(len(shards))]
 
-                # Write error to a file for reference
-                error_file = os.path.join(scan_dir, 'error.log')
-                with open(error_file, 'w') as f:
-                    f.write(f"STDOUT:\n{stdout}\n\nSTDERR:\n{stderr}")
+            progress = ScanProgress(scan_id, max(len(shards), 1))
+            errors = (await self._run_shards(scan_id, shards, shard_paths, progress, profile.nmap_args())
+                      if shards else [])
+
+            if scan_id in self._cancelled:
+                # The scan keeps the cancelled status set by the cancel request
+                logging.debug(f"Scan {scan_id} was cancelled")
+            elif not errors:
+                await asyncio.to_thread(self._complete_scan, scan_id, scan_dir, xml_report_path,
+                                        shard_paths, extra_reports)
+            else:
+                await asyncio.to_thread(self._fail_scan, scan_id, scan_dir, errors, len(shards))
 
         except Exception as e:
             logging.error(f"Error during scan {scan_id}: {str(e)}")
             # Mark the scan as failed
-            scan.status = 'failed'
-            scan.end_time = datetime.now()
-            data_manager.update_scan(scan)
+            await asyncio.to_thread(data_manager.update_scan_fields, scan_id, only_if_status=['running'],
+                                    status='failed',
+                                    end_time=datetime.now())
+        finally:
+            self.active_scans.pop(scan_id, None)
+
+    def _complete_scan(self, scan_id, scan_dir, xml_report_path, shard_paths, extra_reports):
+        """Merge the shards of a successful scan into its report and record it (runs on an I/O thread)"""
+        if shard_paths != [xml_report_path]:
+            merge_reports(shard_paths + [path for path, _ in extra_reports], xml_report_path,
+                          [None] * len(shard_paths) + [hosts for _, hosts in extra_reports])
+            for path in shard_paths:
+                os.remove(path)
+        discovery_path = os.path.join(scan_dir, 'discovery.xml')
+        if os.path.exists(discovery_path):
+            os.remove(discovery_path)
+
+        # Finished reports are kept compressed; readers decompress as they stream
+        report_path = compress_file(xml_report_path)
+        if report_path != xml_report_path:
+            os.remove(xml_report_path)
+
+        data_manager.update_scan_fields(scan_id, only_if_status=['running'],
+                                        status='completed',
+                                        end_time=datetime.now(),
+                                        report_path=report_path,
+                                        progress=100.0)
+        logging.debug(f"Scan {scan_id} completed successfully")
+
+        # Parse the finished report once so page views hit the cache
+        report_manager.warm_cache(scan_id)
+        report_manager.index_findings(scan_id)
+        report_manager.discard_partial(scan_id)
+
+    def _fail_scan(self, scan_id, scan_dir, errors, shard_count):
+        """Record a failed scan and its errors (runs on an I/O thread)"""
+        # A cancelled scan keeps its cancelled status
+        data_manager.update_scan_fields(scan_id, only_if_status=['running'],
+                                        status='failed',
+                                        end_time=datetime.now())
+        logging.error(f"Scan {scan_id} failed: {len(errors)} of {shard_count} nmap runs failed")
+
+        # Write error to a file for reference
+        error_file = os.path.join(scan_dir, 'error.log')
+        with open(error_file, 'w') as f:
+            f.write('\n\n'.join(errors))
+        if compress_file(error_file) != error_file:
+            os.remove(error_file)
+
+    async def _plan_incremental(self, scan_id, scan, scan_dir, profile):
+        """
+        Run the discovery pass of an incremental scan and compare it with the
+        last completed scan of the same target and profile. Returns the hosts
+        to deep scan (as a target string) and the reports to merge the other
+        hosts from, or None to fall back to a full scan.
+        """
+        previous = await asyncio.to_thread(data_manager.get_previous_completed_scan, scan, same_profile=True)
+        if not previous or not previous.report_path or not os.path.exists(previous.report_path):
+            logging.debug(f"Scan {scan_id}: no earlier report of {scan.target}, running a full scan")
+            return None
+
+        # Discovery is sharded like a full scan so it stays within the nmap process budget
+        discovery_path = os.path.join(scan_dir, 'discovery.xml')
+        shards = await asyncio.to_thread(shard_targets, scan.target, self.shard_size, self.max_shards)
+        shard_paths = ([discovery_path] if len(shards) == 1 else
+                       [os.path.join(scan_dir, f"discovery_{index}.xml") for index in range(len(shards))])
+        errors = await self._run_shards(scan_id, shards, shard_paths, ScanProgress(scan_id, len(shards)),
+                                        profile.discovery_args(), discovery=True)
+        if scan_id in self._cancelled:
+            return '', []
+        if errors:
+            logging.warning(f"Scan {scan_id}: discovery pass failed, running a full scan\n{errors[0]}")
+            for path in shard_paths:
+                if os.path.exists(path):
+                    os.remove(path)
+            return None
+        if len(shards) > 1:
+            await asyncio.to_thread(self._merge_discovery, shard_paths, discovery_path)
+
+        previous_time = (previous.end_time or previous.start_time).timestamp()
+        deep, carry = await asyncio.to_thread(
+            lambda: plan_rescan(host_fingerprints(discovery_path),
+                                host_fingerprints(previous.report_path),
+                                self.deep_scan_max_age.total_seconds(), time.time(), previous_time))
+        logging.info(f"Scan {scan_id}: deep scanning {len(deep)} hosts, "
+                     f"carrying {len(carry)} forward from scan {previous.id}")
+
+        extra_reports = [(previous.report_path, carry)] if carry else []
+        if not deep:
+            # Nothing to deep scan: the discovery run provides the report header
+            extra_reports.insert(0, (discovery_path, set()))
+        return ' '.join(deep), extra_reports
+
+    async def _run_shards(self, scan_id, shards, shard_paths, progress, nmap_args, discovery=False):
+        """
+        Run every shard of a scan, in parallel up to the nmap process budget.
+        Returns the error text of each shard that failed.
+
+        Shards of a discovery pass are not recorded in the store, not retried
+        (a failed pass falls back to a full scan) and save no live hosts.
+        """
+        if len(shards) == 1 or discovery:
+            results = await asyncio.gather(*(
+                self._run_shard(scan_id, index, shards[index], shard_paths[index], progress, nmap_args,
+                                sharded=False, live_hosts=not discovery)
+                for index in range(len(shards))))
+            return [error for error in results if error]
+
+        results = await asyncio.gather(*(
+            self._run_shard(scan_id, index, shards[index], shard_paths[index], progress, nmap_args)
+            for index in range(len(shards))))
+        return [error for error in results if error]
+
+    @staticmethod
+    def _merge_discovery(shard_paths, discovery_path):
+        """Merge the shards of a discovery pass into one report (runs on an I/O thread)"""
+        merge_reports(shard_paths, discovery_path)
+        for path in shard_paths:
+            os.remove(path)
+
+    async def _run_shard(self, scan_id, index, target, output_path, progress, nmap_args, sharded=True,
+                         live_hosts=True):
+        """
+        Run nmap for one shard, retrying failed runs of sharded scans.
+        Returns None on success or the error text of the last attempt.
+        """
+        error = None
+        attempts = self.shard_retries + 1 if sharded else 1
+        for attempt in range(1, attempts + 1):
+            if scan_id in self._cancelled:
+                return 'Scan cancelled'
+            if self._timed_out(scan_id):
+                error = f"Scan timed out after {self.scan_timeout:g} seconds"
+                break
+
+            if sharded:
+                await asyncio.to_thread(data_manager.update_shard, scan_id, index,
+                                        status='running', attempts=attempt)
+
+            async with self._nmap_slots:
+                # The scan may have been cancelled or run out of time while waiting for the slot
+                if scan_id in self._cancelled or self._timed_out(scan_id):
+                    returncode, stdout, stderr = None, '', f"Scan timed out after {self.scan_timeout:g} seconds"
+                else:
+                    returncode, stdout, stderr = await self._run_nmap(scan_id, target, output_path,
+                                                                      progress, index, nmap_args,
+                                                                      live_hosts)
+
+            if scan_id in self._cancelled:
+                if sharded:
+                    await asyncio.to_thread(data_manager.update_shard, scan_id, index, status='cancelled')
+                return 'Scan cancelled'
+
+            if returncode == 0 and os.path.exists(output_path):
+                if sharded:
+                    await asyncio.to_thread(data_manager.update_shard, scan_id, index,
+                                            status='completed', error=None)
+                progress.shard_done(index)
+                await progress.flush(force=True)
+                return None
+
+            if returncode is None:
+                error = f"TARGET: {target}\n{stderr}"
+            elif returncode == 0:
+                error = f"Nmap output file not found for {target}"
+            else:
+                error = f"TARGET: {target}\nSTDOUT:\n{stdout}\n\nSTDERR:\n{stderr}"
+            if sharded:
+                await asyncio.to_thread(data_manager.update_shard, scan_id, index, error=error[-2000:])
+            logging.warning(f"Scan {scan_id} nmap run for {target} failed (attempt {attempt} of {attempts})")
+
+        if sharded:
+            await asyncio.to_thread(data_manager.update_shard, scan_id, index, status='failed')
+        return error
+
+    def _timed_out(self, scan_id):
+        """Whether a scan has run past its wall-clock limit"""
+        deadline = self._deadlines.get(scan_id)
+        return deadline is not None and self._loop.time() >= deadline
+
+    async def _run_nmap(self, scan_id, target, output_path, progress, shard_index=0,
+                        nmap_args=(), live_hosts=True):
+        """
+        Run one nmap process and wait for it; returns (returncode, stdout, stderr),
+        the last two being the ends of nmap's output.
+
+        The XML report is streamed on stdout: it is copied to output_path as it
+        arrives, and unless live_hosts is False each host is parsed and saved to
+        the partial results as soon as nmap has finished with it. A run still
+        going at the scan's deadline is stopped and returns returncode None.
+        """
+        # Prepare the Nmap command with the scan profile's options
+        nmap_cmd = self.nmap_command + list(nmap_args) + [
+            "--stats-every", NMAP_STATS_INTERVAL,  # Emit <taskprogress> while running
+            "-oX", "-",  # Stream XML on stdout
+            "--",  # Targets only from here on, never options
+        ] + validate_target(target)  # Targets to scan
+
+        # Run the Nmap command
+        process = await asyncio.create_subprocess_exec(*nmap_cmd,
+                                                       stdout=asyncio.subprocess.PIPE,
+                                                       stderr=asyncio.subprocess.PIPE,
+                                                       limit=STREAM_CHUNK_SIZE)
+
+        # Store the process in active_scans for potential cancellation, and in
+        # the store so a new runner can stop it if this one dies
+        self.active_scans.setdefault(scan_id, set()).add(process)
+        if scan_id in self._cancelled:
+            self._spawn(self._stop_process(process))
+
+        started = time.monotonic()
+        outcome = 'failed'
+        try:
+            await asyncio.to_thread(data_manager.add_scan_process, scan_id, process.pid, self.owner)
+            async with asyncio.timeout_at(self._deadlines.get(scan_id)):
+                stdout, stderr = await asyncio.gather(
+                    self._consume_xml_stream(scan_id, process.stdout, output_path,
+                                             progress, shard_index, live_hosts),
+                    self._read_tail(process.stderr))
+                await process.wait()
+            outcome = 'ok' if process.returncode == 0 else 'failed'
+            return process.returncode, stdout, stderr
+        except TimeoutError:
+            outcome = 'timeout'
+            logging.warning(f"Scan {scan_id} ran past its {self.scan_timeout:g} second limit, "
+                            f"stopping nmap for {target}")
+            await self._stop_process(process)
+            return None, '', f"Scan timed out after {self.scan_timeout:g} seconds"
+        finally:
+            if process.returncode is None:
+                # Runner shutting down, or reading the output failed
+                await self._stop_process(process)
+            self.active_scans.get(scan_id, set()).discard(process)
+            await asyncio.to_thread(data_manager.remove_scan_process, scan_id, process.pid)
+            NMAP_SECONDS.observe(time.monotonic() - started, outcome=outcome)
+
+    async def _stop_process(self, process):
+        """Stop an nmap process: SIGTERM, then SIGKILL if it has not exited after the grace period"""
+        if process.returncode is not None:
+            return
+        if process.pid in self._stopping_pids:
+            # Signalling again could reap the process behind asyncio's back
+            await process.wait()
+            return
+        self._stopping_pids.add(process.pid)
+        try:
+            process.terminate()
+            try:
+                await asyncio.wait_for(process.wait(), self.kill_grace)
+            except TimeoutError:
+                logging.warning(f"nmap process {process.pid} ignored SIGTERM for "
+                                f"{self.kill_grace:g} seconds, killing it")
+                process.kill()
+                await process.wait()
+        except ProcessLookupError:
+            pass
+        finally:
+            self._stopping_pids.discard(process.pid)
+
+    @staticmethod
+    async def _read_tail(stream):
+        """Read a stream to its end as it is written, keeping only the end of it"""
+        tail = b''
+        while True:
+            data = await stream.read(STREAM_CHUNK_SIZE)
+            if not data:
+                return tail.decode('utf-8', 'replace')
+            tail = (tail + data)[-OUTPUT_TAIL_BYTES:]
+
+    async def _consume_xml_stream(self, scan_id, stream, output_path, progress, shard_index,
+                                  live_hosts=True):
+        """
+        Copy nmap's XML stream to output_path while parsing it incrementally.
+        Each chunk is fully handled, hosts saved and progress written, before
+        the next is read. Returns the end of the stream for error reports.
+        """
+        parser = ET.XMLPullParser(events=('start', 'end'))
+        root = None
+        depth = 0
+        tail = b''
+
+        with open(output_path, 'wb') as out:
+            while True:
+                data = await stream.read(STREAM_CHUNK_SIZE)
+                if not data:
+                    break
+                out.write(data)
+                tail = (tail + data)[-OUTPUT_TAIL_BYTES:]
+                if parser is None:
+                    continue
+
+                hosts = []
+                try:
+                    parser.feed(data)
+                    for event, elem in parser.read_events():
+                        if event == 'start':
+                            depth += 1
+                            if depth == 1:
+                                root = elem
+                            continue
+
+                        depth -= 1
+                        if depth != 1:
+                            continue
+
+                        # A direct child of <nmaprun> is complete
+                        if elem.tag == 'host' and live_hosts:
+                            hosts.append(report_manager._parse_host(elem))
+                        elif elem.tag == 'taskprogress':
+                            progress.task_progress(shard_index, elem.get('task'),
+                                                   float(elem.get('percent', 0)))
+                        root.clear()
+                except (ET.ParseError, ValueError) as e:
+                    # Keep writing the report; only live results are lost
+                    logging.warning(f"Scan {scan_id}: cannot parse live nmap output: {str(e)}")
+                    parser = None
+
+                if hosts:
+                    await asyncio.to_thread(self._save_partial_hosts, scan_id, hosts)
+                    progress.host_done(len(hosts))
+                await progress.flush()
+
+        return tail.decode('utf-8', 'replace')
+
+    @staticmethod
+    def _save_partial_hosts(scan_id, hosts):
+        """Append hosts to the partial results of a running scan (runs on an I/O thread)"""
+        for host in hosts:
+            report_manager.append_partial_host(scan_id, host)
 
     def start_scan(self, scan_id, target):
         """
-        Start a new scan in a separate thread
+        Queue a scan. The queued scan record is the job, priority and
+        submitter included: a scan runner claims it once a worker and the
+        target's slot are free.
         """
-        thread = threading.Thread(target=self._run_scan,
-                                  args=(scan_id, target))
-        thread.daemon = True
-        thread.start()
+        # Wake an in-process runner; others notice the new row
+        self._wake_runner()
         return True
 
+    def start_runner(self):
+        """
+        Start claiming and running queued scans in this process: recover
+        scans left behind by dead runners, then start the event loop thread
+        that runs the scans and the heartbeat
+        """
+        if self._thread is not None:
+            return
+        self.recover_stale_scans()
+        self._loop = asyncio.new_event_loop()
+        self._wake = asyncio.Event()
+        self._stop_event = asyncio.Event()
+        self._nmap_slots = asyncio.Semaphore(self.max_nmap_processes)
+        self._thread = threading.Thread(target=self._run_loop, daemon=True, name="scan-runner")
+        self._thread.start()
+        logging.info(f"Scan runner {self.owner} started for {self.max_concurrent} scans "
+                     f"and {self.max_nmap_processes} nmap processes")
+
+    def run_forever(self):
+        """Run scans until SIGTERM or SIGINT, then hand running scans back to the queue"""
+        signal.signal(signal.SIGTERM, lambda signum, frame: self._stopping.set())
+        signal.signal(signal.SIGINT, lambda signum, frame: self._stopping.set())
+        self.start_runner()
+        self._stopping.wait()
+        self.stop()
+
+    def stop(self):
+        """
+        Stop running scans: their nmap processes are terminated and the
+        scans go back to the queue for another runner. Waits for the runner
+        to finish, nmap processes included.
+        """
+        self._stopping.set()
+        if self._thread is None:
+            return
+        self._call_in_loop(self._stop_event.set)
+        self._thread.join(self.kill_grace + self.poll_interval + 5)
+
+    def _call_in_loop(self, callback, *args):
+        """Run a callback on the runner's event loop from any thread"""
+        try:
+            self._loop.call_soon_threadsafe(callback, *args)
+        except RuntimeError:
+            pass  # The loop has already closed
+
+    def _wake_runner(self):
+        """Make the runner look for queued scans right away"""
+        if self._loop is not None:
+            self._call_in_loop(self._wake.set)
+
+    def _spawn(self, coroutine):
+        """Run a coroutine as a task on the runner's loop, keeping a reference until it is done"""
+        task = asyncio.ensure_future(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def _run_loop(self):
+        """Body of the runner thread: the event loop supervising every scan"""
+        asyncio.set_event_loop(self._loop)
+        self._loop.set_default_executor(ThreadPoolExecutor(max_workers=self.io_threads,
+                                                           thread_name_prefix="scan-io"))
+        _use_pidfd_child_watcher(self._loop)
+        try:
+            self._loop.run_until_complete(self._main())
+            self._loop.run_until_complete(self._loop.shutdown_default_executor())
+        except Exception as e:
+            logging.error(f"Scan runner {self.owner} stopped unexpectedly: {str(e)}")
+        finally:
+            self._loop.close()
+
+    async def _main(self):
+        """Dispatch scans and send heartbeats until stopped, then requeue the running scans"""
+        dispatcher = self._spawn(self._dispatch())
+        heartbeat = self._spawn(self._heartbeat())
+        await self._stop_event.wait()
+        self._stopping.set()
+
+        # Let a claim in progress finish, so the scan it takes is requeued below
+        self._wake.set()
+        await asyncio.wait([dispatcher])
+        heartbeat.cancel()
+        running = list(self._running)
+        for scan_id in running:
+            self._cancel_local(scan_id)
+            await asyncio.to_thread(data_manager.release_scan, scan_id, self.owner, requeue=True)
+        # Scans wind down once their nmap processes have exited
+        scans = [task for task in self._tasks if task not in (dispatcher, heartbeat)]
+        if scans:
+            await asyncio.wait(scans, timeout=self.kill_grace + 5)
+        logging.info(f"Scan runner {self.owner} stopped, requeued {len(running)} scans")
+
+    async def _dispatch(self):
+        """
+        Claim eligible scans while this runner has room for more, and run
+        each one as a task on the loop
+        """
+        while not self._stopping.is_set():
+            self._wake.clear()
+            version = await asyncio.to_thread(data_manager.get_version)
+            while len(self._running) < self.max_concurrent and not self._stopping.is_set():
+                try:
+                    scan = await asyncio.to_thread(data_manager.claim_next_scan, self.owner,
+                                                   self.lease_seconds, self._choose_scan)
+                except Exception as e:
+                    logging.error(f"Error claiming a scan: {str(e)}")
+                    scan = None
+                if scan is None:
+                    break
+                self._running[scan.id] = scan
+                if self.scan_timeout:
+                    self._deadlines[scan.id] = self._loop.time() + self.scan_timeout
+                self._spawn(self._run_claimed(scan))
+
+            await self._wait_for_work(version, full=len(self._running) >= self.max_concurrent)
+
+    async def _wait_for_work(self, version, full):
+        """
+        Wait until a scan may be claimable: a scan of this runner finished or
+        one was submitted in this process (both wake the runner), or, with
+        room for more scans, the store changed in another process. Gives up
+        after the poll interval.
+        """
+        deadline = self._loop.time() + self.poll_interval
+        while not self._stopping.is_set():
+            remaining = deadline - self._loop.time()
+            if remaining <= 0:
+                return
+            try:
+                await asyncio.wait_for(self._wake.wait(), min(1.0, remaining))
+                return
+            except TimeoutError:
+                pass
+            if not full and await asyncio.to_thread(data_manager.get_version) != version:
+                return
+
+    async def _run_claimed(self, scan):
+        """Run a scan this runner claimed and hand it back when it is done"""
+        # A queued scan's start time is when it was submitted; it runs from its claim
+        SCAN_QUEUE_WAIT_SECONDS.observe(max(0.0, (scan.claimed_at - scan.start_time).total_seconds()))
+
+        try:
+            await self._run_scan(scan.id, scan.target)
+        except Exception as e:
+            logging.error(f"Unexpected error in scan runner for scan {scan.id}: {str(e)}")
+        finally:
+            self._running.pop(scan.id, None)
+            self._deadlines.pop(scan.id, None)
+            self._cancelled.discard(scan.id)
+            self._wake.set()
+            if not self._stopping.is_set():
+                await asyncio.to_thread(data_manager.release_scan, scan.id, self.owner)
+            finished = await asyncio.to_thread(data_manager.get_scan, scan.id)
+            SCAN_SECONDS.observe(max(0.0, (datetime.now() - scan.claimed_at).total_seconds()),
+                                 status=finished.status if finished else 'deleted')
+
+    def _choose_scan(self, queued, running, last_served):
+        """
+        Pick the next scan to claim from the queued scans (sorted by priority,
+        then age), or None.
+
+        The best priority wins. Between submitters with scans at that priority,
+        the one served least recently goes first, and each submitter's scans
+        run in FIFO order. Scans whose target is at its concurrency limit are
+        skipped.
+        """
+        busy = {}
+        for scan in running:
+            busy[target_key(scan.target)] = busy.get(target_key(scan.target), 0) + 1
+
+        best = None
+        for scan in queued:
+            if best is not None and scan.priority > best.priority:
+                break
+            if busy.get(target_key(scan.target), 0) >= self.max_per_target:
+                continue
+            if best is None or (last_served.get(scan.submitter) or '') < (last_served.get(best.submitter) or ''):
+                best = scan
+        return best
+
+    async def _heartbeat(self):
+        """
+        Renew the leases of running scans and stop the ones this runner lost,
+        because they were cancelled (from any web worker) or taken over after
+        the lease ran out. Also recovers scans of dead runners now and then,
+        and applies report retention and compression every maintenance interval.
+        """
+        interval = self.lease_seconds / 3
+        next_recovery = time.monotonic() + self.lease_seconds
+        next_maintenance = time.monotonic() + self.lease_seconds
+        maintenance = None
+        while not self._stopping.is_set():
+            await asyncio.sleep(interval)
+            running = list(self._running)
+            try:
+                held = await asyncio.to_thread(data_manager.renew_leases, self.owner, running,
+                                               self.lease_seconds)
+            except Exception as e:
+                logging.error(f"Error renewing scan leases: {str(e)}")
+                continue
+
+            for scan_id in set(running) - held:
+                logging.info(f"Scan {scan_id} is no longer running on this runner, stopping it")
+                self._cancel_local(scan_id)
+
+            if time.monotonic() >= next_recovery:
+                next_recovery = time.monotonic() + self.lease_seconds
+                await asyncio.to_thread(self.recover_stale_scans)
+
+            # Maintenance can take a while, so heartbeats go on meanwhile
+            if time.monotonic() >= next_maintenance and (maintenance is None or maintenance.done()):
+                next_maintenance = time.monotonic() + self.maintenance_interval
+                maintenance = self._spawn(asyncio.to_thread(self.maintain_reports))
+
+    def maintain_reports(self):
+        """
+        Apply the report retention policy and compress finished reports that
+        are still stored plain
+        """
+        try:
+            report_manager.apply_retention()
+            report_manager.compress_finished_reports()
+        except Exception as e:
+            logging.error(f"Error maintaining reports: {str(e)}")
+
+    def recover_stale_scans(self):
+        """
+        Requeue or fail the running scans whose runner stopped renewing its
+        lease, stopping any nmap processes it left behind on this host
+        """
+        try:
+            recovered = data_manager.recover_stale_scans(self.max_attempts)
+        except Exception as e:
+            logging.error(f"Error recovering stale scans: {str(e)}")
+            return []
+
+        for scan in recovered:
+            logging.warning(f"Recovered stale scan {scan['id']}: now {scan['status']}")
+            for owner, pid in scan['processes']:
+                self._kill_orphan(owner, pid)
+            report_manager.discard_partial(scan['id'])
+        return recovered
+
+    @staticmethod
+    def _kill_orphan(owner, pid):
+        """Terminate an nmap process left by a dead runner, if it ran on this host"""
+        if owner.split(':', 1)[0] != socket.gethostname():
+            return
+        try:
+            # Make sure the pid was not reused by something else
+            with open(f"/proc/{pid}/cmdline", 'rb') as f:
+                if b'nmap' not in f.read():
+                    return
+            os.kill(pid, signal.SIGTERM)
+            logging.warning(f"Terminated orphaned nmap process {pid}")
+        except (OSError, ValueError):
+            pass
+
+    def get_queue_info(self, scan_id, position=None):
+        """
+        Get the queue position and estimated start time of a queued scan.
+        The position comes from the shared store, so any web worker can answer;
+        callers that already know it can pass it in.
+        """
+        if position is None:
+            position = data_manager.get_queue_position(scan_id)
+        if position is None:
+            return None
+
+        return {
+            'queue_position': position,
+            'estimated_start': self.estimate_start(position)
+        }
+
+    def estimate_start(self, position):
+        """Estimate when the scan at a queue position will start"""
+        # Slots free up roughly every (average duration / concurrency)
+        recent = [scan.duration() for scan in data_manager.get_completed_scans()[:20]]
+        recent = [duration for duration in recent if duration]
+        average = sum(recent, timedelta()) / len(recent) if recent else DEFAULT_SCAN_DURATION
+        running = len(data_manager.get_scans_by_status('running'))
+        waves = math.ceil(max(0, position + running - self.max_concurrent) / self.max_concurrent)
+        return datetime.now() + average * waves
+
     def cancel_scan(self, scan_id):
         """
-        Cancel a running scan
+        Stop a cancelled scan right away if this process is running it.
+        The cancelled status in the store is what counts: a runner in any
+        other process stops the scan at its next heartbeat.
+        """
+        if self._loop is None or scan_id not in self._running:
+            return False
+        self._call_in_loop(self._cancel_local, scan_id)
+        return True
+
+    def _cancel_local(self, scan_id):
+        """
+        Stop the pending shards, retries and nmap processes of a scan run
+        here (on the runner's loop). nmap gets SIGTERM, then SIGKILL if it
+        has not exited after the grace period.
         """
-        if scan_id in self.active_scans:
-            process = self.active_scans[scan_id]
-            if process:
-                process.terminate()
-                del self.active_scans[scan_id]
-                return True
-        return False
+        self._cancelled.add(scan_id)
+        for process in self.active_scans.get(scan_id, ()):
+            self._spawn(self._stop_process(process))
 
     def get_scan_status(self, scan_id):
         """
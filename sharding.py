@@ -0,0 +1,227 @@
+import ipaddress
+import math
+import re
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import quoteattr
+
+from report_archive import open_report
+
+
+# One octet of an nmap IPv4 range: 10, 0-255, 1-, -50 or *
+_OCTET_RANGE = r'(?:\d{1,3}|\d{0,3}-\d{0,3}|\*)'
+NMAP_RANGE_PATTERN = re.compile(rf'^{_OCTET_RANGE}(?:\.{_OCTET_RANGE}){{3}}$')
+HOSTNAME_PATTERN = re.compile(
+    r'^(?=.{1,253}$)[A-Za-z0-9](?:[A-Za-z0-9-]{0,61}[A-Za-z0-9])?'
+    r'(?:\.[A-Za-z0-9](?:[A-Za-z0-9-]{0,61}[A-Za-z0-9])?)*\.?$')
+
+
+def split_target_list(target):
+    """
+    Split a target string into its items (comma and/or whitespace separated)
+    """
+    return [item for item in re.split(r'[\s,]+', target.strip()) if item]
+
+
+def _is_nmap_range(item):
+    """Whether an item is an nmap IPv4 octet range such as 10.0.0-3.1-254"""
+    if not NMAP_RANGE_PATTERN.match(item):
+        return False
+    for octet in item.split('.'):
+        if any(bound.isdigit() and int(bound) > 255 for bound in octet.split('-')):
+            return False
+    return True
+
+
+def validate_target_item(item):
+    """
+    Check that a target item is an address, a CIDR block, an nmap IPv4
+    range or a hostname, so it can never be read by nmap as an option.
+    Raises ValueError otherwise.
+    """
+    if item.startswith('-'):
+        raise ValueError(f"Invalid target: {item}")
+    try:
+        ipaddress.ip_network(item, strict=False)
+        return
+    except ValueError:
+        pass
+    if _is_nmap_range(item):
+        return
+    # Anything made of digits and dots is an address, not a hostname
+    if HOSTNAME_PATTERN.match(item) and not re.fullmatch(r'[\d.*-]+', item):
+        return
+    raise ValueError(f"Invalid target: {item}")
+
+
+def validate_target(target, max_hosts=None):
+    """
+    Check every item of a target string and, given max_hosts, that the
+    target covers at most that many addresses. Returns the items, or
+    raises ValueError.
+    """
+    items = split_target_list(target or '')
+    if not items:
+        raise ValueError("No target given")
+    for item in items:
+        validate_target_item(item)
+    if max_hosts:
+        hosts = sum(_count_hosts(item) for item in items)
+        if hosts > max_hosts:
+            raise ValueError(f"Target covers {hosts} addresses; at most {max_hosts} can be scanned at once")
+    return items
+
+
+def _count_hosts(item):
+    """Count the addresses an item covers; a hostname counts as one"""
+    try:
+        return ipaddress.ip_network(item, strict=False).num_addresses
+    except ValueError:
+        pass
+    if not _is_nmap_range(item):
+        return 1
+    count = 1
+    for octet in item.split('.'):
+        if octet == '*':
+            count *= 256
+        elif '-' in octet:
+            first, _, last = octet.partition('-')
+            count *= max(0, int(last or 255) - int(first or 0) + 1)
+    return count
+
+
+def _split_network(item, shard_size):
+    """
+    Split a CIDR item into subnets of at most shard_size addresses, keeping
+    them as CIDR strings so nmap command lines stay short
+    """
+    network = ipaddress.ip_network(item, strict=False)
+    new_prefix = network.max_prefixlen - int(math.log2(shard_size))
+    if new_prefix <= network.prefixlen:
+        return [str(network)]
+    # subnets() is lazy: only as many are made as the caller takes
+    return (str(subnet) for subnet in network.subnets(new_prefix=new_prefix))
+
+
+def _iter_pieces(items, shard_size):
+    """Yield the items of a target with CIDR blocks larger than a shard split up"""
+    for item in items:
+        if _count_hosts(item) > shard_size:
+            try:
+                yield from _split_network(item, shard_size)
+                continue
+            except ValueError:
+                pass  # An nmap range: nmap takes it whole
+        yield item
+
+
+def shard_targets(target, shard_size, max_shards=None):
+    """
+    Split a target into shards of roughly shard_size hosts each.
+
+    Large CIDR ranges are cut into equal subnets and comma lists are packed
+    into groups; hostnames count as one host and octet ranges like
+    10.0.0.1-50 stay whole. A target that fits in one shard is returned
+    unchanged. With max_shards, shards are made larger as needed to stay
+    within that many, and a target that still needs more raises ValueError
+    (check its size with validate_target first).
+    """
+    items = split_target_list(target)
+    total = sum(_count_hosts(item) for item in items)
+    if total <= shard_size:
+        return [target]
+
+    # Round down to a power of two so CIDR ranges split evenly
+    shard_size = 2 ** int(math.log2(max(shard_size, 1)))
+    if max_shards and total > shard_size * max_shards:
+        shard_size = 2 ** math.ceil(math.log2(math.ceil(total / max_shards)))
+
+    shards = []
+    current, current_size = [], 0
+    for piece in _iter_pieces(items, shard_size):
+        size = _count_hosts(piece)
+        if current and current_size + size > shard_size:
+            shards.append(' '.join(current))
+            current, current_size = [], 0
+            if max_shards and len(shards) >= max_shards:
+                raise ValueError(f"Target needs more than {max_shards} shards")
+        current.append(piece)
+        current_size += size
+    if current:
+        shards.append(' '.join(current))
+    return shards
+
+
+def merge_reports(shard_paths, output_path, host_filters=None):
+    """
+    Merge the Nmap XML reports of several shards into one report.
+
+    The first shard provides the <nmaprun> attributes and scan information,
+    hosts from every shard are copied in order, and the run statistics are
+    summed. Shards are streamed one top-level element at a time.
+
+    host_filters, if given, has one entry per shard: None copies every host,
+    a set of addresses copies only those hosts, and the shard's host counts
+    and elapsed time are then replaced by a count of the hosts copied.
+    """
+    host_filters = host_filters or [None] * len(shard_paths)
+    up = down = total = 0
+    finished_time = 0
+    elapsed = 0.0
+    exit_status = 'success'
+
+    with open(output_path, 'w', encoding='utf-8') as out:
+        out.write('<?xml version="1.0" encoding="UTF-8"?>\n<!DOCTYPE nmaprun>\n')
+
+        for shard_index, (path, host_filter) in enumerate(zip(shard_paths, host_filters)):
+            root = None
+            depth = 0
+            with open_report(path) as source:
+                for event, elem in ET.iterparse(source, events=('start', 'end')):
+                    if event == 'start':
+                        depth += 1
+                        if depth == 1:
+                            root = elem
+                            if shard_index == 0:
+                                attrs = ' '.join(f'{k}={quoteattr(v)}' for k, v in elem.attrib.items())
+                                out.write(f'<nmaprun {attrs}>\n')
+                        continue
+
+                    depth -= 1
+                    if depth != 1:
+                        continue
+
+                    if elem.tag == 'runstats':
+                        finished = elem.find('finished')
+                        if finished is not None:
+                            finished_time = max(finished_time, int(finished.get('time', 0)))
+                            if finished.get('exit', 'success') != 'success':
+                                exit_status = finished.get('exit')
+                            if host_filter is None:
+                                elapsed = max(elapsed, float(finished.get('elapsed', 0)))
+                        # Filtered shards count the hosts they contribute instead
+                        hosts = elem.find('hosts')
+                        if hosts is not None and host_filter is None:
+                            up += int(hosts.get('up', 0))
+                            down += int(hosts.get('down', 0))
+                            total += int(hosts.get('total', 0))
+                    elif elem.tag == 'host' and host_filter is not None:
+                        address = elem.find('address')
+                        if address is not None and address.get('addr') in host_filter:
+                            status = elem.find('status')
+                            if status is not None and status.get('state') == 'up':
+                                up += 1
+                            else:
+                                down += 1
+                            total += 1
+                            elem.tail = '\n'
+                            out.write(ET.tostring(elem, encoding='unicode'))
+                    elif elem.tag == 'host' or shard_index == 0:
+                        elem.tail = '\n'
+                        out.write(ET.tostring(elem, encoding='unicode'))
+                    root.clear()
+
+        out.write(f'<runstats><finished time="{finished_time}" elapsed="{elapsed:.2f}" '
+                  f'exit="{exit_status}"/><hosts up="{up}" down="{down}" total="{total}"/>\n'
+                  '</runstats>\n</nmaprun>\n')
+
+    return output_path
@@ -2,9 +2,12 @@ document.addEventListener('DOMContentLoaded', function() {
     // Check for active scans and update their status
     const activeScans = document.querySelectorAll('.active-scan');
     if (activeScans.length > 0) {
-        updateActiveScans();
-        // Set an interval to update active scans every 5 seconds
-        setInterval(updateActiveScans, 5000);
+        if (window.EventSource) {
+            // One server-pushed stream for all scans instead of polling each one
+            subscribeScanEvents();
+        } else {
+            pollActiveScans();
+        }
     }
 
     // Initialize tooltips
@@ -31,7 +34,7 @@ document.addEventListener('DOMContentLoaded', function() {
         scanForm.addEventListener('submit', function(event) {
             if (!validateTarget()) {
                 event.preventDefault();
-                alert('Please enter a valid IP address or range.');
+                alert('Please enter valid IP addresses, ranges or hostnames.');
             }
         });
     }
@@ -57,21 +60,47 @@ document.addEventListener('DOMContentLoaded', function() {
     });
 });
 
+// Same grammar as sharding.validate_target_item on the server
+const ipv4Regex = /^(?:(?:25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)\.){3}(?:25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)(?:\/(?:3[0-2]|[1-2][0-9]|[0-9]))?$/;
+const ipv6Regex = /^[0-9A-Fa-f:.]*:[0-9A-Fa-f:.]*(?:\/(?:12[0-8]|1[01][0-9]|[1-9]?[0-9]))?$/;
+const octetRangeRegex = /^(?:\d{1,3}|\d{0,3}-\d{0,3}|\*)$/;
+const hostnameRegex = /^(?=.{1,253}$)[A-Za-z0-9](?:[A-Za-z0-9-]{0,61}[A-Za-z0-9])?(?:\.[A-Za-z0-9](?:[A-Za-z0-9-]{0,61}[A-Za-z0-9])?)*\.?$/;
+
+// An nmap IPv4 octet range such as 10.0.0-3.1-254 or 10.0.0.*
+function isOctetRange(item) {
+    const octets = item.split('.');
+    return octets.length === 4 && octets.every(octet =>
+        octetRangeRegex.test(octet) &&
+        octet.split('-').every(bound => bound === '' || bound === '*' || Number(bound) <= 255));
+}
+
+function isTargetItem(item) {
+    if (item.startsWith('-')) {
+        return false;
+    }
+    if (ipv4Regex.test(item) || ipv6Regex.test(item) || isOctetRange(item)) {
+        return true;
+    }
+    // Anything made of digits and dots is an address, not a hostname
+    return hostnameRegex.test(item) && !/^[\d.*-]+$/.test(item);
+}
+
 function validateTarget() {
     const targetInput = document.getElementById('target');
     const targetValue = targetInput.value.trim();
     const targetFeedback = document.getElementById('target-feedback');
-    
-    // Simple validation for IP addresses, CIDR ranges, and hostnames
-    const ipRegex = /^(?:(?:25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)\.){3}(?:25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)(?:\/(?:3[0-2]|[1-2][0-9]|[0-9]))?$/;
-    const hostnameRegex = /^(([a-zA-Z0-9]|[a-zA-Z0-9][a-zA-Z0-9\-]*[a-zA-Z0-9])\.)*([A-Za-z0-9]|[A-Za-z0-9][A-Za-z0-9\-]*[A-Za-z0-9])$/;
-    
-    if (targetValue === '') {
+
+    // Targets are separated by commas and/or whitespace; the server checks
+    // them again, along with the size limits
+    const items = targetValue.split(/[\s,]+/).filter(item => item);
+    const invalid = items.find(item => !isTargetItem(item));
+
+    if (items.length === 0) {
         targetFeedback.textContent = 'Please enter a target IP or hostname.';
         targetFeedback.classList.remove('d-none');
         return false;
-    } else if (!ipRegex.test(targetValue) && !hostnameRegex.test(targetValue)) {
-        targetFeedback.textContent = 'Please enter a valid IP address, CIDR range, or hostname.';
+    } else if (invalid !== undefined) {
+        targetFeedback.textContent = `Not a valid IP address, range or hostname: ${invalid}`;
         targetFeedback.classList.remove('d-none');
         return false;
     } else {
@@ -81,29 +110,84 @@ function validateTarget() {
     }
 }
 
+function subscribeScanEvents() {
+    const source = new EventSource('/scan_events');
+    source.addEventListener('scans', function(event) {
+        const data = JSON.parse(event.data);
+        data.scans.forEach(applyScanStatus);
+    });
+    source.addEventListener('error', function() {
+        // The server turns streams away (503) when it has too many open,
+        // which closes the source for good: poll instead
+        if (source.readyState === EventSource.CLOSED) {
+            pollActiveScans();
+        }
+    });
+}
+
+function pollActiveScans() {
+    updateActiveScans();
+    // Set an interval to update active scans every 5 seconds
+    setInterval(updateActiveScans, 5000);
+}
+
+// Update a scan row on the page from its status payload
+function applyScanStatus(data) {
+    const scan = document.querySelector(`.active-scan[data-scan-id="${data.id}"]`);
+    if (!scan) {
+        return;
+    }
+    scan.querySelector('.scan-status').textContent = data.status;
+    const detailElement = scan.querySelector('.scan-detail');
+    if (detailElement) {
+        detailElement.textContent = scanDetail(data);
+    }
+
+    // If the scan is no longer active, refresh the page
+    if (data.status !== 'queued' && data.status !== 'running') {
+        setTimeout(() => {
+            window.location.reload();
+        }, 2000);
+    }
+}
+
 function updateActiveScans() {
     const activeScans = document.querySelectorAll('.active-scan');
-    
-    activeScans.forEach(scan => {
-        const scanId = scan.getAttribute('data-scan-id');
-        const statusElement = scan.querySelector('.scan-status');
-        
-        fetch(`/scan_status/${scanId}`)
-            .then(response => response.json())
-            .then(data => {
-                statusElement.textContent = data.status;
-                
-                // If the scan is no longer active, refresh the page
-                if (data.status !== 'queued' && data.status !== 'running') {
-                    setTimeout(() => {
-                        window.location.reload();
-                    }, 2000);
-                }
-            })
-            .catch(error => {
-                console.error('Error fetching scan status:', error);
-            });
-    });
+    if (activeScans.length === 0) {
+        return;
+    }
+
+    const ids = Array.from(activeScans, scan => scan.getAttribute('data-scan-id'));
+
+    // One request for every scan; the browser revalidates with the ETag
+    // so unchanged polls come back as an empty 304
+    fetch(`/scan_status?ids=${ids.join(',')}`, { cache: 'no-cache' })
+        .then(response => response.json())
+        .then(data => data.scans.forEach(applyScanStatus))
+        .catch(error => {
+            console.error('Error fetching scan status:', error);
+        });
+}
+
+// Queue position or live progress line shown under a scan's status
+function scanDetail(data) {
+    if (data.queue_position) {
+        return `#${data.queue_position} in queue, starts ~${formatDate(data.estimated_start)}`;
+    }
+    if (data.status === 'running') {
+        const parts = [];
+        if (data.progress !== null && data.progress !== undefined) {
+            parts.push(data.progress_task ? `${data.progress}% of ${data.progress_task}` : `${data.progress}%`);
+        }
+        if (data.shards) {
+            parts.push(`${data.shards.completed}/${data.shards.total} shards`);
+        }
+        if (data.hosts_done) {
+            parts.push(`${data.hosts_done} hosts done`);
+        }
+        return parts.join(', ');
+    }
+    return '';
 }
 
 // Toggle vulnerability details
@@ -120,6 +204,122 @@ function toggleVulnerabilityDetails(element) {
     }
 }
 
+// Show or hide a host's ports, loading them from the server the first time
+function toggleHostDetails(element) {
+    const detailsRow = document.getElementById(element.getAttribute('data-target'));
+    if (!detailsRow) {
+        return;
+    }
+
+    if (!detailsRow.classList.contains('d-none')) {
+        detailsRow.classList.add('d-none');
+        element.textContent = 'Show Ports';
+        return;
+    }
+
+    detailsRow.classList.remove('d-none');
+    element.textContent = 'Hide Ports';
+    if (detailsRow.dataset.loaded) {
+        return;
+    }
+
+    // Ports are filtered on the server with the same filters as the host list
+    const query = document.getElementById('host-list').getAttribute('data-filter-query');
+    const cell = detailsRow.querySelector('td');
+    cell.innerHTML = '<span class="text-muted">Loading...</span>';
+
+    fetch(`${element.getAttribute('data-host-url')}?${query}`)
+        .then(response => response.json())
+        .then(host => {
+            cell.innerHTML = renderHostPorts(host);
+            detailsRow.dataset.loaded = 'true';
+        })
+        .catch(error => {
+            console.error('Error fetching host details:', error);
+            cell.innerHTML = '<div class="alert alert-danger mb-0">Host details could not be loaded.</div>';
+        });
+}
+
+// Build the ports and vulnerabilities table of one host
+function renderHostPorts(host) {
+    if (!host.ports || host.ports.length === 0) {
+        return '<div class="alert alert-warning mb-0">No matching ports found on this host.</div>';
+    }
+
+    const rows = host.ports.map(port => {
+        const service = port.service || {};
+        const rowClass = port.state === 'open' ? 'table-success' : port.state === 'filtered' ? 'table-warning' : 'table-secondary';
+        let version = '-';
+        if (service.product) {
+            version = [service.product, service.version, service.extrainfo ? `(${service.extrainfo})` : '']
+                .filter(Boolean).join(' ');
+        }
+
+        let vulns = '<span class="badge bg-success">None found</span>';
+        if (port.vulnerabilities.length > 0) {
+            const detailsId = `vuln-details-${host.index}-${port.portid}-${port.protocol}`;
+            const vulnRows = port.vulnerabilities.map(vuln => `
+                <tr>
+                    <td>
+                        <a href="https://nvd.nist.gov/vuln/detail/${encodeURIComponent(vuln.id)}" target="_blank" class="text-info">
+                            ${escapeHtml(vuln.id)}
+                            <i class="fas fa-external-link-alt ms-1 small"></i>
+                        </a>
+                    </td>
+                    <td><span class="${scoreClass(vuln.score)}">${escapeHtml(vuln.score)}</span></td>
+                </tr>`).join('');
+            vulns = `
+                <span class="badge bg-danger">${port.vulnerabilities.length} found</span>
+                <button class="btn btn-sm btn-outline-secondary mt-1" onclick="toggleVulnerabilityDetails(this)" data-target="${detailsId}">
+                    Show Details
+                </button>
+                <div id="${detailsId}" class="mt-3 d-none">
+                    <table class="table table-sm table-bordered">
+                        <thead class="table-dark"><tr><th>CVE ID</th><th>Score</th></tr></thead>
+                        <tbody>${vulnRows}</tbody>
+                    </table>
+                </div>`;
+        }
+
+        return `
+            <tr class="${rowClass}">
+                <td>${escapeHtml(port.portid)}</td>
+                <td>${escapeHtml(port.protocol)}</td>
+                <td>${escapeHtml(port.state)}</td>
+                <td>${escapeHtml(service.name || '')}</td>
+                <td>${escapeHtml(version)}</td>
+                <td>${vulns}</td>
+            </tr>`;
+    }).join('');
+
+    return `
+        <div class="table-responsive">
+            <table class="table table-striped table-bordered table-hover mb-0">
+                <thead class="table-dark">
+                    <tr><th>Port</th><th>Protocol</th><th>State</th><th>Service</th><th>Version</th><th>Vulnerabilities</th></tr>
+                </thead>
+                <tbody>${rows}</tbody>
+            </table>
+        </div>`;
+}
+
+// CSS class for a CVSS score, matching the severity buckets
+function scoreClass(score) {
+    const value = score === 'N/A' ? 0 : parseFloat(score) || 0;
+    if (value >= 9.0) return 'vuln-critical';
+    if (value >= 7.0) return 'vuln-high';
+    if (value >= 4.0) return 'vuln-medium';
+    if (value > 0) return 'vuln-low';
+    return '';
+}
+
+// Escape text for use in HTML built from JSON
+function escapeHtml(text) {
+    const div = document.createElement('div');
+    div.textContent = text === null || text === undefined ? '' : String(text);
+    return div.innerHTML;
+}
+
 // Format date function
 function formatDate(dateString) {
     if (!dateString) return 'N/A';
@@ -0,0 +1,10 @@
+import os
+import tempfile
+
+
+def pytest_sessionstart(session):
+    # The store, report and data directories are created on import, relative
+    # to the working directory: keep the whole session away from the real ones
+    session_dir = tempfile.mkdtemp(prefix='flanscan-tests-')
+    os.chdir(session_dir)
+    os.environ['FLANSCAN_DB'] = os.path.join(session_dir, 'instance', 'flanscan.db')
@@ -0,0 +1,31 @@
+import pytest
+
+import analytics
+from analytics import compute_columnar_analytics, compute_vulnerability_analytics
+from benchmarks.synthetic import write_report
+from columnar import ColumnarReport
+from report_manager import report_manager
+
+
+@pytest.fixture(params=['numpy', 'python'])
+def numpy_mode(request, monkeypatch):
+    """Run a test with the NumPy paths and again with the pure-Python ones"""
+    if request.param == 'numpy':
+        if analytics.np is None:
+            pytest.skip('numpy is not installed')
+    else:
+        monkeypatch.setattr(analytics, 'np', None)
+    return request.param
+
+
+@pytest.mark.parametrize('hosts, ports, cves', [(40, 4, 5), (10, 3, 0), (1, 1, 1)])
+def test_columnar_analytics_match_xml(tmp_path, numpy_mode, hosts, ports, cves):
+    xml_path = write_report(str(tmp_path / 'report.xml'), hosts=hosts, ports_per_host=ports,
+                            cves_per_port=cves, seed=hosts)
+    report_data = report_manager._parse_xml_report(xml_path)
+    columns = ColumnarReport(report_manager.convert_report(xml_path, str(tmp_path / 'report.columns')))
+    try:
+        assert columns.to_report() == report_data
+        assert compute_columnar_analytics(columns) == compute_vulnerability_analytics(report_data)
+    finally:
+        columns.close()
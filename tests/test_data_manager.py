@@ -0,0 +1,159 @@
+import json
+import sqlite3
+import threading
+
+import pytest
+
+from data_manager import SCHEMA_MIGRATIONS, DataManager, Scan
+
+
+def open_store(path):
+    return DataManager(db_path=str(path / 'instance' / 'flanscan.db'))
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def write_legacy_scans(workdir, scans):
+    (workdir / 'data').mkdir(exist_ok=True)
+    (workdir / 'data' / 'scans.json').write_text(json.dumps(scans))
+
+
+LEGACY_SCANS = [
+    {'id': 3, 'name': 'old', 'target': '10.0.0.1', 'status': 'completed',
+     'start_time': '2024-01-02T10:00:00', 'end_time': '2024-01-02T10:05:00',
+     'report_path': 'reports/scan_3/report.xml'},
+    {'id': 7, 'name': 'older', 'target': '10.0.0.0/24', 'status': 'failed',
+     'start_time': '2024-01-01T09:00:00', 'end_time': None, 'report_path': None},
+]
+
+
+def test_fresh_store_has_full_schema(workdir):
+    store = open_store(workdir)
+    conn = store._connect()
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == len(SCHEMA_MIGRATIONS)
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+    names = {row[0] for row in conn.execute("SELECT name FROM sqlite_master")}
+    assert {'ix_scan_status', 'ix_scan_start_time', 'ix_scan_queue', 'ix_scan_status_start_time',
+            'scan_version_insert', 'scan_version_update', 'scan_version_delete'} <= names
+    assert store.get_version() == 0
+
+
+def test_legacy_json_is_imported_once(workdir):
+    write_legacy_scans(workdir, LEGACY_SCANS)
+    store = open_store(workdir)
+    assert [(scan.id, scan.name, scan.status) for scan in store.get_all_scans()] == [
+        (3, 'old', 'completed'), (7, 'older', 'failed')]
+    assert store.get_scan(3).end_time.isoformat() == '2024-01-02T10:05:00'
+    assert store.get_version() == 2
+
+    # Re-opening the store never imports the file again, even if it changed
+    write_legacy_scans(workdir, LEGACY_SCANS + [dict(LEGACY_SCANS[0], id=9)])
+    store.delete_scan(7)
+    reopened = open_store(workdir)
+    assert [scan.id for scan in reopened.get_all_scans()] == [3]
+    assert reopened.get_meta('json_migrated') is not None
+
+
+def test_old_sqlalchemy_table_is_adopted(workdir):
+    db_path = workdir / 'instance' / 'flanscan.db'
+    db_path.parent.mkdir()
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE scan (id INTEGER NOT NULL, name VARCHAR(128) NOT NULL, "
+                 "target VARCHAR(256) NOT NULL, status VARCHAR(32), start_time DATETIME, "
+                 "end_time DATETIME, report_path VARCHAR(512), PRIMARY KEY (id))")
+    conn.execute("INSERT INTO scan VALUES (1, 'legacy', '10.0.0.1', 'completed', "
+                 "'2024-01-02 10:00:00.5', '2024-01-02 10:05:00', NULL)")
+    conn.commit()
+    conn.close()
+
+    store = open_store(workdir)
+    scan = store.get_scan(1)
+    assert (scan.name, scan.priority, scan.profile, scan.hosts_done) == ('legacy', 1, 'vuln', 0)
+    # Timestamps are rewritten as ISO text so they sort
+    raw = store._connect().execute("SELECT start_time FROM scan WHERE id = 1").fetchone()[0]
+    assert raw == '2024-01-02T10:00:00.5'
+
+
+def test_concurrent_writers_do_not_lose_rows(workdir):
+    stores = [open_store(workdir), open_store(workdir)]
+    errors = []
+
+    def add_scans(store, prefix):
+        try:
+            for index in range(25):
+                scan_id = store.add_scan(Scan(name=f'{prefix}{index}', target='10.0.0.1'))
+                store.update_scan_fields(scan_id, status='running')
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=add_scans, args=(store, prefix))
+               for store in stores for prefix in 'ab']
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    scans = stores[0].get_all_scans()
+    assert len(scans) == len({scan.id for scan in scans}) == 100
+    assert all(scan.status == 'running' for scan in scans)
+    # One insert and one status update per scan
+    assert stores[1].get_version() == 200
+
+
+def test_writes_in_one_store_invalidate_view_of_another(workdir):
+    writer, reader = open_store(workdir), open_store(workdir)
+    scan_id = writer.add_scan(Scan(name='first', target='10.0.0.1'))
+
+    view = reader._current_view()
+    assert [scan.id for scan in reader.get_active_scans()] == [scan_id]
+    # Unchanged store: the same view is served again
+    assert reader._current_view() is view
+
+    version = reader.get_version()
+    writer.update_scan_fields(scan_id, status='completed')
+    assert reader.get_version() == version + 1
+    assert reader._current_view() is not view
+    assert reader.get_active_scans() == []
+    assert [scan.id for scan in reader.get_completed_scans()] == [scan_id]
+
+    writer.delete_scan(scan_id)
+    assert reader.get_all_scans() == []
+
+
+def test_progress_writes_keep_view_but_move_status_version(workdir):
+    writer, reader = open_store(workdir), open_store(workdir)
+    scan_id = writer.add_scan(Scan(name='running', target='10.0.0.0/28', status='running'))
+    view = reader._current_view()
+    version, status_version = reader.get_version(), reader.get_status_version()
+
+    writer.update_scan_fields(scan_id, only_if_status=['running'], progress=50.0,
+                              progress_task='SYN Stealth Scan', hosts_done=4)
+    writer.set_scan_shards(scan_id, ['10.0.0.0/29', '10.0.0.8/29'])
+    writer.update_shard(scan_id, 0, status='completed')
+
+    assert reader.get_version() == version
+    assert reader._current_view() is view
+    assert reader.get_status_version() == status_version + 4
+    # Status reads go to the table, so they see the progress the view does not
+    _, scans, shards, _ = reader.get_status_snapshot(ids=[scan_id])
+    assert (scans[0].progress, scans[0].hosts_done) == (50.0, 4)
+    assert shards[scan_id]['completed'] == 1
+
+
+def test_wait_for_change_returns_on_other_store_write(workdir):
+    writer, reader = open_store(workdir), open_store(workdir)
+    scan_id = writer.add_scan(Scan(name='running', target='10.0.0.1', status='running'))
+    status_version = reader.get_status_version()
+    assert reader.wait_for_change(status_version, 0.1) == status_version
+
+    timer = threading.Timer(0.2, writer.update_scan_fields, (scan_id,), {'progress': 10.0})
+    timer.start()
+    try:
+        assert reader.wait_for_change(status_version, 5) == status_version + 1
+    finally:
+        timer.join()
@@ -0,0 +1,107 @@
+from datetime import datetime
+
+import pytest
+
+from app import app
+from data_manager import DataManager, Scan, data_manager
+
+
+def finding(host, port, service, product, version, cve=None, score=None, state='open'):
+    """A findings row in FINDING_COLUMNS order, scan_id excluded"""
+    return (host, f'{host}.example', port, 'tcp', state, service, product, version, cve, score)
+
+
+ROWS = [
+    finding('10.0.0.1', 80, 'http', '100% Proxy', '1.0', 'CVE-2021-1', 9.8),
+    finding('10.0.0.1', 81, 'http', '1000 Server', '1.0', 'CVE-2021-10', 7.0),
+    finding('10.0.0.2', 3306, 'mysql', 'my_sql', '5.7', 'CVE-2020-5', 6.9),
+    finding('10.0.0.2', 3307, 'mysql', 'mysql', '5.7_1', None, None),
+    finding('10.0.0.3', 443, 'https', 'Apache httpd', '2.4.6', 'CVE-2022-7', 5.0, state='filtered'),
+    finding('10.0.0.30', 22, 'ssh', 'OpenSSH', '7.4', None, None),
+    finding('10.0.0.4', 445, 'microsoft-ds', 'C:\\share', '4.6', None, None),
+]
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    store = DataManager(db_path=str(tmp_path / 'flanscan.db'))
+    old = store.add_scan(Scan(name='old', target='10.0.0.0/24', status='completed',
+                              start_time=datetime(2024, 1, 1)))
+    new = store.add_scan(Scan(name='new', target='10.0.0.0/24', status='completed',
+                              start_time=datetime(2024, 2, 1)))
+    store.replace_findings(old, ROWS)
+    store.replace_findings(new, ROWS[:2])
+    store.scan_ids = (old, new)
+    return store
+
+
+def products(store, **filters):
+    findings, _ = store.query_findings(limit=100, **filters)
+    return sorted({f['product'] for f in findings})
+
+
+@pytest.mark.parametrize('prefix, expected', [
+    ('100%', ['100% Proxy']),
+    ('100', ['100% Proxy', '1000 Server']),
+    ('my_', ['my_sql']),
+    ('my', ['my_sql', 'mysql']),
+    ('c:\\', ['C:\\share']),
+    ('APACHE', ['Apache httpd']),
+    ('%', []),
+    ('_', []),
+])
+def test_wildcards_are_literal_prefix_characters(store, prefix, expected):
+    assert products(store, product=prefix) == expected
+
+
+def test_version_and_host_prefixes(store):
+    assert products(store, version='5.7_') == ['mysql']
+    assert products(store, host='10.0.0.3') == ['Apache httpd', 'OpenSSH']
+
+
+def test_cve_and_service_match_exactly(store):
+    findings, _ = store.query_findings(cve='CVE-2021-1')
+    assert {f['cve'] for f in findings} == {'CVE-2021-1'}
+    assert products(store, service='http') == ['100% Proxy', '1000 Server']
+    assert products(store, service='htt') == []
+
+
+def test_min_score_includes_the_bound(store):
+    old, _ = store.scan_ids
+    findings, _ = store.query_findings(min_score=7.0, scan_id=old)
+    assert sorted(f['score'] for f in findings) == [7.0, 9.8]
+    # Findings without a score never pass a score filter
+    assert len(store.query_findings(min_score=0, scan_id=old)[0]) == 4
+
+
+def test_latest_and_open_filters(store):
+    old, new = store.scan_ids
+    assert {f['scan_id'] for f in store.query_findings(latest_only=True)[0]} == {new}
+    assert 'Apache httpd' not in products(store, only_open=True, scan_id=old)
+
+
+def test_paging_with_after(store):
+    seen, after = [], None
+    while True:
+        page, after = store.query_findings(limit=3, after=after)
+        seen += [f['id'] for f in page]
+        if after is None:
+            break
+    assert seen == sorted(seen) and len(seen) == len(set(seen)) == len(ROWS) + 2
+
+
+def test_api_searches_literal_percent():
+    scan_id = data_manager.add_scan(Scan(name='api findings', target='10.1.0.0/24', status='completed'))
+    data_manager.replace_findings(scan_id, ROWS)
+    client = app.test_client()
+    body = client.get(f'/api/findings?scan_id={scan_id}&product=100%25').get_json()
+    assert [f['product'] for f in body['findings']] == ['100% Proxy']
+    body = client.get(f'/api/findings?scan_id={scan_id}&min_score=7&cve=CVE-2021-10').get_json()
+    assert [(f['cve'], f['score']) for f in body['findings']] == [('CVE-2021-10', 7.0)]
+
+
+@pytest.mark.parametrize('query', ['min_score=high', 'scan_id=one', 'limit=x', 'after=y'])
+def test_api_rejects_bad_filters(query):
+    response = app.test_client().get(f'/api/findings?{query}')
+    assert response.status_code == 400
@@ -0,0 +1,166 @@
+import asyncio
+import ipaddress
+import itertools
+import os
+from datetime import datetime
+
+import pytest
+
+from data_manager import Scan, data_manager
+from incremental import host_fingerprints, plan_rescan
+from report_archive import compress_file
+from scan_profiles import get_profile
+from scanner import Scanner
+
+DAY = 86400
+NETWORKS = itertools.count(1)
+
+
+def write_report(path, hosts):
+    """A minimal nmap XML report; hosts is {address: ({port: state}, endtime or None)}"""
+    with open(path, 'w') as out:
+        out.write('<?xml version="1.0"?>\n<nmaprun scanner="nmap" start="1700000000">\n')
+        for address, (ports, endtime) in hosts.items():
+            out.write(f'<host endtime="{endtime}">' if endtime else '<host>')
+            out.write(f'<status state="up"/><address addr="{address}" addrtype="ipv4"/><ports>')
+            for port, state in ports.items():
+                portid, protocol = port.split('/')
+                out.write(f'<port protocol="{protocol}" portid="{portid}"><state state="{state}"/></port>')
+            out.write('</ports></host>\n')
+        out.write('<runstats><finished time="1700000100"/>'
+                  f'<hosts up="{len(hosts)}" down="0" total="{len(hosts)}"/></runstats>\n</nmaprun>\n')
+    return path
+
+
+def test_fingerprints_keep_open_ports_and_end_time(tmp_path):
+    path = write_report(str(tmp_path / 'report.xml'), {
+        '10.0.0.1': ({'22/tcp': 'open', '80/tcp': 'closed', '53/udp': 'open'}, 1700000050),
+        '10.0.0.2': ({}, None),
+    })
+    expected = {
+        '10.0.0.1': (frozenset({'22/tcp', '53/udp'}), 1700000050),
+        '10.0.0.2': (frozenset(), None),
+    }
+    assert host_fingerprints(path) == expected
+    assert list(host_fingerprints(path)) == ['10.0.0.1', '10.0.0.2']
+    assert host_fingerprints(compress_file(path)) == expected
+
+
+NOW = 100 * DAY
+PREVIOUS = {
+    '10.0.0.1': (frozenset({'22/tcp'}), NOW - DAY),
+    '10.0.0.2': (frozenset({'22/tcp', '80/tcp'}), NOW - DAY),
+    '10.0.0.3': (frozenset({'22/tcp'}), NOW - 10 * DAY),
+    '10.0.0.4': (frozenset({'22/tcp'}), None),
+    '10.0.0.9': (frozenset({'443/tcp'}), NOW - DAY),
+}
+
+
+def test_plan_rescan_deep_scans_new_changed_and_stale_hosts():
+    discovered = {
+        '10.0.0.5': (frozenset({'22/tcp'}), None),  # new
+        '10.0.0.1': (frozenset({'22/tcp'}), None),  # unchanged and recent
+        '10.0.0.2': (frozenset({'22/tcp'}), None),  # a port closed
+        '10.0.0.3': (frozenset({'22/tcp'}), None),  # unchanged, last deep scanned too long ago
+        '10.0.0.4': (frozenset({'22/tcp'}), None),  # unchanged, no end time of its own
+    }
+    deep, carry = plan_rescan(discovered, PREVIOUS, 7 * DAY, NOW, previous_time=NOW - 2 * DAY)
+    # Deep scans keep discovery order; hosts gone since the previous scan are neither
+    assert deep == ['10.0.0.5', '10.0.0.2', '10.0.0.3']
+    assert carry == {'10.0.0.1', '10.0.0.4'}
+
+
+def test_plan_rescan_falls_back_to_previous_scan_time():
+    discovered = {'10.0.0.4': (frozenset({'22/tcp'}), None)}
+    assert plan_rescan(discovered, PREVIOUS, 7 * DAY, NOW, previous_time=NOW - 8 * DAY) == (['10.0.0.4'], set())
+
+
+def test_plan_rescan_of_empty_discovery():
+    assert plan_rescan({}, PREVIOUS, 7 * DAY, NOW, NOW) == ([], set())
+
+
+class FakeNmap:
+    """Stands in for Scanner._run_nmap: writes a discovery report for the first address of each target"""
+
+    def __init__(self, open_ports, failing=()):
+        self.open_ports = open_ports
+        self.failing = failing
+        self.calls = []
+        self.running = self.max_running = 0
+
+    async def __call__(self, scan_id, target, output_path, progress, shard_index=0,
+                      nmap_args=(), live_hosts=True):
+        self.calls.append((target, list(nmap_args), live_hosts))
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await asyncio.sleep(0.01)
+        finally:
+            self.running -= 1
+        if target in self.failing:
+            return 1, '', 'failed'
+        address = str(next(ipaddress.ip_network(target).hosts()))
+        write_report(output_path, {address: (self.open_ports.get(address, {}), None)})
+        return 0, '', ''
+
+
+@pytest.fixture
+def incremental_scan(tmp_path):
+    """A running incremental scan of a /28 whose previous scan found 22/tcp open on its first address"""
+    network = ipaddress.ip_network(f'10.77.{next(NETWORKS)}.0/28')
+    target = str(network)
+    first = str(next(network.hosts()))
+    previous = Scan(name='previous', target=target, status='completed', start_time=datetime(2020, 1, 1),
+                    end_time=datetime.now())
+    data_manager.add_scan(previous)
+    report_path = write_report(str(tmp_path / 'previous.xml'), {first: ({'22/tcp': 'open'}, None)})
+    data_manager.update_scan_fields(previous.id, report_path=report_path)
+
+    scan = Scan(name='incremental', target=target, status='running', incremental=True)
+    data_manager.add_scan(scan)
+    scan_dir = tmp_path / f'scan_{scan.id}'
+    scan_dir.mkdir()
+    return data_manager.get_scan(scan.id), str(scan_dir), report_path
+
+
+def plan(scanner, scan, scan_dir, fake_nmap, slots):
+    async def run():
+        scanner._nmap_slots = asyncio.Semaphore(slots)
+        return await scanner._plan_incremental(scan.id, scan, scan_dir, get_profile(scan.profile))
+
+    scanner._run_nmap = fake_nmap
+    return asyncio.run(run())
+
+
+def test_discovery_is_sharded_within_the_nmap_budget(incremental_scan):
+    scan, scan_dir, previous_path = incremental_scan
+    network = ipaddress.ip_network(scan.target)
+    subnets = [str(subnet) for subnet in network.subnets(new_prefix=30)]
+    addresses = [str(next(ipaddress.ip_network(subnet).hosts())) for subnet in subnets]
+    # Carried: first address, same ports. Deep scanned: the others, and the second's ports are new
+    fake_nmap = FakeNmap({addresses[0]: {'22/tcp': 'open'}, addresses[1]: {'80/tcp': 'open'}})
+    scanner = Scanner()
+    scanner.shard_size = 4
+
+    deep_target, extra_reports = plan(scanner, scan, scan_dir, fake_nmap, slots=2)
+
+    assert sorted(target for target, _, _ in fake_nmap.calls) == sorted(subnets)
+    assert fake_nmap.max_running == 2
+    discovery_args = get_profile(scan.profile).discovery_args()
+    assert all(args == discovery_args and not live_hosts for _, args, live_hosts in fake_nmap.calls)
+
+    assert deep_target.split() == addresses[1:]
+    assert extra_reports == [(previous_path, {addresses[0]})]
+    # The shards were merged into one discovery report
+    assert os.listdir(scan_dir) == ['discovery.xml']
+    assert list(host_fingerprints(os.path.join(scan_dir, 'discovery.xml'))) == addresses
+
+
+def test_failed_discovery_shard_falls_back_to_full_scan(incremental_scan):
+    scan, scan_dir, _ = incremental_scan
+    failing = str(next(ipaddress.ip_network(scan.target).subnets(new_prefix=30)))
+    scanner = Scanner()
+    scanner.shard_size = 4
+
+    assert plan(scanner, scan, scan_dir, FakeNmap({}, failing={failing}), slots=4) is None
+    assert os.listdir(scan_dir) == []
@@ -0,0 +1,108 @@
+import pytest
+
+import data_manager as data_manager_module
+from app import app
+from data_manager import PRIORITY_HIGH, PRIORITY_LOW, DataManager, Scan, data_manager
+
+
+def first_queued(queued, running, last_served):
+    return queued[0]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable time.time for lease expiry"""
+    now = [1_000_000.0]
+    monkeypatch.setattr(data_manager_module.time, 'time', lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return DataManager(db_path=str(tmp_path / 'flanscan.db'))
+
+
+@pytest.fixture
+def scan_id(store):
+    return store.add_scan(Scan(name='queued', target='10.0.0.1'))
+
+
+def test_claim_leases_scan(store, scan_id, clock):
+    scan = store.claim_next_scan('runner-a', 60, first_queued)
+    assert scan.id == scan_id
+    assert store.get_scan(scan_id).status == 'running'
+    assert store.get_leased_scan_ids() == {scan_id}
+    # Nothing else is queued
+    assert store.claim_next_scan('runner-b', 60, first_queued) is None
+
+
+def test_live_lease_is_not_recovered(store, scan_id, clock):
+    store.claim_next_scan('runner-a', 60, first_queued)
+    clock[0] += 59
+    assert store.recover_stale_scans(max_attempts=3) == []
+    assert store.get_scan(scan_id).status == 'running'
+
+
+def test_expired_lease_requeues_scan(store, scan_id, clock):
+    store.claim_next_scan('runner-a', 60, first_queued)
+    store.add_scan_process(scan_id, 4321, 'runner-a')
+    store.update_scan_fields(scan_id, progress=40.0, hosts_done=2)
+    clock[0] += 61
+
+    assert store.recover_stale_scans(max_attempts=3) == [
+        {'id': scan_id, 'status': 'queued', 'processes': [('runner-a', 4321)]}]
+    scan = store.get_scan(scan_id)
+    assert (scan.status, scan.progress, scan.hosts_done) == ('queued', None, 0)
+    assert store.get_leased_scan_ids() == set()
+
+    # Another runner picks it up again
+    assert store.claim_next_scan('runner-b', 60, first_queued).id == scan_id
+
+
+def test_expired_lease_fails_scan_after_max_attempts(store, scan_id, clock):
+    store.claim_next_scan('runner-a', 60, first_queued)
+    clock[0] += 61
+    assert store.recover_stale_scans(max_attempts=1)[0]['status'] == 'failed'
+    scan = store.get_scan(scan_id)
+    assert scan.status == 'failed'
+    assert scan.end_time is not None
+
+
+def test_renewed_lease_is_not_recovered(store, scan_id, clock):
+    store.claim_next_scan('runner-a', 60, first_queued)
+    clock[0] += 50
+    assert store.renew_leases('runner-a', [scan_id], 60) == {scan_id}
+    clock[0] += 50
+    assert store.recover_stale_scans(max_attempts=3) == []
+    # A lease taken over after expiring cannot be renewed by its old owner
+    clock[0] += 61
+    store.recover_stale_scans(max_attempts=3)
+    store.claim_next_scan('runner-b', 60, first_queued)
+    assert store.renew_leases('runner-a', [scan_id], 60) == set()
+
+
+def test_running_scan_without_lease_fails(store, scan_id, clock):
+    # Scans left running before the job queue existed have no lease
+    store.update_scan_fields(scan_id, status='running')
+    assert store.recover_stale_scans(max_attempts=3) == [
+        {'id': scan_id, 'status': 'failed', 'processes': []}]
+
+
+def test_claims_follow_priority_then_age(store, scan_id):
+    low = store.add_scan(Scan(name='low', target='10.0.0.2', priority=PRIORITY_LOW))
+    high = store.add_scan(Scan(name='high', target='10.0.0.3', priority=PRIORITY_HIGH))
+    claimed = [store.claim_next_scan('runner-a', 60, first_queued).id for _ in range(3)]
+    assert claimed == [high, scan_id, low]
+
+
+def test_submitted_scan_records_priority_and_submitter():
+    response = app.test_client().post('/start_scan', json={'target': '10.0.0.1', 'scan_name': 'urgent',
+                                                           'priority': 'high'})
+    assert response.status_code == 201
+    scan_id = response.get_json()['id']
+    try:
+        scan = data_manager.get_scan(scan_id)
+        assert (scan.status, scan.priority, scan.submitter) == ('queued', PRIORITY_HIGH, '127.0.0.1')
+    finally:
+        data_manager.delete_scan(scan_id)
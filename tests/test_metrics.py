@@ -0,0 +1,159 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+import metrics
+from data_manager import DataManager, Scan, data_manager
+from metrics import ARCHIVE_NAME, MetricsRegistry
+from scanner import Scanner
+
+
+def make_registry(directory):
+    """A registry with a counter and a histogram, standing in for one process"""
+    registry = MetricsRegistry(str(directory))
+    requests = registry.counter('test_requests_total', 'Requests', ('endpoint',))
+    latency = registry.histogram('test_latency_seconds', 'Latency', (), buckets=(1, 10))
+    return registry, requests, latency
+
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+def write_process_file(directory, pid, requests):
+    """The metrics file of a process that recorded requests to /index"""
+    path = os.path.join(directory, f'{pid}-deadbeef.json')
+    with open(path, 'w') as f:
+        json.dump({'pid': pid, 'metrics': {'test_requests_total': [[['index'], requests]],
+                                           'test_latency_seconds': [[[], [requests, 0, 0], 0.5]]}}, f)
+    return path
+
+
+def test_processes_are_summed(tmp_path):
+    first, first_requests, first_latency = make_registry(tmp_path)
+    second, second_requests, _ = make_registry(tmp_path)
+    first_requests.inc(endpoint='index')
+    first_requests.inc(2, endpoint='scans')
+    first_latency.observe(0.5)
+    first_latency.observe(5)
+    second_requests.inc(3, endpoint='index')
+    second.flush()
+
+    # Each process has its own file; render flushes its own process first
+    text = first.render()
+    assert len([name for name in os.listdir(tmp_path) if name.endswith('.json')]) == 2
+    assert 'test_requests_total{endpoint="index"} 4\n' in text
+    assert 'test_requests_total{endpoint="scans"} 2\n' in text
+    assert 'test_latency_seconds_bucket{le="1"} 1\n' in text
+    assert 'test_latency_seconds_bucket{le="+Inf"} 2\n' in text
+    assert 'test_latency_seconds_sum 5.5\n' in text
+
+
+def test_dead_process_file_is_archived(tmp_path):
+    registry, requests, _ = make_registry(tmp_path)
+    requests.inc(endpoint='index')
+    dead_path = write_process_file(tmp_path, dead_pid(), 5)
+
+    assert 'test_requests_total{endpoint="index"} 6\n' in registry.render()
+    # The dead process's counts moved to the archive, and are not counted twice
+    assert not os.path.exists(dead_path)
+    assert os.path.exists(tmp_path / ARCHIVE_NAME)
+    assert 'test_requests_total{endpoint="index"} 6\n' in registry.render()
+
+    write_process_file(tmp_path, dead_pid(), 1)
+    text = registry.render()
+    assert 'test_requests_total{endpoint="index"} 7\n' in text
+    assert 'test_latency_seconds_count 6\n' in text
+
+
+def test_concurrent_renders_archive_each_file_once(tmp_path):
+    registry, _, _ = make_registry(tmp_path)
+    pid = dead_pid()
+    for index in range(20):
+        with open(tmp_path / f'{pid}-{index:08x}.json', 'w') as f:
+            json.dump({'pid': pid, 'metrics': {'test_requests_total': [[['index'], 1]]}}, f)
+
+    errors = []
+
+    def render():
+        try:
+            registry.render()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=render) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert sorted(os.listdir(tmp_path)) == ['.lock', ARCHIVE_NAME]
+    assert 'test_requests_total{endpoint="index"} 20\n' in registry.render()
+
+
+def test_disabled_registry_records_nothing(tmp_path, monkeypatch):
+    monkeypatch.setenv('FLANSCAN_METRICS', '0')
+    registry, requests, latency = make_registry(tmp_path)
+    requests.inc(endpoint='index')
+    latency.observe(1)
+    registry.flush()
+    assert os.listdir(tmp_path) == []
+
+
+def histogram_total(histogram, **labels):
+    key = tuple(str(labels[name]) for name in histogram.labelnames)
+    counts, total = histogram._values.get(key, [[0], 0.0])
+    return sum(counts), total
+
+
+@pytest.fixture
+def claimed_scan():
+    """A scan submitted 100 seconds ago and claimed 40 seconds ago"""
+    now = datetime.now()
+    scan_id = data_manager.add_scan(Scan(name='timed', target='metrics.example', status='completed',
+                                         start_time=now - timedelta(seconds=100)))
+    scan = data_manager.get_scan(scan_id)
+    scan.claimed_at = now - timedelta(seconds=40)
+    return scan
+
+
+def test_scan_timings_are_measured_from_the_claim(claimed_scan):
+    scanner = Scanner()
+    scanner._stopping.set()  # Nothing to release: the scan is not leased
+
+    async def run_scan(scan_id, target):
+        pass
+
+    async def run():
+        scanner._wake = asyncio.Event()
+        await scanner._run_claimed(claimed_scan)
+
+    scanner._run_scan = run_scan
+    waits_before = histogram_total(metrics.SCAN_QUEUE_WAIT_SECONDS)
+    durations_before = histogram_total(metrics.SCAN_SECONDS, status='completed')
+    asyncio.run(run())
+    waits = histogram_total(metrics.SCAN_QUEUE_WAIT_SECONDS)
+    durations = histogram_total(metrics.SCAN_SECONDS, status='completed')
+
+    assert waits[0] == waits_before[0] + 1
+    assert waits[1] - waits_before[1] == pytest.approx(60, abs=1)
+    assert durations[0] == durations_before[0] + 1
+    assert durations[1] - durations_before[1] == pytest.approx(40, abs=1)
+
+
+def test_claim_records_claim_time(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    store = DataManager(db_path=str(tmp_path / 'flanscan.db'))
+    store.add_scan(Scan(name='queued', target='10.0.0.1', start_time=datetime.now() - timedelta(minutes=5)))
+    before = datetime.now()
+    scan = store.claim_next_scan('runner-a', 60, lambda queued, running, last_served: queued[0])
+    assert before <= scan.claimed_at <= datetime.now()
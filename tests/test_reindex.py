@@ -0,0 +1,110 @@
+import os
+from datetime import datetime
+
+import pytest
+
+import reindex
+from data_manager import Scan, data_manager
+from reindex import PROGRESS_KEY, Reindex
+from report_manager import report_manager
+
+
+def write_report(path, address, cve):
+    """A finished nmap report of one host with one vulnerable port"""
+    with open(path, 'w') as f:
+        f.write('<?xml version="1.0"?>\n<nmaprun scanner="nmap" start="1700000000" version="7.95">\n'
+                f'<host><status state="up"/><address addr="{address}" addrtype="ipv4"/><ports>'
+                '<port protocol="tcp" portid="22"><state state="open"/>'
+                '<service name="ssh" product="OpenSSH"/>'
+                f'<script id="vulners" output="&#xa;    {cve}&#x9;7.5&#x9;https://vulners.com/cve/{cve}"/>'
+                '</port></ports></host>\n'
+                '<runstats><finished time="1700000060" exit="success"/></runstats>\n</nmaprun>\n')
+    return path
+
+
+class Interrupted(Exception):
+    pass
+
+
+@pytest.fixture
+def reports(tmp_path, monkeypatch):
+    """
+    Reports of three completed scans, a scan left running by a runner that
+    died after nmap finished, and a cancelled scan, in a reports directory
+    of their own
+    """
+    reports_dir = tmp_path / 'reports'
+    reports_dir.mkdir()
+    monkeypatch.setattr(report_manager, 'reports_dir', str(reports_dir))
+    data_manager.set_meta(PROGRESS_KEY, None)
+
+    scans = {}
+    for index, status in enumerate(['completed', 'completed', 'completed', 'running', 'cancelled']):
+        scan = Scan(name=f'reindexed {index}', target=f'10.66.0.{index}', status=status)
+        data_manager.add_scan(scan)
+        scan_dir = reports_dir / f'scan_{scan.id}'
+        scan_dir.mkdir()
+        path = write_report(str(scan_dir / 'report.xml'), f'10.66.0.{index}', f'CVE-2024-{1000 + index}')
+        if status == 'completed':
+            data_manager.update_scan_fields(scan.id, report_path=path)
+        scans[status] = scans.get(status, []) + [scan.id]
+    return scans
+
+
+def indexed_cves():
+    rows, _ = data_manager.query_findings(host='10.66.0.', limit=100)
+    return sorted(row['cve'] for row in rows)
+
+
+def test_interrupted_reindex_resumes(reports, monkeypatch):
+    write = Reindex._write
+
+    def interrupted_write(self, batch, scans):
+        # Killed right after storing the first report
+        write(self, batch[:1], scans)
+        raise Interrupted()
+
+    monkeypatch.setattr(Reindex, '_write', interrupted_write)
+    with pytest.raises(Interrupted):
+        Reindex(workers=1, batch_size=1).run()
+    started = data_manager.get_meta(PROGRESS_KEY)
+    assert started is not None
+    first_id = reports['completed'][0]
+    assert data_manager.get_indexed_scan_ids(datetime.fromisoformat(started)) == {first_id}
+
+    monkeypatch.setattr(Reindex, '_write', write)
+    progress = []
+    counts = Reindex(workers=1, batch_size=2, progress=lambda counts: progress.append(dict(counts))).run()
+
+    assert counts == {'total': 3, 'done': 3, 'indexed': 3, 'repaired': 1, 'failed': 0,
+                      'skipped': 1, 'orphaned': 0, 'resumed': 1}
+    assert (progress[0]['done'], progress[-1]['done']) == (0, 3)
+    assert data_manager.get_meta(PROGRESS_KEY) is None
+
+    # The scan left running by a dead runner now points at its finished report
+    stale = data_manager.get_scan(reports['running'][0])
+    assert stale.status == 'completed'
+    assert stale.progress == 100.0
+    assert stale.end_time is not None
+    assert stale.report_path == os.path.join(report_manager.reports_dir, f'scan_{stale.id}', 'report.xml')
+    assert data_manager.get_scan(reports['cancelled'][0]).status == 'cancelled'
+    assert indexed_cves() == ['CVE-2024-1000', 'CVE-2024-1001', 'CVE-2024-1002', 'CVE-2024-1003']
+
+
+def test_restart_ignores_earlier_progress(reports):
+    data_manager.set_meta(PROGRESS_KEY, datetime(2000, 1, 1).isoformat())
+    counts = Reindex(workers=1, restart=True).run()
+    assert (counts['total'], counts['resumed'], counts['repaired']) == (4, 0, 1)
+
+
+def test_leased_scan_is_left_alone(reports):
+    running_id = reports['running'][0]
+    with data_manager._transaction() as conn:
+        conn.execute("INSERT INTO scan_lease (scan_id, owner, expires_at, heartbeat_at) VALUES (?, ?, ?, ?)",
+                     (running_id, 'runner-a', 2e9, 0))
+    try:
+        tasks = Reindex().plan(datetime.now(), resuming=False)
+        assert running_id not in {scan.id for scan, _ in tasks}
+        assert running_id in {scan_id for scan_id, _ in reindex.find_reports()}
+    finally:
+        data_manager.release_scan(running_id, 'runner-a')
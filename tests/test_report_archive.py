@@ -0,0 +1,100 @@
+import io
+import json
+import os
+import tarfile
+
+import pytest
+
+from benchmarks.synthetic import write_report
+from data_manager import data_manager, Scan
+from report_archive import compress_file, iter_archive
+from report_manager import report_manager
+
+
+@pytest.fixture
+def completed_scan():
+    """A completed scan with a compressed synthetic report and an error log"""
+    scan = Scan(name='export me', target='10.0.0.0/28', status='completed')
+    data_manager.add_scan(scan)
+    scan_dir = os.path.join(report_manager.reports_dir, f"scan_{scan.id}")
+    os.makedirs(scan_dir)
+    xml_path = write_report(os.path.join(scan_dir, 'report.xml'), hosts=12, ports_per_host=3,
+                            cves_per_port=4, network='10.0.0.0/28')
+    report_path = compress_file(xml_path)
+    os.remove(xml_path)
+    with open(os.path.join(scan_dir, 'error.log'), 'w') as f:
+        f.write('warning: something\n')
+    data_manager.update_scan_fields(scan.id, report_path=report_path)
+    report_manager.index_findings(scan.id)
+    return data_manager.get_scan(scan.id)
+
+
+def export(scans):
+    return b''.join(report_manager.iter_export(scans))
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def scan_dirs():
+    return set(os.listdir(report_manager.reports_dir))
+
+
+def test_export_import_round_trip(completed_scan):
+    archive = export([completed_scan])
+    assert tarfile.open(fileobj=io.BytesIO(archive)).getnames()[0] == 'manifest.json'
+
+    [new_id] = report_manager.import_reports(io.BytesIO(archive))
+    imported = data_manager.get_scan(new_id)
+    assert new_id != completed_scan.id
+    assert (imported.name, imported.target, imported.status) == ('export me', '10.0.0.0/28', 'completed')
+    assert os.path.basename(imported.report_path) == 'report.xml.gz'
+    assert read(imported.report_path) == read(completed_scan.report_path)
+    assert read(os.path.join(os.path.dirname(imported.report_path), 'error.log')) == b'warning: something\n'
+
+    # Imported completed scans are indexed like the original
+    original, _ = data_manager.query_findings(scan_id=completed_scan.id, limit=1000)
+    copied, _ = data_manager.query_findings(scan_id=new_id, limit=1000)
+    assert len(copied) == len(original) > 0
+
+
+def test_truncated_import_leaves_nothing_behind(completed_scan):
+    archive = export([completed_scan])
+    # Cut the upload off in the middle of the report
+    report = tarfile.open(fileobj=io.BytesIO(archive)).getmember(f"scan_{completed_scan.id}/report.xml.gz")
+    truncated = archive[:report.offset_data + report.size // 2]
+    scans, dirs = len(data_manager.get_all_scans()), scan_dirs()
+
+    with pytest.raises(tarfile.TarError):
+        report_manager.import_reports(io.BytesIO(truncated))
+    assert len(data_manager.get_all_scans()) == scans
+    assert scan_dirs() == dirs
+
+
+def test_import_takes_report_path_from_manifest(completed_scan, tmp_path):
+    # A stray plain report after the compressed one must not replace it
+    stray = tmp_path / 'report.xml'
+    stray.write_bytes(b'<nmaprun></nmaprun>')
+    manifest = {'version': 1, 'scans': [completed_scan.to_dict()]}
+    archive = b''.join(iter_archive(manifest, [
+        (f"scan_{completed_scan.id}/report.xml.gz", completed_scan.report_path),
+        (f"scan_{completed_scan.id}/report.xml", str(stray)),
+    ]))
+
+    [new_id] = report_manager.import_reports(io.BytesIO(archive))
+    assert os.path.basename(data_manager.get_scan(new_id).report_path) == 'report.xml.gz'
+
+
+def test_import_needs_manifest_first():
+    archive = b''.join(iter_archive({}, []))
+    broken = io.BytesIO()
+    with tarfile.open(fileobj=broken, mode='w') as tar:
+        data = json.dumps({'scans': []}).encode()
+        info = tarfile.TarInfo('scan_1/report.xml')
+        info.size = len(data)
+        tar.addfile(info, io.BytesIO(data))
+    assert report_manager.import_reports(io.BytesIO(archive)) == []
+    with pytest.raises(ValueError):
+        report_manager.import_reports(io.BytesIO(broken.getvalue()))
@@ -0,0 +1,163 @@
+import json
+import os
+from xml.sax.saxutils import quoteattr
+
+import pytest
+
+from app import app
+from data_manager import Scan, data_manager
+from report_diff import CHANGE_TYPES, iter_diff, summarize_changes
+from report_manager import report_manager
+
+
+def host(addr, ports=(), status='up'):
+    """A parsed host; each port is (portid, state, service name, product, {cve: score})"""
+    return {
+        'status': status,
+        'addresses': [{'addr': addr, 'addrtype': 'ipv4'}],
+        'hostnames': [],
+        'ports': [{'protocol': 'tcp', 'portid': str(portid), 'state': state,
+                   'service': {'name': name, 'product': product, 'version': '', 'extrainfo': ''},
+                   'vulnerabilities': [{'id': cve, 'score': score} for cve, score in cves.items()]}
+                  for portid, state, name, product, cves in ports]
+    }
+
+
+OLD = [
+    host('10.0.0.1', [(22, 'open', 'ssh', 'OpenSSH', {'CVE-2020-1': '5.0', 'CVE-2020-2': '7.5'}),
+                      (80, 'open', 'http', 'Apache httpd', {}),
+                      (443, 'open', 'https', 'nginx', {})]),
+    host('10.0.0.2', [(25, 'open', 'smtp', 'Postfix', {})]),
+    host('10.0.0.3', [(53, 'open', 'domain', 'BIND', {'CVE-2021-9': '9.8'})]),
+]
+NEW = [
+    host('10.0.0.1', [(22, 'open', 'ssh', 'OpenSSH', {'CVE-2020-2': '7.5', 'CVE-2022-3': '6.1'}),
+                      (80, 'open', 'http', 'nginx', {}),
+                      (8080, 'open', 'http-proxy', 'Squid', {})]),
+    host('10.0.0.2', [(25, 'open', 'smtp', 'Postfix', {})], status='down'),
+    host('10.0.0.4', [(22, 'open', 'ssh', 'OpenSSH', {'CVE-2020-1': '5.0'}), (23, 'closed', 'telnet', '', {})]),
+]
+
+
+def by_type(changes):
+    grouped = {}
+    for change in changes:
+        grouped.setdefault(change['type'], []).append(change)
+    return grouped
+
+
+def test_every_change_type_is_reported():
+    changes = by_type(iter_diff(OLD, iter(NEW)))
+    assert set(changes) == set(CHANGE_TYPES)
+
+    assert changes['host_added'] == [{'type': 'host_added', 'host': '10.0.0.4', 'status': 'up',
+                                      'open_ports': ['22/tcp'], 'vulnerability_count': 1}]
+    assert changes['host_removed'] == [{'type': 'host_removed', 'host': '10.0.0.3', 'status': 'up',
+                                        'open_ports': ['53/tcp'], 'vulnerability_count': 1}]
+    assert changes['host_status_changed'] == [
+        {'type': 'host_status_changed', 'host': '10.0.0.2', 'old': 'up', 'new': 'down'}]
+    assert [(c['port'], c['old'], c['new']) for c in changes['port_opened']] == [('8080', None, 'open')]
+    assert [(c['port'], c['service']) for c in changes['port_closed']] == [('443', 'https nginx')]
+    assert [(c['port'], c['old'], c['new']) for c in changes['service_changed']] == [
+        ('80', 'http Apache httpd', 'http nginx')]
+    assert [(c['cve'], c['score']) for c in changes['cve_added']] == [('CVE-2022-3', '6.1')]
+    assert [(c['cve'], c['score']) for c in changes['cve_fixed']] == [('CVE-2020-1', '5.0')]
+
+
+def test_identical_reports_have_no_changes():
+    changes = list(iter_diff(OLD, OLD))
+    assert changes == []
+    assert summarize_changes(changes) == dict.fromkeys(CHANGE_TYPES, 0)
+
+
+def test_summary_counts_each_type():
+    summary = summarize_changes(list(iter_diff(OLD, NEW)))
+    assert list(summary) == list(CHANGE_TYPES)
+    assert summary['cve_added'] == 1 and summary['port_closed'] == 1
+
+
+def write_xml(path, hosts, start=1700000000):
+    """Write parsed hosts back out as a minimal nmap XML report"""
+    parts = [f'<?xml version="1.0"?>\n<nmaprun scanner="nmap" start="{start}" version="7.95">\n']
+    for item in hosts:
+        parts.append(f'<host><status state="{item["status"]}"/>'
+                     f'<address addr="{item["addresses"][0]["addr"]}" addrtype="ipv4"/><ports>')
+        for port in item['ports']:
+            service = port['service']
+            parts.append(f'<port protocol="tcp" portid="{port["portid"]}"><state state="{port["state"]}"/>'
+                         f'<service name="{service["name"]}" product="{service["product"]}"/>')
+            if port['vulnerabilities']:
+                output = ''.join(f'\n    {v["id"]}\t{v["score"]}\thttps://vulners.com/cve/{v["id"]}'
+                                 for v in port['vulnerabilities'])
+                parts.append(f'<script id="vulners" output={quoteattr(output, {chr(9): "&#x9;", chr(10): "&#xa;"})}/>')
+            parts.append('</port>')
+        parts.append('</ports></host>\n')
+    parts.append('<runstats><finished time="1700000060" exit="success"/></runstats>\n</nmaprun>\n')
+    with open(path, 'w') as f:
+        f.write(''.join(parts))
+    return str(path)
+
+
+def add_completed_scan(target, hosts):
+    scan = Scan(name='diffed', target=target, status='completed')
+    data_manager.add_scan(scan)
+    scan_dir = os.path.join(report_manager.reports_dir, f"scan_{scan.id}")
+    os.makedirs(scan_dir)
+    path = write_xml(os.path.join(scan_dir, 'report.xml'), hosts)
+    data_manager.update_scan_fields(scan.id, report_path=path)
+    return data_manager.get_scan(scan.id)
+
+
+@pytest.fixture
+def scan_pair(request):
+    target = f'10.0.0.0/24 {request.node.name}'
+    return add_completed_scan(target, OLD), add_completed_scan(target, NEW)
+
+
+def test_api_returns_summary_and_changes(scan_pair):
+    old, new = scan_pair
+    body = app.test_client().get(f'/api/diff/{old.id}/{new.id}').get_json()
+    assert body['summary'] == summarize_changes(list(iter_diff(OLD, NEW)))
+    assert len(body['changes']) == sum(body['summary'].values())
+
+
+def test_api_streams_ndjson(scan_pair):
+    old, new = scan_pair
+    response = app.test_client().get(f'/api/diff/{old.id}/{new.id}?stream=1')
+    assert response.mimetype == 'application/x-ndjson'
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    *changes, last = lines
+    assert all(change['type'] in CHANGE_TYPES for change in changes)
+    assert last == {'summary': summarize_changes(changes)}
+    assert sorted(map(json.dumps, changes)) == sorted(map(json.dumps, iter_diff(OLD, NEW)))
+
+
+def test_api_refuses_scans_of_other_targets(scan_pair):
+    old, _ = scan_pair
+    other = add_completed_scan('192.168.0.0/24', NEW)
+    response = app.test_client().get(f'/api/diff/{old.id}/{other.id}')
+    assert response.status_code == 400
+    assert 'same target' in response.get_json()['error']
+
+
+def touch_newer(path):
+    """Move a file's mtime forward so its stat key surely changes"""
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+
+@pytest.mark.parametrize('changed', ['old', 'new'])
+def test_cached_diff_is_invalidated_by_either_report(scan_pair, changed):
+    old, new = scan_pair
+    assert report_manager.get_report_diff(old, new)['summary']['cve_added'] == 1
+    # The finished diff is cached against both reports
+    assert report_manager.cache.get(new.report_path, 'diff', variant=old.id,
+                                    depends_on=old.report_path) is not None
+
+    # Rewrite one side to match the other: the fresh diff is empty
+    scan, hosts = (old, NEW) if changed == 'old' else (new, OLD)
+    write_xml(scan.report_path, hosts)
+    touch_newer(scan.report_path)
+    assert report_manager.cache.get(new.report_path, 'diff', variant=old.id,
+                                    depends_on=old.report_path) is None
+    assert sum(report_manager.get_report_diff(old, new)['summary'].values()) == 0
@@ -0,0 +1,108 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import app
+from data_manager import DataManager, Scan, data_manager
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return DataManager(db_path=str(tmp_path / 'flanscan.db'))
+
+
+@pytest.fixture
+def scans(store):
+    """Seven scans; several share a start time, so the id has to break ties"""
+    base = datetime(2024, 3, 1, 12, 0)
+    specs = [
+        ('alpha', '10.0.0.1', 'completed', 0),
+        ('bravo', '10.0.0.2', 'failed', 0),
+        ('charlie', 'Web.Example.com', 'completed', 0),
+        ('delta', '10.0.1.0/24', 'completed', 1),
+        ('echo', 'web.example.com', 'cancelled', 1),
+        ('alpha', '10.0.2.0/24', 'completed', 2),
+        ('foxtrot', '10.0.0.3', 'queued', 3),
+    ]
+    added = []
+    for name, target, status, hours in specs:
+        scan = Scan(name=name, target=target, status=status, start_time=base + timedelta(hours=hours))
+        store.add_scan(scan)
+        added.append(scan)
+    return added
+
+
+def walk(store, limit, **filters):
+    """Follow next cursors to the end and return the ids of every page"""
+    pages, cursor = [], None
+    while True:
+        page, cursor = store.get_scans_page(limit=limit, cursor=cursor, **filters)
+        pages.append([scan.id for scan in page])
+        if cursor is None:
+            return pages
+
+
+def test_pages_follow_start_time_then_id(store, scans):
+    expected = [scan.id for scan in sorted(scans, key=lambda s: (s.start_time, s.id), reverse=True)]
+    pages = walk(store, 2)
+    assert [len(page) for page in pages] == [2, 2, 2, 1]
+    assert sum(pages, []) == expected
+
+
+@pytest.mark.parametrize('limit', [1, 3, 7])
+def test_ties_are_never_skipped_or_repeated(store, scans, limit):
+    ids = sum(walk(store, limit, sort='name', descending=False), [])
+    assert ids == [scan.id for scan in sorted(scans, key=lambda s: (s.name, s.id))]
+
+
+def test_last_page_has_no_cursor(store, scans):
+    page, cursor = store.get_scans_page(limit=len(scans))
+    assert len(page) == len(scans)
+    assert cursor is None
+
+
+def test_cursor_round_trips(store):
+    for value in ('2024-03-01T12:00:00', 'a name, with "quotes"', None):
+        assert store._decode_cursor(store._encode_cursor(value, 42)) == (value, 42)
+    assert '=' not in store._encode_cursor('x', 1)
+
+
+# Not base64 JSON, a JSON object, a one-item list
+@pytest.mark.parametrize('cursor', ['not a cursor', 'e30', 'WyJ4Il0'])
+def test_invalid_cursor_raises(store, cursor):
+    with pytest.raises(ValueError, match='Invalid cursor'):
+        store.get_scans_page(cursor=cursor)
+
+
+def test_status_and_target_filters_combine(store, scans):
+    page, _ = store.get_scans_page(statuses=['completed', 'cancelled'], target='WEB.example')
+    assert [scan.name for scan in page] == ['echo', 'charlie']
+    page, _ = store.get_scans_page(statuses=['completed'], target='10.0.',
+                                   since=datetime(2024, 3, 1, 13), until=datetime(2024, 3, 1, 15))
+    assert [scan.name for scan in page] == ['alpha', 'delta']
+
+
+def test_unknown_sort_column_raises(store):
+    with pytest.raises(ValueError):
+        store.get_scans_page(sort='status; DROP TABLE scan')
+
+
+@pytest.mark.parametrize('query', ['cursor=bogus', 'sort=report_path', 'limit=x', 'since=never'])
+def test_api_rejects_bad_filters(query):
+    response = app.test_client().get(f'/api/reports?{query}')
+    assert response.status_code == 400
+    assert response.get_json()['error'].startswith('Invalid filter')
+
+
+def test_api_pages_with_cursor():
+    for index in range(3):
+        data_manager.add_scan(Scan(name=f'api{index}', target='listing.api.example', status='completed',
+                                   start_time=datetime(2024, 4, 1) + timedelta(hours=index)))
+    client = app.test_client()
+    names, cursor = [], ''
+    while cursor is not None:
+        body = client.get(f'/api/reports?limit=2&target=listing.api&cursor={cursor}').get_json()
+        names += [scan['name'] for scan in body['scans']]
+        cursor = body['next_cursor']
+    assert names == ['api2', 'api1', 'api0']
@@ -0,0 +1,89 @@
+import pytest
+
+from app import app
+from scan_profiles import PROFILES, get_profile
+
+
+@pytest.mark.parametrize('option, value', [
+    ('ports', '22,80,443'),
+    ('ports', '1-1024'),
+    ('ports', 'T:80,U:53'),
+    ('scripts', 'vuln'),
+    ('scripts', 'default,safe'),
+    ('scripts', 'http-*'),
+    ('scripts', 'ssl-enum-ciphers'),
+    ('host_timeout', '30m'),
+    ('host_timeout', '500'),
+])
+def test_allowed_option_values(option, value):
+    assert getattr(get_profile('vuln', {option: value}), option) == value
+
+
+@pytest.mark.parametrize('option, value', [
+    # Output files
+    ('ports', '80 -oN /tmp/out'),
+    ('ports', '-oN /tmp/out'),
+    ('scripts', 'vuln -oN /app/app.py'),
+    ('host_timeout', '30m -oX /tmp/out.xml'),
+    # Scripts and script arguments from anywhere but nmap's own script set
+    ('scripts', '/tmp/evil.nse'),
+    ('scripts', '../../tmp/evil'),
+    ('scripts', './evil.nse'),
+    ('scripts', 'vuln --script-args=http.useragent=x'),
+    ('scripts', 'http-* or (not intrusive)'),
+    # Shell metacharacters and whitespace
+    ('ports', '80;id'),
+    ('ports', '80|id'),
+    ('ports', '80&&id'),
+    ('ports', '$(id)'),
+    ('ports', '`id`'),
+    ('scripts', 'vuln;rm -rf /'),
+    ('scripts', 'vuln\nid'),
+    ('host_timeout', '30m>x'),
+    ('host_timeout', '30d'),
+])
+def test_rejected_option_values(option, value):
+    with pytest.raises(ValueError, match=f'Invalid {option}'):
+        get_profile('vuln', {option: value})
+
+
+@pytest.mark.parametrize('options', [
+    {'-oN': '/tmp/out'},
+    {'output': '/tmp/out'},
+    {'script_args': 'x=1'},
+])
+def test_unknown_options_are_rejected(options):
+    with pytest.raises(ValueError, match='Unknown scan option'):
+        get_profile('vuln', options)
+
+
+@pytest.mark.parametrize('option, value', [
+    ('timing', 6),
+    ('timing', '-1'),
+    ('min_rate', 0),
+    ('top_ports', '-5'),
+    ('max_parallelism', '10 -oN x'),
+])
+def test_numeric_options_are_checked(option, value):
+    with pytest.raises(ValueError):
+        get_profile('vuln', {option: value})
+
+
+def test_options_become_separate_arguments():
+    profile = get_profile('quick', {'ports': '22,80', 'timing': '3', 'host_timeout': '5m'})
+    assert profile.nmap_args() == ['-T3', '--host-timeout', '5m', '-p', '22,80']
+    assert profile.discovery_args() == ['-T3', '--host-timeout', '5m', '-p', '22,80', '--open']
+
+
+def test_empty_value_resets_option():
+    assert get_profile('vuln', {'scripts': ''}).nmap_args() == ['-sV']
+    # The built-in profile is not changed
+    assert PROFILES['vuln'].scripts == 'vuln'
+
+
+def test_start_scan_rejects_invalid_options():
+    client = app.test_client()
+    for options in ({'ports': '80 -oN /tmp/out'}, {'scripts': '/tmp/evil.nse'}, {'-oN': '/tmp/out'}):
+        response = client.post('/start_scan', json={'target': '10.0.0.1', 'options': options})
+        assert response.status_code == 400
+        assert 'Invalid scan profile' in response.get_json()['error']
@@ -0,0 +1,169 @@
+import itertools
+import json
+import threading
+from datetime import datetime
+
+import pytest
+
+import app as app_module
+from app import app
+from data_manager import data_manager, Scan
+
+
+@pytest.fixture
+def client():
+    return app.test_client()
+
+
+def add_scan(name, status, start_time, **fields):
+    scan = Scan(name=name, target='10.0.0.1', status=status, start_time=start_time, **fields)
+    data_manager.add_scan(scan)
+    return scan.id
+
+
+# Each use of day_scans gets a year of its own, away from other tests' scans
+_years = itertools.count(2001)
+
+
+@pytest.fixture
+def day_scans():
+    """Scans started on February 3rd of an unused year and on the days around it"""
+    year = next(_years)
+    return {
+        'year': year,
+        'before': add_scan('before', 'completed', datetime(year, 2, 2, 23, 59)),
+        'morning': add_scan('morning', 'completed', datetime(year, 2, 3, 0, 0)),
+        'evening': add_scan('evening', 'failed', datetime(year, 2, 3, 22, 30)),
+        'after': add_scan('after', 'completed', datetime(year, 2, 4, 0, 0)),
+    }
+
+
+def ids_of(response):
+    assert response.status_code == 200
+    return [scan['id'] for scan in response.get_json()['scans']]
+
+
+def test_date_bounds_cover_whole_days(client, day_scans):
+    year = day_scans['year']
+    response = client.get(f'/scan_status?status=completed,failed&since={year}-02-03&until={year}-02-03')
+    assert ids_of(response) == [day_scans['evening'], day_scans['morning']]
+
+
+def test_timestamp_bounds_are_exact(client, day_scans):
+    year = day_scans['year']
+    response = client.get(f'/scan_status?status=completed,failed'
+                          f'&since={year}-02-02T23:59:00&until={year}-02-03T22:30:00')
+    assert ids_of(response) == [day_scans['morning'], day_scans['before']]
+
+
+def test_ids_status_and_limit_filters(client, day_scans):
+    ids = ','.join(str(day_scans[name]) for name in ('before', 'morning', 'evening', 'after'))
+    assert ids_of(client.get(f'/scan_status?ids={ids}&status=failed')) == [day_scans['evening']]
+    assert ids_of(client.get(f'/scan_status?ids={ids}&limit=2')) == [day_scans['after'], day_scans['evening']]
+
+
+def test_payload_has_progress_of_running_scans(client):
+    scan_id = add_scan('running', 'running', datetime(1999, 5, 1))
+    data_manager.update_scan_fields(scan_id, progress=25.0, progress_task='Service scan', hosts_done=3)
+    [payload] = client.get(f'/scan_status?ids={scan_id}').get_json()['scans']
+    assert (payload['progress'], payload['progress_task'], payload['hosts_done']) == (25.0, 'Service scan', 3)
+
+
+@pytest.mark.parametrize('query', ['ids=x', 'since=yesterday', 'until=2001-13-01', 'limit=many'])
+def test_invalid_filters_are_rejected(client, query):
+    response = client.get(f'/scan_status?{query}')
+    assert response.status_code == 400
+    assert 'Invalid filter' in response.get_json()['error']
+
+
+def test_unchanged_poll_gets_304(client):
+    scan_id = add_scan('polled', 'running', datetime(1998, 6, 1))
+    url = f'/scan_status?ids={scan_id}'
+    first = client.get(url)
+    etag = first.headers['ETag']
+    assert etag.startswith('W/')
+
+    unchanged = client.get(url, headers={'If-None-Match': etag})
+    assert unchanged.status_code == 304
+    assert unchanged.data == b''
+
+    # Progress moves the status version, so the next poll gets the new payload
+    data_manager.update_scan_fields(scan_id, progress=80.0)
+    changed = client.get(url, headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+    assert changed.get_json()['scans'][0]['progress'] == 80.0
+
+    # Same version but another query is another answer
+    assert client.get(url + '&limit=5', headers={'If-None-Match': changed.headers['ETag']}).status_code == 200
+
+
+def next_event(chunks):
+    """Read the next 'scans' event from an event stream as parsed JSON"""
+    for chunk in chunks:
+        text = chunk.decode() if isinstance(chunk, bytes) else chunk
+        if text.startswith('id: '):
+            event = dict(line.split(': ', 1) for line in text.strip().split('\n'))
+            assert event['event'] == 'scans'
+            return event['id'], json.loads(event['data'])
+    raise AssertionError('stream ended without an event')
+
+
+@pytest.fixture
+def event_slots(monkeypatch):
+    """Give the event streams of this worker two slots"""
+    slots = threading.BoundedSemaphore(2)
+    monkeypatch.setattr(app_module, '_scan_event_slots', slots)
+    return slots
+
+
+def test_event_stream_sends_active_scans_then_changes(client, event_slots):
+    scan_id = add_scan('streamed', 'running', datetime(1997, 1, 1))
+    other_id = add_scan('streamed too', 'queued', datetime(1997, 1, 2))
+    response = client.get('/scan_events', buffered=False)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    chunks = iter(response.response)
+    try:
+        assert next(chunks).startswith(b'retry: ')
+        first_id, first = next_event(chunks)
+        assert {scan_id, other_id} <= {scan['id'] for scan in first['scans']}
+
+        # Only the scan whose payload changed is sent again
+        data_manager.update_scan_fields(scan_id, progress=40.0)
+        second_id, second = next_event(chunks)
+        assert int(second_id) > int(first_id)
+        assert [(scan['id'], scan['progress']) for scan in second['scans']] == [(scan_id, 40.0)]
+
+        # A scan that leaves the active set gets its final state
+        data_manager.update_scan_fields(scan_id, status='completed')
+        _, third = next_event(chunks)
+        assert [(scan['id'], scan['status']) for scan in third['scans']] == [(scan_id, 'completed')]
+    finally:
+        response.close()
+
+
+def test_event_streams_are_bounded_per_worker(client, event_slots):
+    streams = [client.get('/scan_events', buffered=False) for _ in range(2)]
+    assert [stream.status_code for stream in streams] == [200, 200]
+
+    # Past the limit the page is told to poll /scan_status instead
+    refused = client.get('/scan_events')
+    assert refused.status_code == 503
+    assert refused.headers['Retry-After'] == str(app_module.SCAN_EVENTS_MAX_SECONDS)
+    assert '/scan_status' in refused.get_json()['error']
+
+    # Closing a stream, however it ended, frees its slot
+    streams[0].close()
+    reopened = client.get('/scan_events', buffered=False)
+    assert reopened.status_code == 200
+    reopened.close()
+    streams[1].close()
+    assert event_slots.acquire(blocking=False) and event_slots.acquire(blocking=False)
+
+
+def test_event_stream_ends_at_its_deadline(client, event_slots, monkeypatch):
+    monkeypatch.setattr(app_module, 'SCAN_EVENTS_MAX_SECONDS', 0)
+    response = client.get('/scan_events')
+    assert response.status_code == 200
+    assert response.get_data() == f'retry: {app_module.SCAN_EVENTS_RETRY_MS}\n\n'.encode()
@@ -0,0 +1,107 @@
+import asyncio
+import os
+import signal
+import sys
+import time
+
+import pytest
+
+from data_manager import Scan, data_manager
+from scanner import Scanner, ScanProgress
+
+FAKE_NMAP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks', 'fake_nmap.py')
+
+
+@pytest.fixture
+def hung_nmap(monkeypatch):
+    """
+    A scanner whose nmap never exits on its own, and the nmap processes it
+    starts. Returns (scanner, processes, scan id).
+    """
+    monkeypatch.setenv('FAKE_NMAP_START_DELAY', '3600')
+    scanner = Scanner()
+    scanner.nmap_command = [sys.executable, FAKE_NMAP]
+    scanner.kill_grace = 0.5
+
+    processes = []
+    spawn = asyncio.create_subprocess_exec
+
+    async def recording_spawn(*args, **kwargs):
+        process = await spawn(*args, **kwargs)
+        processes.append(process)
+        return process
+
+    monkeypatch.setattr(asyncio, 'create_subprocess_exec', recording_spawn)
+    scan_id = data_manager.add_scan(Scan(name='hung', target='10.55.0.0/30', status='running'))
+    return scanner, processes, scan_id
+
+
+def recorded_processes(scan_id):
+    return data_manager._connect().execute("SELECT pid FROM scan_process WHERE scan_id = ?",
+                                           (scan_id,)).fetchall()
+
+
+def run_in_loop(scanner, coroutine_function, slots=4):
+    async def run():
+        scanner._loop = asyncio.get_running_loop()
+        scanner._nmap_slots = asyncio.Semaphore(slots)
+        return await coroutine_function()
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize('ignore_sigterm, signal_number', [
+    ('0', signal.SIGTERM),
+    ('1', signal.SIGKILL),
+])
+def test_timeout_stops_nmap(hung_nmap, monkeypatch, ignore_sigterm, signal_number):
+    monkeypatch.setenv('FAKE_NMAP_IGNORE_SIGTERM', ignore_sigterm)
+    scanner, processes, scan_id = hung_nmap
+    scanner.scan_timeout = 1
+
+    async def run():
+        scanner._deadlines[scan_id] = scanner._loop.time() + scanner.scan_timeout
+        started = time.monotonic()
+        result = await scanner._run_nmap(scan_id, '10.55.0.1', os.devnull, ScanProgress(scan_id, 1))
+        return result, time.monotonic() - started
+
+    (returncode, stdout, stderr), elapsed = run_in_loop(scanner, run)
+
+    assert returncode is None
+    assert stderr == 'Scan timed out after 1 seconds'
+    assert processes[0].returncode == -signal_number
+    # SIGKILL only comes once the grace period is over
+    assert elapsed >= (1.5 if signal_number == signal.SIGKILL else 1)
+    assert not scanner.active_scans.get(scan_id)
+    assert recorded_processes(scan_id) == []
+
+
+@pytest.mark.parametrize('ignore_sigterm, signal_number', [
+    ('0', signal.SIGTERM),
+    ('1', signal.SIGKILL),
+])
+def test_cancel_stops_running_and_waiting_shards(hung_nmap, monkeypatch, ignore_sigterm, signal_number):
+    monkeypatch.setenv('FAKE_NMAP_IGNORE_SIGTERM', ignore_sigterm)
+    scanner, processes, scan_id = hung_nmap
+    shards = ['10.55.0.1', '10.55.0.2']
+    data_manager.set_scan_shards(scan_id, shards)
+    assert not scanner.cancel_scan(scan_id)  # Not running here
+
+    async def run():
+        scanner._running[scan_id] = data_manager.get_scan(scan_id)
+        progress = ScanProgress(scan_id, len(shards))
+        task = asyncio.ensure_future(scanner._run_shards(scan_id, shards, [os.devnull] * 2, progress, []))
+        # The first shard's nmap has started; the second waits for the only slot
+        while not scanner.active_scans.get(scan_id):
+            await asyncio.sleep(0.05)
+        await asyncio.sleep(0.5)
+        assert scanner.cancel_scan(scan_id)
+        return await task
+
+    errors = run_in_loop(scanner, run, slots=1)
+
+    assert errors == ['Scan cancelled', 'Scan cancelled']
+    assert len(processes) == 1
+    assert processes[0].returncode == -signal_number
+    assert data_manager.get_shard_progress(scan_id)['cancelled'] == 2
+    assert recorded_processes(scan_id) == []
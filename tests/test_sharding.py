@@ -0,0 +1,70 @@
+import pytest
+
+from sharding import shard_targets, validate_target
+
+
+@pytest.mark.parametrize('target', [
+    '10.0.0.1',
+    '10.0.0.0/24',
+    '10.0.0.1-50',
+    '10.0.0-3.*',
+    'scanme.example.com',
+    '10.0.0.0/24, 10.0.1.5 host1.example',
+    '2001:db8::/120',
+])
+def test_validate_target_accepts(target):
+    assert validate_target(target)
+
+
+@pytest.mark.parametrize('target', [
+    '',
+    '-oN /app/app.py',
+    '10.0.0.1 -oN /app/app.py',
+    '10.0.0.1 --script=/tmp/x.nse',
+    '10.0.0.300',
+    '10.0.0.300-400',
+    'host_name.example',
+    '10.0.0.1;id',
+])
+def test_validate_target_rejects(target):
+    with pytest.raises(ValueError):
+        validate_target(target)
+
+
+def test_validate_target_limits_hosts():
+    validate_target('10.0.0.0/16', max_hosts=65536)
+    with pytest.raises(ValueError, match='at most 65536'):
+        validate_target('10.0.0.0/8', max_hosts=65536)
+    # Octet ranges count every address they cover
+    validate_target('10.0.0-1.*', max_hosts=512)
+    with pytest.raises(ValueError):
+        validate_target('10.0.0-1.*', max_hosts=511)
+
+
+def test_small_target_is_one_shard():
+    assert shard_targets('10.0.0.0/28', 16) == ['10.0.0.0/28']
+
+
+def test_cidr_is_split_into_subnets():
+    assert shard_targets('10.0.0.0/26', 16) == [
+        '10.0.0.0/28', '10.0.0.16/28', '10.0.0.32/28', '10.0.0.48/28']
+
+
+def test_shard_size_rounds_down_to_power_of_two():
+    assert len(shard_targets('10.0.0.0/26', 20)) == 4
+
+
+def test_items_are_packed_into_shards():
+    assert shard_targets('a.example b.example c.example', 2) == ['a.example b.example', 'c.example']
+
+
+def test_max_shards_grows_shards():
+    shards = shard_targets('10.0.0.0/16', 16, max_shards=1024)
+    assert len(shards) == 1024
+    assert shards[0] == '10.0.0.0/26'
+
+
+def test_max_shards_raises_when_items_cannot_be_split():
+    # Octet ranges stay whole, so three of five hosts each need three shards of eight
+    with pytest.raises(ValueError):
+        shard_targets('10.0.0.1-5 10.0.1.1-5 10.0.2.1-5', 8, max_shards=2)